@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from pydantic import BaseModel
-from backend.core.auth import authenticate_user, create_access_token, get_current_user
+from fastapi.security import HTTPAuthorizationCredentials
+from core.auth import authenticate_user, create_access_token, get_current_user, revoke_token, security
 
 router = APIRouter()
 
@@ -34,6 +35,10 @@ async def verify(current_user: dict = Depends(get_current_user)):
     return UserInfo(username=current_user["username"])
 
 @router.post("/logout")
-async def logout(current_user: dict = Depends(get_current_user)):
-    """Logout endpoint (client should remove token)"""
+async def logout(
+    current_user: dict = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
+    """Logout endpoint: the token stops working immediately (client should remove it too)"""
+    revoke_token(credentials.credentials)
     return {"message": "Logged out successfully"}
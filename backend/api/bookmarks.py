@@ -1,17 +1,20 @@
-from fastapi import APIRouter, HTTPException, Body, UploadFile, File
-from fastapi.responses import Response
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Body, UploadFile, File, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Dict, Any, Optional
 from models import BookmarkCreate, BookmarkUpdate, BookmarkReorder, BookmarkGroupReorder
-from core.bookmarks_handler import BookmarksHandler
+from core.config import settings
+from core.store import bookmarks_handler
+from core.yaml_export import parse_names, export_resource
+from utils.http_cache import make_etag, cache_headers, etag_matches, not_modified
+from utils.body_limit import check_upload_size
 
 router = APIRouter()
-bookmarks_handler = BookmarksHandler()
 
 # Reorder routes (most specific, must come first)
 @router.post("/reorder")
 async def reorder_bookmark_groups(reorder_data: BookmarkGroupReorder):
     """Reorder bookmark groups"""
-    success = bookmarks_handler.reorder_groups(reorder_data.group_order)
+    success = await bookmarks_handler.aio.reorder_groups(reorder_data.group_order)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to reorder groups")
@@ -21,7 +24,7 @@ async def reorder_bookmark_groups(reorder_data: BookmarkGroupReorder):
 @router.post("/reorder/group")
 async def reorder_group_bookmarks(reorder_data: BookmarkReorder):
     """Reorder bookmarks within a group"""
-    success = bookmarks_handler.reorder_bookmarks(reorder_data.group, reorder_data.bookmark_order)
+    success = await bookmarks_handler.aio.reorder_bookmarks(reorder_data.group, reorder_data.bookmark_order)
 
     if not success:
         raise HTTPException(status_code=404, detail="Group not found or reorder failed")
@@ -32,22 +35,18 @@ async def reorder_group_bookmarks(reorder_data: BookmarkReorder):
 @router.get("/groups")
 async def get_bookmark_groups():
     """Get all bookmark groups"""
-    groups = bookmarks_handler.get_all_groups()
+    groups = await bookmarks_handler.aio.get_all_groups()
     return {"groups": groups}
 
 @router.post("/groups/{group}")
 async def create_group(group: str):
     """Create a new bookmark group"""
-    bookmarks = bookmarks_handler.load_bookmarks()
-    groups = bookmarks_handler.parse_bookmarks(bookmarks)
+    groups = await bookmarks_handler.aio.get_all_groups()
 
     if group in groups:
         raise HTTPException(status_code=400, detail="Group already exists")
 
-    # Add empty group
-    groups[group] = []
-    new_config = bookmarks_handler.build_bookmarks_config(groups)
-    success = bookmarks_handler.save_bookmarks(new_config)
+    success = await bookmarks_handler.aio.add_group(group)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to create group")
@@ -57,8 +56,7 @@ async def create_group(group: str):
 @router.put("/groups/{group}")
 async def rename_group(group: str, new_name: str = Body(..., embed=True)):
     """Rename a bookmark group"""
-    bookmarks = bookmarks_handler.load_bookmarks()
-    groups = bookmarks_handler.parse_bookmarks(bookmarks)
+    groups = await bookmarks_handler.aio.get_all_groups()
 
     if group not in groups:
         raise HTTPException(status_code=404, detail="Group not found")
@@ -66,10 +64,7 @@ async def rename_group(group: str, new_name: str = Body(..., embed=True)):
     if new_name in groups:
         raise HTTPException(status_code=400, detail="Group with new name already exists")
 
-    # Rename the group
-    groups[new_name] = groups.pop(group)
-    new_config = bookmarks_handler.build_bookmarks_config(groups)
-    success = bookmarks_handler.save_bookmarks(new_config)
+    success = await bookmarks_handler.aio.rename_group(group, new_name)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to rename group")
@@ -79,15 +74,12 @@ async def rename_group(group: str, new_name: str = Body(..., embed=True)):
 @router.delete("/groups/{group}")
 async def delete_group(group: str):
     """Delete a bookmark group and all its bookmarks"""
-    bookmarks = bookmarks_handler.load_bookmarks()
-    groups = bookmarks_handler.parse_bookmarks(bookmarks)
+    groups = await bookmarks_handler.aio.get_all_groups()
 
     if group not in groups:
         raise HTTPException(status_code=404, detail="Group not found")
 
-    del groups[group]
-    new_config = bookmarks_handler.build_bookmarks_config(groups)
-    success = bookmarks_handler.save_bookmarks(new_config)
+    success = await bookmarks_handler.aio.delete_group(group)
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to delete group")
@@ -96,16 +88,33 @@ async def delete_group(group: str):
 
 # Export/Import routes (specific paths)
 @router.get("/export")
-async def export_bookmarks():
-    """Export bookmarks configuration as YAML file"""
-    yaml_content = bookmarks_handler.export_yaml()
+async def export_bookmarks(request: Request, groups: Optional[str] = None, stream: bool = False):
+    """Export bookmarks configuration as YAML file
+
+    ?groups=Developer,Social exports only those groups; with ?stream=true
+    the file is sent one group at a time.
+    """
+    names = parse_names(groups)
+    resource = export_resource("bookmarks-export", names)
+    etag = make_etag(resource, await bookmarks_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await bookmarks_handler.aio.snapshot()
+    headers = {
+        "Content-Disposition": "attachment; filename=bookmarks.yaml",
+        **cache_headers(make_etag(resource, snapshot.version))
+    }
+
+    if stream:
+        parts = await bookmarks_handler.aio.iter_export_yaml(names)
+        return StreamingResponse(parts, media_type="application/x-yaml", headers=headers)
 
+    yaml_content = await bookmarks_handler.aio.export_yaml(names)
     return Response(
         content=yaml_content,
         media_type="application/x-yaml",
-        headers={
-            "Content-Disposition": "attachment; filename=bookmarks.yaml"
-        }
+        headers=headers
     )
 
 @router.post("/import")
@@ -114,15 +123,14 @@ async def import_bookmarks(file: UploadFile = File(...)):
     if not file.filename.endswith(('.yaml', '.yml')):
         raise HTTPException(status_code=400, detail="File must be a YAML file")
 
-    try:
-        contents = await file.read()
-        yaml_content = contents.decode('utf-8')
+    check_upload_size(file, settings.import_max_size)
 
-        success = bookmarks_handler.import_yaml(yaml_content)
+    try:
+        # The spooled upload is read in chunks by the parser, on the I/O pool
+        success = await bookmarks_handler.aio.import_yaml(file.file)
 
         if success:
-            bookmarks = bookmarks_handler.load_bookmarks()
-            groups = bookmarks_handler.parse_bookmarks(bookmarks)
+            groups = await bookmarks_handler.aio.get_groups()
 
             summary = {
                 "message": "Bookmarks imported successfully",
@@ -133,6 +141,8 @@ async def import_bookmarks(file: UploadFile = File(...)):
         else:
             raise HTTPException(status_code=500, detail="Failed to import bookmarks")
 
+    except HTTPException:
+        raise
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="File encoding error")
     except Exception as e:
@@ -140,10 +150,15 @@ async def import_bookmarks(file: UploadFile = File(...)):
 
 # General bookmarks routes
 @router.get("/")
-async def get_all_bookmarks():
+async def get_all_bookmarks(request: Request, http_response: Response):
     """Get all bookmarks organized by groups"""
-    bookmarks = bookmarks_handler.load_bookmarks()
-    groups = bookmarks_handler.parse_bookmarks(bookmarks)
+    etag = make_etag("bookmarks", await bookmarks_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await bookmarks_handler.aio.snapshot()
+    http_response.headers.update(cache_headers(make_etag("bookmarks", snapshot.version)))
+    groups = snapshot.data.groups
 
     # Format response
     response = []
@@ -166,8 +181,7 @@ async def get_all_bookmarks():
 @router.get("/{group}")
 async def get_group_bookmarks(group: str):
     """Get bookmarks for a specific group"""
-    bookmarks = bookmarks_handler.load_bookmarks()
-    groups = bookmarks_handler.parse_bookmarks(bookmarks)
+    groups = await bookmarks_handler.aio.get_groups()
 
     if group not in groups:
         raise HTTPException(status_code=404, detail=f"Group '{group}' not found")
@@ -198,7 +212,7 @@ async def create_bookmark(group: str, bookmark: BookmarkCreate):
     if bookmark.description:
         bookmark_config["description"] = bookmark.description
 
-    success = bookmarks_handler.add_bookmark(group, bookmark.name, bookmark_config)
+    success = await bookmarks_handler.aio.add_bookmark(group, bookmark.name, bookmark_config)
 
     if not success:
         raise HTTPException(status_code=400, detail="Bookmark already exists or could not be added")
@@ -208,47 +222,18 @@ async def create_bookmark(group: str, bookmark: BookmarkCreate):
 @router.put("/{group}/{bookmark_name}")
 async def update_bookmark(group: str, bookmark_name: str, bookmark: BookmarkUpdate):
     """Update a bookmark"""
-    bookmarks = bookmarks_handler.load_bookmarks()
-    groups = bookmarks_handler.parse_bookmarks(bookmarks)
+    groups = await bookmarks_handler.aio.get_groups()
 
     if group not in groups:
         raise HTTPException(status_code=404, detail=f"Group '{group}' not found")
 
-    # Find existing bookmark
-    existing = None
-    for b in groups[group]:
-        if b['name'] == bookmark_name:
-            existing = b
-            break
-
-    if not existing:
+    if not any(b['name'] == bookmark_name for b in groups[group]):
         raise HTTPException(status_code=404, detail=f"Bookmark '{bookmark_name}' not found")
 
-    # Update config
-    bookmark_config = existing.get('config', {})
-
-    # Update name if changed
-    if bookmark.name and bookmark.name != bookmark_name:
-        bookmark_config["abbr"] = bookmark.name
-    elif "abbr" not in bookmark_config:
-        bookmark_config["abbr"] = bookmark_name
-
-    if bookmark.href is not None:
-        bookmark_config["href"] = bookmark.href
-    if bookmark.icon is not None:
-        bookmark_config["icon"] = bookmark.icon
-    if bookmark.description is not None:
-        bookmark_config["description"] = bookmark.description
-
-    # If name is being changed
-    new_name = bookmark.name if bookmark.name else bookmark_name
-
-    if new_name != bookmark_name:
-        # Delete old and add new
-        bookmarks_handler.delete_bookmark(group, bookmark_name)
-        success = bookmarks_handler.add_bookmark(group, new_name, bookmark_config)
-    else:
-        success = bookmarks_handler.update_bookmark(group, bookmark_name, bookmark_config)
+    # Field changes and rename are applied in one write
+    success = await bookmarks_handler.aio.edit_bookmark(
+        group, bookmark_name, bookmark.model_dump(exclude_none=True)
+    )
 
     if not success:
         raise HTTPException(status_code=500, detail="Failed to update bookmark")
@@ -258,7 +243,7 @@ async def update_bookmark(group: str, bookmark_name: str, bookmark: BookmarkUpda
 @router.delete("/{group}/{bookmark_name}")
 async def delete_bookmark(group: str, bookmark_name: str):
     """Delete a bookmark"""
-    success = bookmarks_handler.delete_bookmark(group, bookmark_name)
+    success = await bookmarks_handler.aio.delete_bookmark(group, bookmark_name)
 
     if not success:
         raise HTTPException(status_code=404, detail="Bookmark or group not found")
@@ -1,30 +1,30 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
 from typing import List, Dict, Any
-from core.yaml_handler import YAMLHandler
+from core.store import yaml_handler
+from utils.http_cache import make_etag, cache_headers, etag_matches, not_modified
 
 router = APIRouter()
-yaml_handler = YAMLHandler()
 
 @router.get("/", response_model=List[str])
-async def get_categories():
+async def get_categories(request: Request, response: Response):
     """Get all category names"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
-    return list(categories.keys())
+    etag = make_etag("categories", await yaml_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await yaml_handler.aio.snapshot()
+    response.headers.update(cache_headers(make_etag("categories", snapshot.version)))
+    return list(snapshot.data.categories.keys())
 
 @router.post("/", response_model=Dict[str, str])
 async def create_category(name: str = Body(..., embed=True)):
     """Create a new category"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+    categories = await yaml_handler.aio.get_services()
 
     if name in categories:
         raise HTTPException(status_code=400, detail="Category already exists")
 
-    categories[name] = []
-    new_config = yaml_handler.build_config(categories)
-
-    if yaml_handler.save_config(new_config):
+    if await yaml_handler.aio.add_category(name):
         return {"message": "Category created successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to create category")
@@ -35,8 +35,7 @@ async def rename_category(
     new_name: str = Body(..., embed=True)
 ):
     """Rename a category"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+    categories = await yaml_handler.aio.get_services()
 
     if category_name not in categories:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -44,13 +43,7 @@ async def rename_category(
     if new_name in categories:
         raise HTTPException(status_code=400, detail="New category name already exists")
 
-    # Move all services to new category
-    categories[new_name] = categories[category_name]
-    del categories[category_name]
-
-    new_config = yaml_handler.build_config(categories)
-
-    if yaml_handler.save_config(new_config):
+    if await yaml_handler.aio.rename_category(category_name, new_name):
         return {"message": "Category renamed successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to rename category")
@@ -58,8 +51,7 @@ async def rename_category(
 @router.delete("/{category_name}", response_model=Dict[str, str])
 async def delete_category(category_name: str, force: bool = False):
     """Delete a category"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+    categories = await yaml_handler.aio.get_services()
 
     if category_name not in categories:
         raise HTTPException(status_code=404, detail="Category not found")
@@ -70,10 +62,7 @@ async def delete_category(category_name: str, force: bool = False):
             detail="Category is not empty. Set force=true to delete with all services"
         )
 
-    del categories[category_name]
-    new_config = yaml_handler.build_config(categories)
-
-    if yaml_handler.save_config(new_config):
+    if await yaml_handler.aio.delete_category(category_name, force):
         return {"message": "Category deleted successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to delete category")
@@ -81,23 +70,7 @@ async def delete_category(category_name: str, force: bool = False):
 @router.post("/reorder", response_model=Dict[str, str])
 async def reorder_categories(category_order: List[str] = Body(...)):
     """Reorder categories"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
-
-    # Create new ordered dict
-    ordered_categories = {}
-    for category_name in category_order:
-        if category_name in categories:
-            ordered_categories[category_name] = categories[category_name]
-
-    # Add any missing categories at the end
-    for category_name in categories:
-        if category_name not in ordered_categories:
-            ordered_categories[category_name] = categories[category_name]
-
-    new_config = yaml_handler.build_config(ordered_categories)
-
-    if yaml_handler.save_config(new_config):
+    if await yaml_handler.aio.reorder_categories(category_order):
         return {"message": "Categories reordered successfully"}
     else:
         raise HTTPException(status_code=500, detail="Failed to reorder categories")
\ No newline at end of file
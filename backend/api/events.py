@@ -0,0 +1,77 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, Optional
+import json
+from core.auth import create_stream_ticket, get_current_user
+from core.config import settings
+from core.events import event_bus
+
+router = APIRouter()
+
+# How long browsers wait before reconnecting a dropped stream (ms)
+RETRY_MS = 3000
+
+
+def format_event(event: Dict[str, Any]) -> str:
+    """One server-sent event frame"""
+    lines = []
+    if "id" in event:
+        lines.append(f"id: {event['id']}")
+    lines.append("event: change")
+    lines.append("data: " + json.dumps(event, separators=(",", ":"), default=str))
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(last_event_id: Optional[int]) -> AsyncIterator[str]:
+    # Subscribing here rather than in the endpoint means a response that is
+    # never started cannot leave a subscription behind
+    subscription = event_bus.subscribe(last_event_id)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            event = await subscription.next(timeout=settings.events_heartbeat_seconds)
+            if event is None:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ": heartbeat\n\n"
+            else:
+                yield format_event(event)
+    finally:
+        # Runs when the client disconnects and the response is cancelled
+        event_bus.unsubscribe(subscription)
+
+
+@router.post("/ticket")
+async def create_ticket(current_user: dict = Depends(get_current_user)):
+    """Short-lived ticket for opening the stream as /api/events?ticket=
+
+    EventSource cannot send an Authorization header; the ticket keeps the
+    access token out of the URL and cannot be used for anything else.
+    """
+    return {
+        "ticket": create_stream_ticket(current_user["username"]),
+        "expires_in": settings.events_ticket_seconds
+    }
+
+
+@router.get("")
+async def stream_events(request: Request, last_event_id: Optional[str] = Header(None),
+                        since: Optional[str] = Query(None, alias="last_event_id")):
+    """Server-sent stream of compact change events for services and bookmarks
+
+    Events after Last-Event-ID (or ?last_event_id=, for a client that opens
+    a new stream with a new ticket) are replayed first.
+    """
+    if len(event_bus) >= settings.events_max_clients:
+        raise HTTPException(status_code=503, detail="Too many event streams")
+
+    last_event_id = last_event_id or since
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+
+    return StreamingResponse(
+        event_stream(last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
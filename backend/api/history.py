@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+from typing import Optional
+from core.io_pool import run_blocking
+from core.store import SOURCES, journal
+
+router = APIRouter()
+
+
+def _handler(source: str):
+    if source not in SOURCES:
+        raise HTTPException(status_code=400, detail=f"Unknown source '{source}' (expected services or bookmarks)")
+    handler, _ = SOURCES[source]
+    return handler
+
+@router.get("/")
+async def get_history(source: Optional[str] = None, limit: int = 50):
+    """Changes made through the API, newest first"""
+    if source is not None:
+        _handler(source)
+    return await run_blocking(journal.history, source, limit)
+
+@router.get("/{seq}")
+async def get_history_content(seq: int):
+    """Download the file as it was right after a change"""
+    try:
+        found = await run_blocking(journal.content_at, seq)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=409, detail=f"Cannot rebuild the file: {e}")
+    if found is None:
+        raise HTTPException(status_code=404, detail="Change not found")
+    record, content = found
+    return Response(
+        content=content,
+        media_type="application/x-yaml",
+        headers={"Content-Disposition": f"attachment; filename={record['source']}-{seq}.yaml"}
+    )
+
+async def _step(source: str, op: str):
+    handler = _handler(source)
+    step = journal.undo if op == "undo" else journal.redo
+    try:
+        # Queued behind the file's other writes
+        record = await handler.writes.run(step, source)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Nothing to {op}")
+    return {
+        "message": f"Change {'undone' if op == 'undo' else 'redone'} successfully",
+        "change": {key: value for key, value in record.items() if key != "hunks"}
+    }
+
+@router.post("/undo")
+async def undo(source: str = "services"):
+    """Undo the last change to a file"""
+    return await _step(source, "undo")
+
+@router.post("/redo")
+async def redo(source: str = "services"):
+    """Redo the last undone change to a file"""
+    return await _step(source, "redo")
@@ -1,179 +1,204 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
-from fastapi.responses import Response
-from core.yaml_handler import YAMLHandler
-import yaml
+import io
+from fastapi import APIRouter, HTTPException, UploadFile, File, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Optional, Tuple
+from core.config import settings
+from core.store import yaml_handler, backup_store, SOURCES
+from core.yaml_export import parse_names, export_resource
+from core.io_pool import run_blocking
+from core.validator import validator
+from utils.http_cache import make_etag, cache_headers, etag_matches, not_modified
+from utils.body_limit import check_upload_size, too_large
 
 router = APIRouter()
-yaml_handler = YAMLHandler()
 
 @router.get("/")
-async def get_config():
+async def get_config(request: Request, response: Response):
     """Get current configuration"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+    etag = make_etag("config", await yaml_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await yaml_handler.aio.snapshot()
+    config, categories, _ = snapshot.data
+    response.headers.update(cache_headers(make_etag("config", snapshot.version)))
     return {
         "raw": config,
         "parsed": categories
     }
 
+@router.get("/cache")
+async def get_cache_stats():
+    """Get parsed-config cache counters"""
+    return yaml_handler.cache_stats()
+
+def _invalid_message(errors: List[dict], limit: int = 5) -> str:
+    """One-line summary of validator errors, for the import toast"""
+    shown = [f"{error['message']} ({error['path']})" if error["path"] else error["message"]
+             for error in errors[:limit]]
+    if len(errors) > limit:
+        shown.append(f"and {len(errors) - limit} more")
+    return "Invalid configuration: " + "; ".join(shown)
+
 @router.post("/import")
 async def import_config(file: UploadFile = File(...)):
-    """Import configuration from uploaded YAML file"""
+    """Import configuration from uploaded YAML file
+
+    The upload is parsed once; the same tree is validated, saved and counted
+    for the summary. Only YAML structure errors block the import; fields
+    that do not fit the service and widget models come back as warnings.
+    """
     if not file.filename.endswith(('.yaml', '.yml')):
         raise HTTPException(status_code=400, detail="File must be a YAML file")
 
+    check_upload_size(file, settings.import_max_size)
+
     try:
-        contents = await file.read()
-        yaml_content = contents.decode('utf-8')
-
-        # Handle document separator
-        if yaml_content.startswith('---'):
-            yaml_content = yaml_content[3:].strip()
-
-        # Clean up tabs and trailing spaces
-        lines = yaml_content.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            # Replace tabs with spaces and strip trailing whitespace
-            cleaned_line = line.replace('\t', '    ').rstrip()
-            cleaned_lines.append(cleaned_line)
-        yaml_content = '\n'.join(cleaned_lines)
-
-        # Validate YAML
-        try:
-            # Remove inline comments for validation
-            import re
-            # Remove inline comments but preserve line structure
-            clean_content = re.sub(r'#.*$', '', yaml_content, flags=re.MULTILINE)
-            config = yaml.safe_load(clean_content)
-        except yaml.YAMLError as e:
-            error_msg = str(e)
-            # Try to extract line number from error
-            import re
-            line_match = re.search(r'line (\d+)', error_msg)
-            if line_match:
-                line_num = line_match.group(1)
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"YAML parsing error at line {line_num}: {error_msg}"
-                )
-            raise HTTPException(status_code=400, detail=f"Invalid YAML: {error_msg}")
-
-        # Save the configuration (pass the cleaned content)
-        if yaml_handler.import_yaml(yaml_content):
-            # Get the parsed configuration to return summary
-            loaded_config = yaml_handler.load_config()
-            categories = yaml_handler.parse_services(loaded_config)
-
-            summary = {
-                "message": "Configuration imported successfully",
-                "categories": len(categories),
-                "services": sum(len(services) for services in categories.values())
-            }
-            return summary
-        else:
-            raise HTTPException(status_code=500, detail="Failed to save configuration")
-
-    except HTTPException:
-        raise
+        # The spooled upload is read in chunks by the parser, on the I/O pool
+        config = await yaml_handler.aio.parse_import(file.file)
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="File encoding error. Please ensure the file is UTF-8 encoded.")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await run_blocking(validator.validate, config, schema_warnings=True)
+    if not result["valid"]:
+        raise HTTPException(status_code=400, detail=_invalid_message(result["errors"]))
+
+    try:
+        saved = await yaml_handler.aio.import_config(config)
     except Exception as e:
         import traceback
         print(f"Import error: {str(e)}")
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
+    if not saved:
+        raise HTTPException(status_code=500, detail="Failed to save configuration")
+
+    categories = await yaml_handler.aio.parse_services(config)
+    return {
+        "message": "Configuration imported successfully",
+        "categories": len(categories),
+        "services": sum(len(services) for services in categories.values()),
+        "warnings": result["warnings"]
+    }
 
 @router.get("/export")
-async def export_config():
-    """Export current configuration as YAML file"""
-    yaml_content = yaml_handler.export_yaml()
+async def export_config(request: Request, categories: Optional[str] = None, stream: bool = False):
+    """Export current configuration as YAML file
 
+    ?categories=Media,Tools exports only those categories; with
+    ?stream=true the file is sent one category at a time.
+    """
+    names = parse_names(categories)
+    resource = export_resource("export", names)
+    etag = make_etag(resource, await yaml_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await yaml_handler.aio.snapshot()
+    headers = {
+        "Content-Disposition": "attachment; filename=services.yaml",
+        **cache_headers(make_etag(resource, snapshot.version))
+    }
+
+    if stream:
+        parts = await yaml_handler.aio.iter_export_yaml(names)
+        return StreamingResponse(parts, media_type="application/x-yaml", headers=headers)
+
+    yaml_content = await yaml_handler.aio.export_yaml(names)
     return Response(
         content=yaml_content,
         media_type="application/x-yaml",
-        headers={
-            "Content-Disposition": "attachment; filename=services.yaml"
-        }
+        headers=headers
     )
 
 @router.post("/validate")
-async def validate_config(yaml_content: str):
-    """Validate YAML configuration"""
-    try:
-        config = yaml.safe_load(yaml_content)
-
-        # Basic validation
-        if not isinstance(config, list):
-            return {
-                "valid": False,
-                "errors": ["Configuration must be a list of categories"]
-            }
-
-        errors = []
-        warnings = []
-
-        for item in config:
-            if not isinstance(item, dict):
-                errors.append("Each item must be a dictionary")
-                continue
-
-            for category_name, services in item.items():
-                if not isinstance(services, list):
-                    errors.append(f"Services in category '{category_name}' must be a list")
-                    continue
-
-                for service in services:
-                    if not isinstance(service, dict):
-                        errors.append(f"Service in category '{category_name}' must be a dictionary")
-                        continue
-
-                    # Check for service name
-                    if not service:
-                        warnings.append(f"Empty service in category '{category_name}'")
-
-        return {
-            "valid": len(errors) == 0,
-            "errors": errors,
-            "warnings": warnings
-        }
-
-    except yaml.YAMLError as e:
-        return {
-            "valid": False,
-            "errors": [f"YAML parsing error: {str(e)}"],
-            "warnings": []
-        }
+async def validate_config(request: Request, yaml_content: Optional[str] = None):
+    """Validate YAML configuration, or the current configuration if none is given
+
+    The YAML is sent as the request body (IMPORT_MAX_SIZE at most); the
+    yaml_content query parameter is still read when there is no body.
+    Errors and warnings have the line and column they refer to.
+    """
+    body = await request.body()
+    if len(body) > settings.import_max_size:
+        raise too_large(settings.import_max_size)
+    if body:
+        return await run_blocking(validator.validate_text, io.BytesIO(body))
+    if yaml_content is None:
+        snapshot = await yaml_handler.aio.snapshot()
+        yaml_content = snapshot.text
+    return await run_blocking(validator.validate_text, yaml_content)
+
+@router.post("/validate/batch")
+async def validate_configs(files: List[UploadFile] = File(...)):
+    """Validate several uploaded YAML files in one pass (IMPORT_MAX_SIZE in total)"""
+    for file in files:
+        check_upload_size(file, settings.import_max_size)
+    results = await run_blocking(validator.validate_many, [file.file for file in files])
+    return {
+        "valid": all(result["valid"] for result in results),
+        "files": [dict(filename=file.filename, **result) for file, result in zip(files, results)]
+    }
 
 @router.post("/backup")
 async def create_backup():
-    """Create a backup of current configuration"""
-    from datetime import datetime
-    import shutil
-    from pathlib import Path
-
+    """Back up services.yaml and bookmarks.yaml; unchanged files are not stored again"""
+    backups = []
     try:
-        config_path = Path(yaml_handler.config_path)
-        if not config_path.exists():
-            raise HTTPException(status_code=404, detail="No configuration to backup")
-
-        # Create backup directory
-        backup_dir = Path("config/backups")
-        backup_dir.mkdir(parents=True, exist_ok=True)
+        for source, (_, path) in SOURCES.items():
+            entry, created = await run_blocking(backup_store.backup, source, path)
+            if entry is not None:
+                backups.append(dict(entry, new=created))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
 
-        # Create backup with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = backup_dir / f"services_backup_{timestamp}.yaml"
+    if not backups:
+        raise HTTPException(status_code=404, detail="No configuration to backup")
+    return {
+        "message": "Backup created successfully",
+        "backups": backups
+    }
 
-        shutil.copy(config_path, backup_path)
+@router.get("/backups")
+async def list_backups(source: Optional[str] = None):
+    """List backups, newest first; source limits them to services or bookmarks"""
+    return await run_blocking(backup_store.list, source)
 
-        return {
-            "message": "Backup created successfully",
-            "backup_file": str(backup_path)
-        }
+async def _get_backup(backup_id: str) -> Tuple[dict, bytes]:
+    entry = await run_blocking(backup_store.get, backup_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Backup not found")
+    try:
+        content = await run_blocking(backup_store.read, entry)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Backup contents are missing")
+    return entry, content
+
+@router.get("/backups/{backup_id}")
+async def download_backup(backup_id: str):
+    """Download a backup as the YAML file it was taken from"""
+    entry, content = await _get_backup(backup_id)
+    return Response(
+        content=content,
+        media_type="application/x-yaml",
+        headers={"Content-Disposition": f"attachment; filename={entry['id']}.yaml"}
+    )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Backup failed: {str(e)}")
+@router.post("/backups/{backup_id}/restore")
+async def restore_backup(backup_id: str):
+    """Restore a backup over its file; the current contents are backed up first"""
+    entry, content = await _get_backup(backup_id)
+    handler, path = SOURCES[entry["source"]]
+    previous, _ = await run_blocking(backup_store.backup, entry["source"], path)
+    if not await handler.aio.restore(content):
+        raise HTTPException(status_code=500, detail="Failed to restore backup")
+    return {
+        "message": "Backup restored successfully",
+        "restored": entry,
+        "previous": previous
+    }
 
 @router.get("/example")
 async def get_example_config():
@@ -1,303 +1,391 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse
-from core.yaml_handler import YAMLHandler
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+from core.store import yaml_handler
+from core.io_pool import run_blocking
+from core.metrics import timed
+from core.profiling import phase
+from utils.http_cache import make_etag, cache_headers, etag_matches, not_modified
+from typing import Dict, Any, Callable, Iterator, List, Optional, Tuple
+from collections import OrderedDict
+from html import escape
+import threading
 
 router = APIRouter()
-yaml_handler = YAMLHandler()
+
+# (file version, page) of the last GET, shared by all clients
+_last_page = ("", "")
 
 @router.get("/", response_class=HTMLResponse)
-async def get_preview():
-    """Generate preview HTML for the current configuration"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+async def get_preview(request: Request, stream: bool = False):
+    """Generate preview HTML for the current configuration
 
-    # Generate preview HTML
-    html = generate_preview_html(categories)
-    return HTMLResponse(content=html)
+    With ?stream=true the page is sent as it renders: the head and CSS
+    first, then one category block at a time.
+    """
+    global _last_page
+    etag = make_etag("preview", await yaml_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await yaml_handler.aio.snapshot()
+    headers = cache_headers(make_etag("preview", snapshot.version))
+
+    # Generate preview HTML, once per version of the file
+    version, html = _last_page
+    if version == snapshot.version:
+        return HTMLResponse(content=html, headers=headers)
+
+    if stream:
+        def remember(html: str):
+            global _last_page
+            _last_page = (snapshot.version, html)
+
+        parts = _collect(iter_preview_html(snapshot.data.categories), remember)
+        return StreamingResponse(parts, media_type="text/html", headers=headers)
+
+    html = await run_blocking(generate_preview_html, snapshot.data.categories)
+    _last_page = (snapshot.version, html)
+    return HTMLResponse(content=html, headers=headers)
 
 @router.post("/", response_class=HTMLResponse)
-async def preview_config(config_data: Dict[str, Any]):
+async def preview_config(config_data: Dict[str, Any], stream: bool = False):
     """Preview a specific configuration without saving"""
     categories = config_data.get("categories", {})
-    html = generate_preview_html(categories)
+    if stream:
+        return StreamingResponse(iter_preview_html(categories), media_type="text/html")
+    html = await run_blocking(generate_preview_html, categories)
     return HTMLResponse(content=html)
 
-def generate_preview_html(categories: Dict) -> str:
-    """Generate HTML preview for Homepage dashboard"""
+def _collect(parts: Iterator[str], done: Callable[[str], None]) -> Iterator[str]:
+    """Pass parts through and hand the joined page to done() once all were sent"""
+    sent = []
+    for part in parts:
+        sent.append(part)
+        yield part
+    done("".join(sent))
 
-    html = """
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Homepage Preview</title>
-        <style>
-            * {
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }
-            body {
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                min-height: 100vh;
-                padding: 20px;
-            }
-            .container {
-                max-width: 1400px;
-                margin: 0 auto;
-            }
-            .header {
-                text-align: center;
-                color: white;
-                margin-bottom: 30px;
-            }
-            .header h1 {
-                font-size: 2.5rem;
-                margin-bottom: 10px;
-            }
-            .preview-notice {
-                background: rgba(255, 255, 255, 0.2);
-                color: white;
-                padding: 10px 20px;
-                border-radius: 5px;
-                display: inline-block;
-                font-size: 0.9rem;
-            }
-            .categories {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(350px, 1fr));
-                gap: 20px;
-            }
-            .category {
-                background: rgba(255, 255, 255, 0.95);
-                border-radius: 10px;
-                padding: 20px;
-                box-shadow: 0 10px 30px rgba(0, 0, 0, 0.2);
-            }
-            .category-title {
-                font-size: 1.3rem;
-                font-weight: 600;
-                margin-bottom: 15px;
-                color: #333;
-                border-bottom: 2px solid #667eea;
-                padding-bottom: 10px;
-            }
-            .services {
-                display: flex;
-                flex-direction: column;
-                gap: 10px;
-            }
-            .service {
-                display: flex;
-                align-items: center;
-                padding: 12px;
-                background: #f8f9fa;
-                border-radius: 8px;
-                transition: all 0.3s ease;
-                cursor: pointer;
-                text-decoration: none;
-                color: #333;
-            }
-            .service:hover {
-                background: #e9ecef;
-                transform: translateX(5px);
-            }
-            .service-icon {
-                width: 32px;
-                height: 32px;
-                margin-right: 12px;
-                border-radius: 5px;
-                background: #667eea;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                color: white;
-                font-weight: bold;
-            }
-            .service-icon img {
-                width: 100%;
-                height: 100%;
-                object-fit: cover;
-                border-radius: 5px;
-            }
-            .service-name {
-                font-weight: 500;
-                flex-grow: 1;
-            }
-            .service-status {
-                width: 8px;
-                height: 8px;
-                border-radius: 50%;
-                background: #28a745;
-                margin-left: 10px;
-            }
-            .service-widget {
-                margin-top: 8px;
-                padding: 8px;
-                background: white;
-                border-radius: 5px;
-                font-size: 0.85rem;
-                color: #666;
-                display: flex;
-                gap: 15px;
-            }
-            .widget-stat {
-                display: flex;
-                flex-direction: column;
-            }
-            .widget-label {
-                font-size: 0.75rem;
-                color: #999;
-            }
-            .widget-value {
-                font-weight: 600;
-                color: #333;
-            }
-            .empty-category {
-                color: #999;
-                font-style: italic;
-                padding: 20px;
-                text-align: center;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Homepage Dashboard</h1>
-                <div class="preview-notice">Preview Mode</div>
-            </div>
-            <div class="categories">
-    """
+# Static parts of the page, built once at import
+PREVIEW_HEAD = """\
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Homepage Preview</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh;
+            padding: 20px;
+        }
+        .container {
+            max-width: 1400px;
+            margin: 0 auto;
+        }
+        .header {
+            text-align: center;
+            color: white;
+            margin-bottom: 30px;
+        }
+        .header h1 {
+            font-size: 2.5rem;
+            margin-bottom: 10px;
+        }
+        .preview-notice {
+            background: rgba(255, 255, 255, 0.2);
+            color: white;
+            padding: 10px 20px;
+            border-radius: 5px;
+            display: inline-block;
+            font-size: 0.9rem;
+        }
+        .categories {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(350px, 1fr));
+            gap: 20px;
+        }
+        .category {
+            background: rgba(255, 255, 255, 0.95);
+            border-radius: 10px;
+            padding: 20px;
+            box-shadow: 0 10px 30px rgba(0, 0, 0, 0.2);
+        }
+        .category-title {
+            font-size: 1.3rem;
+            font-weight: 600;
+            margin-bottom: 15px;
+            color: #333;
+            border-bottom: 2px solid #667eea;
+            padding-bottom: 10px;
+        }
+        .services {
+            display: flex;
+            flex-direction: column;
+            gap: 10px;
+        }
+        .service {
+            display: flex;
+            align-items: center;
+            padding: 12px;
+            background: #f8f9fa;
+            border-radius: 8px;
+            transition: all 0.3s ease;
+            cursor: pointer;
+            text-decoration: none;
+            color: #333;
+        }
+        .service:hover {
+            background: #e9ecef;
+            transform: translateX(5px);
+        }
+        .service-icon {
+            width: 32px;
+            height: 32px;
+            margin-right: 12px;
+            border-radius: 5px;
+            background: #667eea;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            color: white;
+            font-weight: bold;
+        }
+        .service-icon img {
+            width: 100%;
+            height: 100%;
+            object-fit: cover;
+            border-radius: 5px;
+        }
+        .service-name {
+            font-weight: 500;
+            flex-grow: 1;
+        }
+        .service-status {
+            width: 8px;
+            height: 8px;
+            border-radius: 50%;
+            background: #28a745;
+            margin-left: 10px;
+        }
+        .service-widget {
+            margin-top: 8px;
+            padding: 8px;
+            background: white;
+            border-radius: 5px;
+            font-size: 0.85rem;
+            color: #666;
+            display: flex;
+            gap: 15px;
+        }
+        .widget-stat {
+            display: flex;
+            flex-direction: column;
+        }
+        .widget-label {
+            font-size: 0.75rem;
+            color: #999;
+        }
+        .widget-value {
+            font-weight: 600;
+            color: #333;
+        }
+        .empty-category {
+            color: #999;
+            font-style: italic;
+            padding: 20px;
+            text-align: center;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Homepage Dashboard</h1>
+            <div class="preview-notice">Preview Mode</div>
+        </div>
+        <div class="categories">
+"""
 
-    # Generate categories
-    for category_name, services in categories.items():
-        html += f"""
-            <div class="category">
-                <div class="category-title">{category_name}</div>
-                <div class="services">
-        """
-
-        if services:
-            for service in services:
-                service_name = service['name']
-                config = service.get('config', {})
-                href = config.get('href', '#')
-                icon = config.get('icon', '')
-
-                # Service item
-                html += f"""
-                    <a href="{href}" class="service" target="_blank">
-                        <div class="service-icon">
-                """
-
-                if icon:
-                    html += f'<img src="{icon}" alt="{service_name}" onerror="this.style.display=\'none\'; this.parentElement.innerHTML=\'{service_name[0]}\'">'
-                else:
-                    html += service_name[0].upper()
-
-                html += f"""
-                        </div>
-                        <div class="service-name">{service_name}</div>
-                        <div class="service-status"></div>
-                    </a>
-                """
-
-                # Add widget info if available
-                widget = config.get('widget')
-                if widget and config.get('showStats'):
-                    widget_type = widget.get('type', 'unknown')
-                    html += f"""
-                    <div class="service-widget">
-                        <div class="widget-stat">
-                            <span class="widget-label">Type</span>
-                            <span class="widget-value">{widget_type}</span>
-                        </div>
-                    """
-
-                    # Add mock stats based on widget type
-                    if widget_type == 'emby':
-                        html += """
-                        <div class="widget-stat">
-                            <span class="widget-label">Movies</span>
-                            <span class="widget-value">1,234</span>
-                        </div>
-                        <div class="widget-stat">
-                            <span class="widget-label">Shows</span>
-                            <span class="widget-value">567</span>
-                        </div>
-                        """
-                    elif widget_type == 'qbittorrent':
-                        html += """
-                        <div class="widget-stat">
-                            <span class="widget-label">Download</span>
-                            <span class="widget-value">45.3 MB/s</span>
-                        </div>
-                        <div class="widget-stat">
-                            <span class="widget-label">Upload</span>
-                            <span class="widget-value">12.1 MB/s</span>
-                        </div>
-                        """
-                    elif widget_type == 'customapi':
-                        mappings = widget.get('mappings', [])
-                        for i, mapping in enumerate(mappings[:2]):  # Show max 2 stats
-                            label = mapping.get('label', f'Field {i+1}')
-                            html += f"""
-                            <div class="widget-stat">
-                                <span class="widget-label">{label}</span>
-                                <span class="widget-value">--</span>
-                            </div>
-                            """
-
-                    html += "</div>"
-        else:
-            html += '<div class="empty-category">No services in this category</div>'
-
-        html += """
-                </div>
-            </div>
-        """
+PREVIEW_TAIL = """\
+        </div>
+    </div>
+    <script>
+        // Add some interactivity
+        document.querySelectorAll('.service').forEach(service => {
+            service.addEventListener('click', (e) => {
+                if (service.href === '#' || service.href.endsWith('#')) {
+                    e.preventDefault();
+                    console.log('Service clicked:', service.querySelector('.service-name').textContent);
+                }
+            });
+        });
 
-    if not categories:
-        html += """
-            <div class="category" style="grid-column: 1 / -1;">
-                <div class="empty-category">
-                    No categories configured yet. Add some services to get started!
-                </div>
-            </div>
-        """
+        // Simulate status indicators
+        document.querySelectorAll('.service-status').forEach(status => {
+            const random = Math.random();
+            if (random > 0.9) {
+                status.style.background = '#dc3545'; // Red - offline
+            } else if (random > 0.8) {
+                status.style.background = '#ffc107'; // Yellow - warning
+            } else {
+                status.style.background = '#28a745'; // Green - online
+            }
+        });
+    </script>
+</body>
+</html>
+"""
 
-    html += """
+NO_CATEGORIES = """
+        <div class="category" style="grid-column: 1 / -1;">
+            <div class="empty-category">
+                No categories configured yet. Add some services to get started!
             </div>
         </div>
-        <script>
-            // Add some interactivity
-            document.querySelectorAll('.service').forEach(service => {
-                service.addEventListener('click', (e) => {
-                    if (service.href === '#' || service.href.endsWith('#')) {
-                        e.preventDefault();
-                        console.log('Service clicked:', service.querySelector('.service-name').textContent);
-                    }
-                });
-            });
+"""
 
-            // Simulate status indicators
-            document.querySelectorAll('.service-status').forEach(status => {
-                const random = Math.random();
-                if (random > 0.9) {
-                    status.style.background = '#dc3545'; // Red - offline
-                } else if (random > 0.8) {
-                    status.style.background = '#ffc107'; // Yellow - warning
-                } else {
-                    status.style.background = '#28a745'; // Green - online
-                }
-            });
-        </script>
-    </body>
-    </html>
+CATEGORY_TEMPLATE = """
+        <div class="category">
+            <div class="category-title">{title}</div>
+            <div class="services">{services}</div>
+        </div>
+"""
+
+SERVICE_TEMPLATE = """
+                <a href="{href}" class="service" target="_blank">
+                    <div class="service-icon">{icon}</div>
+                    <div class="service-name">{name}</div>
+                    <div class="service-status"></div>
+                </a>{widget}"""
+
+# The fallback letter comes from the alt text, so no config value ends up in script
+ICON_TEMPLATE = '<img src="{src}" alt="{alt}" onerror="this.parentElement.textContent=this.alt.charAt(0)">'
+
+WIDGET_STAT_TEMPLATE = """
+                    <div class="widget-stat">
+                        <span class="widget-label">{label}</span>
+                        <span class="widget-value">{value}</span>
+                    </div>"""
+
+# Mock stats shown for known widget types
+WIDGET_MOCK_STATS = {
+    'emby': [('Movies', '1,234'), ('Shows', '567')],
+    'qbittorrent': [('Download', '45.3 MB/s'), ('Upload', '12.1 MB/s')],
+}
+
+EMPTY_CATEGORY = '<div class="empty-category">No services in this category</div>'
+
+# Rendered category fragments by the values they show, shared by all requests
+FRAGMENT_CACHE_SIZE = 512
+_fragments: "OrderedDict[Tuple, str]" = OrderedDict()
+_fragments_lock = threading.Lock()
+
+# (name, href, icon, widget stats or None): everything a service block shows
+ServiceView = Tuple[str, str, str, Optional[Tuple[Tuple[str, str], ...]]]
+
+# dict.get skips the exception-driven CommentedMap.get; merged (<<) keys are
+# stored in the mapping as well, so the result is the same
+_get = dict.get
+
+
+def _widget_stats(widget: Dict) -> Tuple[Tuple[str, str], ...]:
+    widget_type = str(_get(widget, 'type', 'unknown'))
+    stats = [('Type', widget_type)]
+    stats.extend(WIDGET_MOCK_STATS.get(widget_type, []))
+    if widget_type == 'customapi':
+        mappings = _get(widget, 'mappings') or []
+        for i, mapping in enumerate(mappings[:2]):  # Show max 2 stats
+            if isinstance(mapping, dict):
+                stats.append((str(_get(mapping, 'label', f'Field {i+1}')), '--'))
+    return tuple(stats)
+
+
+def _service_view(service: Dict) -> ServiceView:
+    config = _get(service, 'config')
+    if not isinstance(config, dict):
+        config = {}
+    widget = _get(config, 'widget')
+    stats = None
+    if isinstance(widget, dict) and widget and _get(config, 'showStats'):
+        stats = _widget_stats(widget)
+    return (str(service['name']), str(_get(config, 'href') or '#'), str(_get(config, 'icon') or ''), stats)
+
+
+def _safe_href(href: str) -> str:
+    """Escaped link target; script URLs are replaced by '#'"""
+    href = href.strip()
+    if href.lower().replace('\t', '').replace('\n', '').startswith(('javascript:', 'vbscript:', 'data:')):
+        href = '#'
+    return escape(href)
+
+
+def _render_service(view: ServiceView) -> str:
+    name, href, icon, stats = view
+
+    if icon:
+        icon_html = ICON_TEMPLATE.format(src=escape(icon), alt=escape(name))
+    else:
+        icon_html = escape(name[:1].upper())
+
+    widget_html = ''
+    if stats:
+        rows = "".join(
+            WIDGET_STAT_TEMPLATE.format(label=escape(label), value=escape(value))
+            for label, value in stats
+        )
+        widget_html = f'\n                <div class="service-widget">{rows}\n                </div>'
+
+    return SERVICE_TEMPLATE.format(href=_safe_href(href), icon=icon_html, name=escape(name), widget=widget_html)
+
+
+def render_category(category_name: str, views: Tuple[ServiceView, ...]) -> str:
+    """HTML block of one category"""
+    if views:
+        services_html = "".join(_render_service(view) for view in views) + "\n            "
+    else:
+        services_html = EMPTY_CATEGORY
+    return CATEGORY_TEMPLATE.format(title=escape(str(category_name)), services=services_html)
+
+
+def cached_category(category_name: str, services: List[Dict]) -> str:
+    """render_category(), reused while the values the category shows are unchanged"""
+    key = (str(category_name), tuple(_service_view(service) for service in services or []))
+    with _fragments_lock:
+        fragment = _fragments.get(key)
+        if fragment is not None:
+            _fragments.move_to_end(key)
+            return fragment
+
+    fragment = render_category(*key)
+    with _fragments_lock:
+        _fragments[key] = fragment
+        if len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return fragment
+
+
+def iter_preview_html(categories: Dict) -> Iterator[str]:
+    """The preview page in parts: head, one block per category, tail
+
+    Only categories whose services changed since they were last rendered
+    are rendered again.
     """
+    yield PREVIEW_HEAD
+    for category_name, services in categories.items():
+        yield cached_category(category_name, services)
+    if not categories:
+        yield NO_CATEGORIES
+    yield PREVIEW_TAIL
+
 
-    return html
\ No newline at end of file
+@timed()
+@phase("render")
+def generate_preview_html(categories: Dict) -> str:
+    """Generate HTML preview for Homepage dashboard"""
+    return "".join(iter_preview_html(categories))
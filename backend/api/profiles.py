@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse, Response
+from core.profiling import profile_store
+
+router = APIRouter()
+
+@router.get("/")
+async def list_profiles():
+    """Request profiles kept in memory, newest first"""
+    return profile_store.list()
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: int, format: str = "prof", sort: str = "cumulative"):
+    """Download a request profile: format=prof for pstats/snakeviz, format=text for a report"""
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        try:
+            return PlainTextResponse(profile_store.report(profile, sort))
+        except KeyError:
+            raise HTTPException(status_code=400, detail=f"Unknown sort key '{sort}'")
+    return Response(
+        content=profile_store.dump(profile),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.prof"}
+    )
@@ -1,43 +1,47 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
 from typing import List, Dict, Any
-from models import Service, ServiceCreate, ServiceUpdate
-from core.yaml_handler import YAMLHandler
+from models import Service, ServiceCreate, ServiceUpdate, ServiceBatch
+from core.store import yaml_handler
+from utils.http_cache import make_etag, cache_headers, etag_matches, not_modified
 
 router = APIRouter()
-yaml_handler = YAMLHandler()
 
 @router.get("/", response_model=Dict[str, List[Dict[str, Any]]])
-async def get_all_services():
+async def get_all_services(request: Request, response: Response):
     """Get all services grouped by category"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
-    return categories
+    etag = make_etag("services", await yaml_handler.aio.version())
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    snapshot = await yaml_handler.aio.snapshot()
+    response.headers.update(cache_headers(make_etag("services", snapshot.version)))
+    return snapshot.data.categories
 
 @router.get("/{category}/{service_name}", response_model=Dict[str, Any])
 async def get_service(category: str, service_name: str):
     """Get a specific service"""
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+    snapshot = await yaml_handler.aio.snapshot()
+    index = snapshot.data.index
 
-    if category not in categories:
+    if category not in index:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    for service in categories[category]:
-        if service['name'] == service_name:
-            return {
-                "name": service['name'],
-                "category": category,
-                "config": service.get('config', {})
-            }
+    service = index.get(category, service_name)
+    if service is None:
+        raise HTTPException(status_code=404, detail="Service not found")
 
-    raise HTTPException(status_code=404, detail="Service not found")
+    return {
+        "name": service['name'],
+        "category": category,
+        "config": service.get('config', {})
+    }
 
 @router.post("/", response_model=Dict[str, str])
 async def create_service(service: ServiceCreate):
     """Create a new service"""
     config_dict = service.config.model_dump(exclude_none=True) if service.config else {}
 
-    success = yaml_handler.add_service(
+    success = await yaml_handler.aio.add_service(
         category=service.category,
         service_name=service.name,
         service_config=config_dict
@@ -55,55 +59,35 @@ async def update_service(
     service_update: ServiceUpdate
 ):
     """Update an existing service"""
-    # Get current service
-    config = yaml_handler.load_config()
-    categories = yaml_handler.parse_services(config)
+    snapshot = await yaml_handler.aio.snapshot()
+    index = snapshot.data.index
 
-    if category not in categories:
+    if category not in index:
         raise HTTPException(status_code=404, detail="Category not found")
 
-    # Find the service
-    current_service = None
-    for service in categories[category]:
-        if service['name'] == service_name:
-            current_service = service
-            break
-
-    if not current_service:
+    if index.get(category, service_name) is None:
         raise HTTPException(status_code=404, detail="Service not found")
 
-    # Handle category change
-    new_category = service_update.category if service_update.category else category
-    new_name = service_update.name if service_update.name else service_name
-
-    # If category changed, move the service
-    if new_category != category:
-        yaml_handler.move_service(service_name, category, new_category)
-        category = new_category
+    config_dict = service_update.config.model_dump(exclude_none=True) if service_update.config else None
 
-    # Update configuration
-    if service_update.config:
-        config_dict = service_update.config.model_dump(exclude_none=True)
-        success = yaml_handler.update_service(category, service_name, config_dict)
-
-        if not success:
-            raise HTTPException(status_code=400, detail="Update failed")
-
-    # Handle name change (delete old, create new)
-    if new_name != service_name:
-        current_config = current_service.get('config', {})
-        if service_update.config:
-            current_config.update(service_update.config.model_dump(exclude_none=True))
+    # Category change, rename and config update are applied in one write
+    success = await yaml_handler.aio.edit_service(
+        category,
+        service_name,
+        new_category=service_update.category,
+        new_name=service_update.name,
+        service_config=config_dict
+    )
 
-        yaml_handler.delete_service(category, service_name)
-        yaml_handler.add_service(category, new_name, current_config)
+    if not success:
+        raise HTTPException(status_code=400, detail="Update failed")
 
     return {"message": "Service updated successfully"}
 
 @router.delete("/{category}/{service_name}", response_model=Dict[str, str])
 async def delete_service(category: str, service_name: str):
     """Delete a service"""
-    success = yaml_handler.delete_service(category, service_name)
+    success = await yaml_handler.aio.delete_service(category, service_name)
 
     if success:
         return {"message": "Service deleted successfully"}
@@ -116,7 +100,7 @@ async def reorder_services(
     service_order: List[str] = Body(...)
 ):
     """Reorder services within a category"""
-    success = yaml_handler.reorder_services(category, service_order)
+    success = await yaml_handler.aio.reorder_services(category, service_order)
 
     if success:
         return {"message": "Services reordered successfully"}
@@ -130,9 +114,29 @@ async def move_service(
     to_category: str = Body(...)
 ):
     """Move a service between categories"""
-    success = yaml_handler.move_service(service_name, from_category, to_category)
+    success = await yaml_handler.aio.move_service(service_name, from_category, to_category)
 
     if success:
         return {"message": "Service moved successfully"}
     else:
-        raise HTTPException(status_code=400, detail="Move failed")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail="Move failed")
+
+@router.post("/batch", response_model=Dict[str, Any])
+async def apply_batch(batch: ServiceBatch):
+    """Apply an ordered list of service/category operations with a single save"""
+    operations = []
+    for operation in batch.operations:
+        arguments = operation.model_dump(exclude_none=True, exclude={"config"})
+        if operation.config is not None:
+            arguments["config"] = operation.config.model_dump(exclude_none=True)
+        operations.append(arguments)
+
+    try:
+        success = await yaml_handler.aio.apply_operations(operations)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not success:
+        raise HTTPException(status_code=500, detail="Failed to save configuration")
+
+    return {"message": "Batch applied successfully", "applied": len(operations)}
@@ -1,12 +1,17 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
+import hashlib
+import threading
+import time
 import jwt
-from fastapi import HTTPException, status, Depends
+from fastapi import HTTPException, Request, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from backend.core.config import settings
+from core.config import settings
 
 # JWT token bearer
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
@@ -32,6 +37,75 @@ def verify_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+# Claim of the tickets that open /api/events; access tokens never carry it
+TICKET_PURPOSE = "events"
+
+def create_stream_ticket(username: str) -> str:
+    """Short-lived token that can only open the change feed"""
+    return create_access_token({"sub": username, "purpose": TICKET_PURPOSE},
+                               timedelta(seconds=settings.events_ticket_seconds))
+
+class TokenCache:
+    """Tokens verified recently, so most requests skip the JWT signature check
+
+    Entries are keyed by the token's SHA-256 (the tokens themselves are not
+    kept), expire with the token and are evicted least recently used first.
+    Revoked tokens (logout) are remembered until they would have expired.
+    Both are per process: with several workers a logout only takes effect
+    immediately in the worker that handled it.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # {token digest: (user, exp)}, least recently used first
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        # {token digest: exp}
+        self._revoked: Dict[str, float] = {}
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """The user of a cached, unexpired token"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, token: str, user: dict, exp: float):
+        key = self._key(token)
+        with self._lock:
+            if key in self._revoked:
+                return
+            self._entries[key] = (user, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def revoke(self, token: str, exp: float):
+        """Reject a token from now on, even though its signature is valid"""
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._revoked = {k: e for k, e in self._revoked.items() if e > now}
+            self._revoked[key] = exp
+
+    def revoked(self, token: str) -> bool:
+        with self._lock:
+            return self._key(token) in self._revoked
+
+
+token_cache = TokenCache(settings.token_cache_size)
+
 def authenticate_user(username: str, password: str) -> bool:
     """Authenticate a user against configured credentials"""
     if username != settings.auth_username:
@@ -40,15 +114,61 @@ def authenticate_user(username: str, password: str) -> bool:
         return False
     return True
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Dependency to get the current authenticated user"""
-    token = credentials.credentials
+def user_from_token(token: str) -> dict:
+    """Resolve a token to the user it was issued to (cached until the token expires)"""
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
     payload = verify_token(token)
     username: str = payload.get("sub")
-    if username is None:
+    # Tokens are cached and revoked until they expire: one that never does is refused
+    exp = payload.get("exp")
+    if username is None or exp is None or "purpose" in payload or token_cache.revoked(token):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user = {"username": username}
+    token_cache.put(token, user, exp)
+    return user
+
+def revoke_token(token: str):
+    """Invalidate a token before it expires (logout)"""
+    exp = verify_token(token).get("exp")
+    # Tokens without exp are refused by user_from_token() already
+    if exp is not None:
+        token_cache.revoke(token, exp)
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Dependency to get the current authenticated user"""
+    return user_from_token(credentials.credentials)
+
+def user_from_ticket(ticket: str) -> dict:
+    """Resolve a create_stream_ticket() ticket to its user"""
+    payload = verify_token(ticket)
+    username = payload.get("sub")
+    if username is None or payload.get("purpose") != TICKET_PURPOSE:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
     return {"username": username}
+
+async def get_stream_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> dict:
+    """Like get_current_user, but also accepts a stream ticket as ?ticket= (EventSource cannot send headers)"""
+    if credentials:
+        return user_from_token(credentials.credentials)
+    ticket = request.query_params.get("ticket")
+    if not ticket:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_from_ticket(ticket)
@@ -0,0 +1,127 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .file_io import atomic_write
+from .write_coordinator import WriteCoordinator
+
+
+class BackupStore:
+    """Content-addressed, gzip-compressed backups of the config files
+
+    File contents are stored once per distinct content, as
+    objects/<hash[:2]>/<hash>.gz; manifest.json lists the backups (source,
+    time, hash, sizes). A backup of a file that has not changed since its
+    last one adds nothing. After each backup the retention policy thins
+    the list: the newest ``keep_last`` backups of each file, plus the
+    newest one of each of the last ``keep_daily`` days and ``keep_weekly``
+    weeks; objects no backup refers to any more are deleted. The manifest,
+    and so listing, stays small however long backups are taken.
+    """
+
+    def __init__(self, directory: Path, keep_last: int = 10, keep_daily: int = 7, keep_weekly: int = 4):
+        self.directory = Path(directory)
+        self.objects_dir = self.directory / "objects"
+        self.manifest_path = self.directory / "manifest.json"
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+        # Serializes manifest updates across threads and workers
+        self.writes = WriteCoordinator(self.manifest_path)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest}.gz"
+
+    def _load(self) -> List[Dict[str, Any]]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get("backups", [])
+        except FileNotFoundError:
+            return []
+
+    def _save(self, backups: List[Dict[str, Any]]):
+        atomic_write(self.manifest_path, json.dumps({"backups": backups}, indent=1))
+
+    def _store_object(self, digest: str, content: bytes) -> int:
+        """Write the compressed object unless it exists; returns its size"""
+        path = self._object_path(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, gzip.compress(content, mtime=0))
+        return path.stat().st_size
+
+    def backup(self, source: str, path: Path) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Back up a file; returns (backup entry, whether a new one was added)
+
+        The entry is the existing latest one if the file is unchanged, and
+        None if the file does not exist.
+        """
+        try:
+            content = Path(path).read_bytes()
+        except FileNotFoundError:
+            return None, False
+        digest = hashlib.sha256(content).hexdigest()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.writes.locked():
+            backups = self._load()
+            latest = next((entry for entry in reversed(backups) if entry["source"] == source), None)
+            if latest is not None and latest["digest"] == digest:
+                return latest, False
+
+            now = datetime.now()
+            entry = {
+                "id": f"{source}-{now.strftime('%Y%m%d%H%M%S%f')}",
+                "source": source,
+                "created": now.isoformat(timespec='seconds'),
+                "digest": digest,
+                "size": len(content),
+                "stored_size": self._store_object(digest, content),
+            }
+            backups.append(entry)
+            self._save(self._prune(backups, now))
+            return entry, True
+
+    def _prune(self, backups: List[Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+        """Apply the retention policy and delete objects no longer referenced"""
+        days = {(now - timedelta(days=i)).date() for i in range(self.keep_daily)}
+        weeks = {(now - timedelta(weeks=i)).isocalendar()[:2] for i in range(self.keep_weekly)}
+        keep = set()
+        for source in {entry["source"] for entry in backups}:
+            newest_first = [entry for entry in reversed(backups) if entry["source"] == source]
+            keep.update(entry["id"] for entry in newest_first[:self.keep_last])
+            # Newest backup of each recent day and week
+            seen_days, seen_weeks = set(), set()
+            for entry in newest_first:
+                created = datetime.fromisoformat(entry["created"]).date()
+                week = created.isocalendar()[:2]
+                if created in days and created not in seen_days:
+                    seen_days.add(created)
+                    keep.add(entry["id"])
+                if week in weeks and week not in seen_weeks:
+                    seen_weeks.add(week)
+                    keep.add(entry["id"])
+
+        kept = [entry for entry in backups if entry["id"] in keep]
+        referenced = {entry["digest"] for entry in kept}
+        for digest in {entry["digest"] for entry in backups} - referenced:
+            try:
+                os.unlink(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+        return kept
+
+    def list(self, source: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Backups, newest first, optionally of one source only"""
+        return [entry for entry in reversed(self._load()) if source is None or entry["source"] == source]
+
+    def get(self, backup_id: str) -> Optional[Dict[str, Any]]:
+        return next((entry for entry in self._load() if entry["id"] == backup_id), None)
+
+    def read(self, entry: Dict[str, Any]) -> bytes:
+        """Contents of the file as it was backed up"""
+        return gzip.decompress(self._object_path(entry["digest"]).read_bytes())
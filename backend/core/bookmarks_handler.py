@@ -1,6 +1,28 @@
-import yaml
-from typing import Dict, List, Any, Optional, Union
+from typing import IO, Dict, Iterator, List, Any, NamedTuple, Optional, Union
 from pathlib import Path
+import copy
+from .config_cache import ConfigCache, CachedSnapshot
+from .io_pool import AsyncHandler
+from .metrics import timed
+from .profiling import phase
+from .file_io import atomic_write
+from .write_coordinator import WriteCoordinator, mutation
+from .yaml_export import ExportCache
+from .yaml_backend import NormalizedText, SafeDumper, safe_load, safe_dump
+
+class BookmarksDumper(SafeDumper):
+    """Writes empty values as nothing rather than 'null', for cleaner YAML output"""
+
+
+BookmarksDumper.add_representer(
+    type(None), lambda dumper, _: dumper.represent_scalar('tag:yaml.org,2002:null', ''))
+
+
+class ParsedBookmarks(NamedTuple):
+    """Cached parse of bookmarks.yaml: loaded content and parse_bookmarks() result"""
+    bookmarks: Union[List[Dict[str, Any]], Dict[str, Any]]
+    groups: Dict[str, List[Dict]]
+
 
 class BookmarksHandler:
     """Handle YAML parsing and generation for Homepage bookmarks configuration"""
@@ -9,61 +31,113 @@ class BookmarksHandler:
         self.bookmarks_path = Path(bookmarks_path)
         self.bookmarks_path.parent.mkdir(parents=True, exist_ok=True)
 
-    def load_bookmarks(self) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
-        """Load bookmarks configuration from YAML file
-        Returns either a list (standard format) or dict (direct format)
-        """
-        if not self.bookmarks_path.exists():
-            return []
+        # Loaded content and parse_bookmarks() result, shared until the file changes
+        self._cache = ConfigCache(self.bookmarks_path, self._parse_snapshot, lambda: ParsedBookmarks([], {}))
+
+        # Serializes mutations of this file across requests and workers
+        self.writes = WriteCoordinator(self.bookmarks_path)
 
+        # Serialized exports of the current version
+        self._exports = ExportCache()
+
+        # Same methods, awaitable and run on the I/O pool
+        self.aio = AsyncHandler(self)
+
+    def _parse_snapshot(self, text: str) -> ParsedBookmarks:
+        """Parse file contents into a ParsedBookmarks for the cache"""
         try:
-            with open(self.bookmarks_path, 'r', encoding='utf-8') as f:
-                # Read content and clean tabs
-                raw_content = f.read()
-
-                # Replace tabs with spaces and clean up
-                lines = raw_content.split('\n')
-                cleaned_lines = []
-                for line in lines:
-                    # Replace tabs with 2 spaces and remove trailing whitespace
-                    cleaned_line = line.replace('\t', '  ').rstrip()
-                    cleaned_lines.append(cleaned_line)
-                cleaned_content = '\n'.join(cleaned_lines)
-
-                # Parse cleaned YAML
-                content = yaml.safe_load(cleaned_content)
-
-                # Return content as-is, whether it's a list or dict
-                if content is None:
-                    return []
-                return content
+            # Replace tabs with spaces and clean up
+            lines = text.split('\n')
+            cleaned_lines = []
+            for line in lines:
+                # Replace tabs with 2 spaces and remove trailing whitespace
+                cleaned_line = line.replace('\t', '  ').rstrip()
+                cleaned_lines.append(cleaned_line)
+            cleaned_content = '\n'.join(cleaned_lines)
+
+            # Parse cleaned YAML
+            with phase("parse"):
+                content = safe_load(cleaned_content)
+
+            # Return content as-is, whether it's a list or dict
+            if content is None:
+                content = []
+            return ParsedBookmarks(content, self.parse_bookmarks(content))
         except Exception as e:
             print(f"Error loading bookmarks: {e}")
-            return []
+            return ParsedBookmarks([], {})
+
+    def snapshot(self) -> CachedSnapshot:
+        """Current cached snapshot; its data is a ParsedBookmarks
+
+        The returned objects are shared between requests and must not be modified.
+        """
+        return self._cache.get()
 
+    def get_groups(self) -> Dict[str, List[Dict]]:
+        """Cached parse_bookmarks() result for read-only use"""
+        return self._cache.get().data.groups
+
+    def version(self) -> str:
+        """Content hash of bookmarks.yaml, without parsing it"""
+        return self._cache.version()
+
+    def refresh(self) -> bool:
+        """Re-parse bookmarks.yaml if it changed on disk; called by the file watcher"""
+        return self._cache.refresh()
+
+    def set_watched(self, watched: bool):
+        """Serve the cached snapshot without stat() calls while a file watcher runs"""
+        self._cache.watched = watched
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the parsed bookmarks cache"""
+        return self._cache.stats()
+
+    @timed()
+    def load_bookmarks(self) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """Load bookmarks configuration from YAML file
+        Returns either a list (standard format) or dict (direct format)
+        The result is a private copy of the cached content and may be modified;
+        the file is always checked, since writers start from it.
+        """
+        return copy.deepcopy(self._cache.get(verify=True).data.bookmarks)
+
+    @mutation
     def save_bookmarks(self, bookmarks: List[Dict[str, Any]]) -> bool:
         """Save bookmarks configuration to YAML file"""
         try:
-            # Custom representer for cleaner YAML output
-            def represent_none(self, _):
-                return self.represent_scalar('tag:yaml.org,2002:null', '')
-
-            yaml.add_representer(type(None), represent_none)
-
-            with open(self.bookmarks_path, 'w', encoding='utf-8') as f:
-                yaml.dump(bookmarks, f,
-                         default_flow_style=False,
-                         allow_unicode=True,
-                         sort_keys=False,
-                         indent=2,  # Homepage uses 2-space indentation
-                         default_style=None,
-                         explicit_start=False,
-                         explicit_end=False)
+            with phase("dump"):
+                content = safe_dump(bookmarks,
+                                   Dumper=BookmarksDumper,
+                                   default_flow_style=False,
+                                   allow_unicode=True,
+                                   sort_keys=False,
+                                   indent=2,  # Homepage uses 2-space indentation
+                                   default_style=None,
+                                   explicit_start=False,
+                                   explicit_end=False)
+            atomic_write(self.bookmarks_path, content)
             return True
         except Exception as e:
             print(f"Error saving bookmarks: {e}")
             return False
+        finally:
+            self._cache.invalidate()
 
+    @mutation
+    def restore(self, content: bytes) -> bool:
+        """Replace the file with earlier contents (a backup), byte for byte"""
+        try:
+            atomic_write(self.bookmarks_path, content)
+            return True
+        except Exception as e:
+            print(f"Error restoring bookmarks: {e}")
+            return False
+        finally:
+            self._cache.invalidate()
+
+    @phase("build")
     def parse_bookmarks(self, config: Union[List[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, List[Dict]]:
         """Parse bookmarks from configuration into groups
         Supports multiple formats:
@@ -177,6 +251,7 @@ class BookmarksHandler:
 
         return config
 
+    @mutation
     def add_bookmark(self, group: str, bookmark_name: str, bookmark_config: Dict) -> bool:
         """Add a bookmark to a group"""
         bookmarks = self.load_bookmarks()
@@ -198,6 +273,7 @@ class BookmarksHandler:
         new_config = self.build_bookmarks_config(groups)
         return self.save_bookmarks(new_config)
 
+    @mutation
     def update_bookmark(self, group: str, bookmark_name: str, bookmark_config: Dict) -> bool:
         """Update a bookmark configuration"""
         bookmarks = self.load_bookmarks()
@@ -214,6 +290,7 @@ class BookmarksHandler:
 
         return False
 
+    @mutation
     def delete_bookmark(self, group: str, bookmark_name: str) -> bool:
         """Delete a bookmark from a group"""
         bookmarks = self.load_bookmarks()
@@ -233,47 +310,107 @@ class BookmarksHandler:
         new_config = self.build_bookmarks_config(groups)
         return self.save_bookmarks(new_config)
 
-    def get_all_groups(self) -> List[str]:
-        """Get list of all bookmark groups"""
+    @mutation
+    def edit_bookmark(self, group: str, bookmark_name: str, changes: Dict[str, Any]) -> bool:
+        """Apply field changes to a bookmark in one write
+        changes may contain name, href, icon and description; a new name
+        re-adds the bookmark at the end of the group under that name
+        """
+        bookmarks = self.load_bookmarks()
+        groups = self.parse_bookmarks(bookmarks)
+
+        if group not in groups:
+            return False
+
+        existing = next((b for b in groups[group] if b['name'] == bookmark_name), None)
+        if existing is None:
+            return False
+
+        bookmark_config = existing.get('config', {})
+        new_name = changes.get('name') or bookmark_name
+
+        # Update name if changed
+        if new_name != bookmark_name:
+            if any(b['name'] == new_name for b in groups[group]):
+                return False
+            bookmark_config["abbr"] = new_name
+        elif "abbr" not in bookmark_config:
+            bookmark_config["abbr"] = bookmark_name
+
+        for field in ('href', 'icon', 'description'):
+            if changes.get(field) is not None:
+                bookmark_config[field] = changes[field]
+
+        if new_name != bookmark_name:
+            groups[group].remove(existing)
+            groups[group].append({'name': new_name, 'config': bookmark_config})
+        else:
+            existing['config'] = bookmark_config
+
+        new_config = self.build_bookmarks_config(groups)
+        return self.save_bookmarks(new_config)
+
+    @mutation
+    def add_group(self, group: str) -> bool:
+        """Add an empty bookmark group"""
         bookmarks = self.load_bookmarks()
         groups = self.parse_bookmarks(bookmarks)
-        return list(groups.keys())
 
-    def export_yaml(self) -> str:
-        """Export bookmarks as YAML string"""
+        if group in groups:
+            return False
+
+        groups[group] = []
+        new_config = self.build_bookmarks_config(groups)
+        return self.save_bookmarks(new_config)
+
+    @mutation
+    def rename_group(self, group: str, new_name: str) -> bool:
+        """Rename a bookmark group"""
         bookmarks = self.load_bookmarks()
+        groups = self.parse_bookmarks(bookmarks)
 
-        # Ensure we always export in list format for consistency
-        if isinstance(bookmarks, dict):
-            # Convert dict format to list format
-            list_bookmarks = []
-            for group_name, group_bookmarks in bookmarks.items():
-                list_bookmarks.append({group_name: group_bookmarks})
-            bookmarks = list_bookmarks
-
-        return yaml.dump(bookmarks,
-                        default_flow_style=False,
-                        allow_unicode=True,
-                        sort_keys=False,
-                        indent=2)
-
-    def import_yaml(self, yaml_content: str) -> bool:
-        """Import bookmarks from YAML string"""
-        try:
-            # Remove document separator if present
-            if yaml_content.startswith('---'):
-                yaml_content = yaml_content[3:].strip()
+        if group not in groups or new_name in groups:
+            return False
 
-            # Clean up tabs and trailing spaces
-            lines = yaml_content.split('\n')
-            cleaned_lines = []
-            for line in lines:
-                cleaned_line = line.replace('\t', '  ').rstrip()
-                cleaned_lines.append(cleaned_line)
-            yaml_content = '\n'.join(cleaned_lines)
+        groups[new_name] = groups.pop(group)
+        new_config = self.build_bookmarks_config(groups)
+        return self.save_bookmarks(new_config)
+
+    @mutation
+    def delete_group(self, group: str) -> bool:
+        """Delete a bookmark group and all its bookmarks"""
+        bookmarks = self.load_bookmarks()
+        groups = self.parse_bookmarks(bookmarks)
+
+        if group not in groups:
+            return False
 
-            # Parse and save
-            bookmarks = yaml.safe_load(yaml_content)
+        del groups[group]
+        new_config = self.build_bookmarks_config(groups)
+        return self.save_bookmarks(new_config)
+
+    def get_all_groups(self) -> List[str]:
+        """Get list of all bookmark groups"""
+        return list(self.get_groups().keys())
+
+    def export_yaml(self, groups: Optional[List[str]] = None) -> str:
+        """Export bookmarks as YAML string, in list format
+        Serialized once per version of the file; groups limits it to those
+        """
+        snapshot = self._cache.get()
+        return self._exports.export(snapshot.version, snapshot.data.bookmarks, groups)
+
+    def iter_export_yaml(self, groups: Optional[List[str]] = None) -> Iterator[str]:
+        """export_yaml() in parts, one group at a time"""
+        snapshot = self._cache.get()
+        return self._exports.iter_export(snapshot.version, snapshot.data.bookmarks, groups)
+
+    @mutation
+    def import_yaml(self, yaml_content: Union[str, IO]) -> bool:
+        """Import bookmarks from YAML string or binary file (read in chunks)"""
+        try:
+            # Clean up tabs and trailing spaces while parsing
+            bookmarks = safe_load(NormalizedText(yaml_content, tab='  '))
 
             if not bookmarks:
                 return False
@@ -283,10 +420,13 @@ class BookmarksHandler:
                 bookmarks = [bookmarks]
 
             return self.save_bookmarks(bookmarks)
+        except UnicodeDecodeError:
+            raise
         except Exception as e:
             print(f"Error importing bookmarks YAML: {e}")
             return False
 
+    @mutation
     def reorder_bookmarks(self, group: str, bookmark_order: List[str]) -> bool:
         """Reorder bookmarks within a group"""
         bookmarks = self.load_bookmarks()
@@ -313,6 +453,7 @@ class BookmarksHandler:
         new_config = self.build_bookmarks_config(groups)
         return self.save_bookmarks(new_config)
 
+    @mutation
     def reorder_groups(self, group_order: List[str]) -> bool:
         """Reorder bookmark groups"""
         bookmarks = self.load_bookmarks()
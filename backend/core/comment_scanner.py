@@ -0,0 +1,549 @@
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+from ruamel.yaml.error import CommentMark
+from ruamel.yaml.tokens import CommentToken
+
+# Service fields that are commented out when a health check is disabled
+HEALTH_CHECK_FIELDS = ('ping', 'server', 'container')
+
+
+class Indentation(NamedTuple):
+    """ruamel indent() settings: mapping and sequence indent, dash offset"""
+    mapping: int
+    sequence: int
+    offset: int
+
+
+# '- Group:', '  - Service:', '      field:'
+DEFAULT_INDENTATION = Indentation(2, 2, 0)
+
+
+class IndexEntry(NamedTuple):
+    """A category or service found in the file (offsets are in bytes)"""
+    category: str
+    name: str
+    line: int
+    offset: int
+    hidden: bool = False
+
+
+class HiddenBlock(NamedTuple):
+    """A commented-out service: its header entry plus the commented body lines"""
+    entry: IndexEntry
+    lines: List[Tuple[int, str]]  # (indent of '#', text after '# '); (0, '') for blank lines
+
+    def has_body(self) -> bool:
+        return any(content for _, content in self.lines)
+
+
+class ConfigIndex:
+    """Structural index of services.yaml built by scan_config()"""
+
+    def __init__(self):
+        self.categories: List[IndexEntry] = []
+        # Visible and hidden services per category, in file order
+        self.services: Dict[str, List[IndexEntry]] = {}
+        self.hidden_blocks: List[HiddenBlock] = []
+        # {"category:service": {field: value}} for commented health check fields
+        self.commented_fields: Dict[str, Dict[str, str]] = {}
+        # {"category:service": {field: service key the comment follows, or None}}
+        self.field_anchors: Dict[str, Dict[str, Optional[str]]] = {}
+        # {"category:service": stripped text of the commented field lines}
+        self.field_lines: Dict[str, set] = {}
+        # Columns of the service items and of the first service's fields
+        self.service_indent: Optional[int] = None
+        self.field_indent: Optional[int] = None
+
+    def hidden_keys(self) -> set:
+        return {f"{block.entry.category}:{block.entry.name}" for block in self.hidden_blocks}
+
+    def service_ranks(self, category: str) -> Dict[str, int]:
+        """{service name: position in file} for one category"""
+        return {entry.name: rank for rank, entry in enumerate(self.services.get(category, []))}
+
+    def indentation(self) -> Indentation:
+        """Indentation that dumps the file with the layout it has"""
+        if self.service_indent is None or self.service_indent < 2:
+            return DEFAULT_INDENTATION
+        mapping = 2
+        if self.field_indent is not None:
+            # Fields are indented from the service name, two columns after the dash
+            mapping = self.field_indent - self.service_indent - 2
+        if mapping < 1:
+            return DEFAULT_INDENTATION
+        return Indentation(mapping, self.service_indent, self.service_indent - 2)
+
+
+def _is_item(stripped: str) -> bool:
+    return stripped.startswith('- ') and ':' in stripped
+
+
+def _is_commented_item(stripped: str) -> bool:
+    return stripped.startswith('# - ') and ':' in stripped
+
+
+def scan_config(text: str) -> ConfigIndex:
+    """Tokenize services.yaml in one pass
+
+    Recognizes categories (indent 0), services and commented-out (hidden)
+    services (at the indent of the first item below a category, 2 or 4 in
+    practice), the commented body of each hidden service and commented
+    health check fields of visible services.
+    """
+    index = ConfigIndex()
+    service_indent: Optional[int] = None
+    category: Optional[str] = None
+    service: Optional[str] = None
+    block: Optional[HiddenBlock] = None
+    # Indent of the current service's own keys and the last one seen
+    field_indent: Optional[int] = None
+    last_key: Optional[str] = None
+    offset = 0
+
+    for line_number, line in enumerate(text.splitlines(keepends=True)):
+        line_offset = offset
+        offset += len(line) if line.isascii() else len(line.encode('utf-8'))
+
+        lstripped = line.lstrip()
+        stripped = lstripped.rstrip()
+        indent = len(line) - len(lstripped)
+
+        # Body of a hidden service: every comment line up to the next item
+        if block is not None:
+            if not stripped:
+                # Kept so the layout after the block survives a save
+                block.lines.append((0, ''))
+                continue
+            if stripped.startswith('#') and not (indent == service_indent and _is_commented_item(stripped)):
+                content = stripped[1:]
+                if content and content[0] == ' ':
+                    content = content[1:]
+                block.lines.append((indent, content))
+                continue
+            block = None
+
+        if indent == 0 and _is_item(stripped):
+            category = stripped.split(':')[0][2:].strip()
+            service = None
+            entry = IndexEntry(category, category, line_number, line_offset)
+            index.categories.append(entry)
+            index.services.setdefault(category, [])
+            continue
+
+        # Services are the items one level below the categories
+        if service_indent is None and category and indent > 0 \
+                and (_is_item(stripped) or _is_commented_item(stripped)):
+            service_indent = index.service_indent = indent
+
+        if indent == service_indent and category:
+            if _is_commented_item(stripped):
+                service = stripped[4:].split(':')[0].strip()
+                entry = IndexEntry(category, service, line_number, line_offset, hidden=True)
+                index.services[category].append(entry)
+                block = HiddenBlock(entry, [])
+                index.hidden_blocks.append(block)
+                continue
+            if _is_item(stripped):
+                service = stripped.split(':')[0][2:].strip()
+                index.services[category].append(IndexEntry(category, service, line_number, line_offset))
+                field_indent = None
+                last_key = None
+                continue
+
+        # Commented health check field of the current service
+        if service and stripped.startswith('#'):
+            uncommented = stripped[1:].strip()
+            key = f"{category}:{service}"
+            for field in HEALTH_CHECK_FIELDS:
+                if f'{field}:' in uncommented:
+                    fields = index.commented_fields.setdefault(key, {})
+                    fields[field] = uncommented.split(':', 1)[1].strip()
+                    index.field_anchors.setdefault(key, {})[field] = last_key
+                    index.field_lines.setdefault(key, set()).add(stripped)
+        elif service and stripped and indent > service_indent:
+            if field_indent is None:
+                field_indent = indent
+                if index.field_indent is None:
+                    index.field_indent = indent
+            if indent == field_indent and ':' in stripped:
+                last_key = stripped.split(':')[0].strip().strip('\'"')
+
+    return index
+
+
+def hidden_block_snippet(key: str, block: HiddenBlock) -> str:
+    """Rebuild a hidden service as YAML, normalizing indentation relative to the block
+
+    The body keeps the columns it has after '# ', which are those of the
+    service dumped on its own (see comment_out()), so comments in it stay
+    put; a body indented less than a service's fields is shifted right.
+    """
+    base_indent = min(indent for indent, content in block.lines if content)
+    depth = min(indent - base_indent + len(content) - len(content.lstrip(' '))
+                for indent, content in block.lines if content)
+    shift = 0 if depth > 2 else 4 - depth
+    body = ''.join(
+        f"{' ' * (shift + indent - base_indent)}{content}\n" if content else "\n"
+        for indent, content in block.lines
+    )
+    return f"- {key}:\n{body}"
+
+
+# The helpers below edit the comment tokens ruamel attaches to a loaded tree.
+# Hidden services and disabled health check fields are turned back into real
+# nodes on load, so their comment copies have to go: otherwise an in-place
+# save would write them twice. ruamel attaches a run of comment lines to
+# whichever node precedes it (sometimes to the next item of the parent
+# sequence), so lines are matched by content rather than by position.
+
+def _comment_slots(node: Any) -> Iterator[list]:
+    """Comment slots attached directly to a ruamel node
+
+    Each slot is a list holding tokens, None or lists of tokens, and is read
+    as one run of consecutive comment lines.
+    """
+    ca = getattr(node, 'ca', None)
+    if ca is None:
+        return
+    if ca.comment:
+        yield ca.comment
+    yield from ca.items.values()
+    if ca.end:
+        yield [ca.end]
+
+
+def _subtree(node: Any) -> Iterator[Any]:
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            yield node
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            yield node
+            stack.extend(node)
+
+
+def _filter_lines(token: CommentToken, keep: Callable[[int, str], bool]) -> str:
+    """Token text without the comment lines rejected by keep(indent, stripped)"""
+    kept = []
+    for i, line in enumerate(token.value.splitlines(keepends=True)):
+        stripped = line.strip()
+        if i == 0:
+            # The first line starts at the token's column; an empty one ends the
+            # line of the node the comment is attached to
+            if not stripped or keep(token.column, stripped):
+                kept.append(line)
+        elif keep(len(line) - len(line.lstrip(' ')), stripped):
+            kept.append(line)
+    return ''.join(kept)
+
+
+def _filter_slot(slot: list, keep: Callable[[int, str], bool]):
+    """Drop comment lines from one slot in place"""
+    for i, entry in enumerate(slot):
+        if isinstance(entry, CommentToken):
+            value = _filter_lines(entry, keep)
+            if value != entry.value:
+                entry.value = value or '\n'
+        elif isinstance(entry, list):
+            kept = []
+            for token in entry:
+                if isinstance(token, CommentToken):
+                    value = _filter_lines(token, keep)
+                    if value != token.value:
+                        # Single-line tokens carry their own indent: remove, never blank them
+                        if '#' not in value:
+                            continue
+                        token.value = value
+                kept.append(token)
+            entry[:] = kept
+            if not kept:
+                # An empty list is dumped as a stray '-'
+                slot[i] = None
+
+
+def strip_comment_copies(config: Any, field_lines: set, service_indent: Optional[int] = 2):
+    """Remove hidden service blocks and the given commented field lines from a tree
+
+    Hidden blocks follow the scan_config() rule: a block starts at a
+    '# - name:' line at the services' indent and takes every comment line
+    after it.
+    """
+    for node in _subtree(config):
+        for slot in _comment_slots(node):
+            in_block = False
+
+            def keep(indent: int, stripped: str) -> bool:
+                nonlocal in_block
+                if indent == service_indent and _is_commented_item(stripped):
+                    in_block = True
+                return not in_block and stripped not in field_lines
+
+            _filter_slot(slot, keep)
+
+
+# Saving goes the other way: before a dump, comment_out() takes hidden
+# services and disabled health check fields out of the tree and attaches
+# them as comment tokens, the way ruamel attaches comments it loads: to the
+# last scalar before them, or before the first entry of a collection.
+# Every change is undone after the dump, so the cached tree stays the one
+# a reload of the written file would give.
+
+def _last_key(node: Any) -> Any:
+    """Last key (or index) of a collection that the dump writes, None if it is empty"""
+    if isinstance(node, list):
+        return len(node) - 1 if node else None
+    keys = [key for key, _ in node.non_merged_items()] if isinstance(node, CommentedMap) else list(node)
+    return keys[-1] if keys else None
+
+
+def _last_leaf(node: Any, key: Any) -> Tuple[Any, Any]:
+    """(collection, key) of the last line node[key] is dumped as; comments after it go there"""
+    while isinstance(node[key], (dict, list)):
+        fa = getattr(node[key], 'fa', None)
+        if fa is not None and fa.flow_style():
+            # [a, b] and {a: b} end on their own line
+            break
+        last = _last_key(node[key])
+        if last is None:
+            break
+        node, key = node[key], last
+    return node, key
+
+
+def _comment_after(node: Any, key: Any, text: str, undo: List[Callable[[], None]]):
+    """Add comment lines after the line of node[key]"""
+    items = node.ca.items
+    entry = items.get(key)
+    slot = 2 if isinstance(node, dict) else 0
+    new = list(entry) if entry else [None] * (4 if isinstance(node, dict) else 2)
+    token = new[slot]
+    if isinstance(token, CommentToken):
+        value = token.value if token.value.endswith('\n') else token.value + '\n'
+        # Blank lines that end the run (e.g. between categories) stay after the new lines
+        body = value.rstrip('\n') + '\n'
+        new[slot] = CommentToken(body + text + value[len(body):], CommentMark(token.column))
+    else:
+        new[slot] = CommentToken('\n' + text, CommentMark(0))
+    items[key] = new
+    undo.append(lambda: items.__setitem__(key, entry) if entry is not None else items.pop(key, None))
+
+
+def move_blank_lines(config: CommentedMap, key: Any, to_key: Any, lines: set):
+    """Give the blank lines ending the comments after config[key] to config[to_key]
+
+    For a commented field turned back into to_key: when the comment run
+    after key ends with one of its lines (stripped text in lines), the
+    blank lines after it, e.g. before the next category, follow the field.
+    """
+    node, leaf = _last_leaf(config, key)
+    entry = node.ca.items.get(leaf)
+    token = entry[2 if isinstance(node, dict) else 0] if entry else None
+    if not isinstance(token, CommentToken):
+        return
+    body = token.value.rstrip('\n')
+    blank = len(token.value) - len(body) - 1
+    if blank < 1 or body.rsplit('\n', 1)[-1].strip() not in lines:
+        return
+    token.value = body + '\n'
+    config.ca.items[to_key] = [None, None, CommentToken('\n' * (blank + 1), CommentMark(0)), None]
+
+
+def _comment_before(parent: Any, key: Any, text: str, undo: List[Callable[[], None]]):
+    """Add comment lines before the first entry of the collection parent[key]"""
+    node = parent[key]
+    comment = node.ca.comment
+    new = list(comment) if comment else [None, None]
+    tokens = list(new[1] or [])
+    for line in text.splitlines(keepends=True):
+        column = len(line) - len(line.lstrip(' '))
+        tokens.append(CommentToken(line[column:], CommentMark(column if line.strip() else 0)))
+    new[1] = tokens
+    node.ca.comment = new
+    undo.append(lambda: setattr(node.ca, 'comment', comment))
+
+    # A mapping's own entry for the key takes precedence in the dump; ruamel
+    # keeps the same tokens in both places
+    entry = parent.ca.items.get(key) if isinstance(parent, dict) else None
+    if entry:
+        items = parent.ca.items
+        items[key] = list(entry[:3]) + [tokens]
+        undo.append(lambda: items.__setitem__(key, entry))
+
+
+def _pop(mapping: Dict, key: Any, undo: List[Callable[[], None]]) -> Any:
+    """Remove a key for the dump; undo puts it back where it was"""
+    position = list(mapping).index(key)
+    value = mapping.pop(key)
+
+    def put_back():
+        if isinstance(mapping, CommentedMap):
+            mapping.insert(position, key, value)
+        else:
+            items = list(mapping.items())
+            items.insert(position, (key, value))
+            mapping.clear()
+            mapping.update(items)
+
+    undo.append(put_back)
+    return value
+
+
+def _set(node: Any, key: Any, value: Any, undo: List[Callable[[], None]]):
+    """Replace a value for the dump; undo puts the old one back"""
+    old = node[key]
+    node[key] = value
+    undo.append(lambda: node.__setitem__(key, old))
+
+
+def _commented(text: str, column: int) -> str:
+    """Dumped YAML turned into comment lines starting at column"""
+    lines = []
+    for line in text.splitlines(keepends=True):
+        if not line.strip():
+            lines.append('\n')
+        elif line.lstrip().startswith('#'):
+            lines.append(' ' * column + line)
+        else:
+            lines.append(f"{' ' * column}# {line}")
+    return ''.join(lines)
+
+
+def _comment_out_fields(item: Dict, name: Any, column: int, dump: Callable[[Any], str],
+                        undo: List[Callable[[], None]]):
+    """Turn the health check fields of one service into comments where they are"""
+    config = item[name]
+    anchor = None
+    # Comment lines of the fields after anchor, and the comments that followed them
+    fields: List[str] = []
+    kept: List[str] = []
+
+    def flush():
+        if not fields:
+            return
+        # Kept comments go first, where a reload of the file puts them; blank
+        # lines after them (e.g. before the next category) stay last
+        comments = ''.join(kept)
+        blank = len(comments) - len(comments.rstrip('\n'))
+        if comments.strip():
+            blank -= 1
+        text = comments[:len(comments) - blank] + ''.join(fields) + '\n' * blank
+        if anchor is not None:
+            _comment_after(*_last_leaf(config, anchor), text, undo)
+        elif len(config):
+            _comment_before(item, name, text, undo)
+        else:
+            # Nothing left to dump: write '- name:' with the comments below it
+            _set(item, name, None, undo)
+            _comment_after(item, name, text, undo)
+        fields.clear()
+        kept.clear()
+
+    for key in list(config):
+        if key not in HEALTH_CHECK_FIELDS:
+            flush()
+            anchor = key
+            continue
+        entry = config.ca.items.get(key) if isinstance(config, CommentedMap) else None
+        value = _pop(config, key, undo)
+        if type(value) is str:
+            # As loaded from the comment: written back verbatim
+            text = f"{key}: {value}\n"
+        else:
+            text = dump(CommentedMap([(key, value)]))
+        token = entry[2] if entry and len(entry) > 2 else None
+        if isinstance(token, CommentToken):
+            first, _, rest = token.value.partition('\n')
+            if first.strip():
+                text = f"{text[:-1]} {first.strip()}\n"
+            kept.append(rest)
+        fields.append(_commented(text, column))
+    flush()
+
+
+def _comment_out_category(container: Dict, category: Any, services: List, dash: int,
+                          field_column: int, dump: Callable[[Any], str],
+                          undo: List[Callable[[], None]]):
+    visible = []
+    # (number of visible services before it, commented-out text)
+    hidden: List[Tuple[int, str]] = []
+    for item in services:
+        name = next(iter(item), None) if isinstance(item, dict) else None
+        config = item[name] if name is not None else None
+        if not isinstance(config, dict):
+            visible.append(item)
+            continue
+        is_hidden = bool(config.get('hidden'))
+        disabled = bool(config.get('healthCheckDisabled'))
+        for flag in ('hidden', 'healthCheckDisabled'):
+            if flag in config:
+                _pop(config, flag, undo)
+        if is_hidden:
+            hidden.append((len(visible), _commented(dump(CommentedSeq([item])), dash)))
+            continue
+        if disabled:
+            _comment_out_fields(item, name, field_column, dump, undo)
+        visible.append(item)
+
+    if not hidden:
+        return
+    if not visible:
+        _set(container, category, None, undo)
+        for _, text in hidden:
+            _comment_after(container, category, text, undo)
+        return
+
+    # Take the hidden items out, keeping the comments of the others with them
+    items, comments = list(services), dict(services.ca.items)
+    positions = {id(item): i for i, item in enumerate(items)}
+    list.__setitem__(services, slice(None), visible)
+    services.ca.items.clear()
+    for i, item in enumerate(visible):
+        if positions[id(item)] in comments:
+            services.ca.items[i] = comments[positions[id(item)]]
+
+    def put_back():
+        list.__setitem__(services, slice(None), items)
+        services.ca.items.clear()
+        services.ca.items.update(comments)
+
+    undo.append(put_back)
+
+    for before, text in hidden:
+        if before == 0:
+            _comment_before(container, category, text, undo)
+        else:
+            _comment_after(*_last_leaf(services, before - 1), text, undo)
+
+
+def comment_out(config: Any, indentation: Indentation, dump: Callable[[Any], str]) -> Callable[[], None]:
+    """Turn hidden services and disabled health check fields into comments, for a dump
+
+    The reverse of loading: services flagged ``hidden`` leave their
+    category and are written, commented out, after the service before them;
+    the health check fields of services flagged ``healthCheckDisabled``
+    become comment lines where they were. Both flags are left out. dump()
+    serializes a node with the given indentation. The tree is edited in
+    place: call the returned function after the dump to put it back.
+    """
+    undo: List[Callable[[], None]] = []
+
+    def restore():
+        while undo:
+            undo.pop()()
+
+    # Service items sit below the category keys, at column 2 in the list format
+    dash = indentation.offset + (2 if isinstance(config, list) else 0)
+    field_column = dash + 2 + indentation.mapping
+    containers = [config] if isinstance(config, dict) else [item for item in config or [] if isinstance(item, dict)]
+    try:
+        for container in containers:
+            for category, services in list(container.items()):
+                if isinstance(services, list):
+                    _comment_out_category(container, category, services, dash, field_column, dump, undo)
+    except Exception:
+        restore()
+        raise
+    return restore
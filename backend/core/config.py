@@ -15,17 +15,81 @@ class Settings(BaseSettings):
     auth_password: str = "admin"  # Default password, CHANGE THIS!
     session_secret: str = "change-this-to-a-random-secret-key"
     session_expire_minutes: int = 60 * 24  # 24 hours
+    # Verified tokens kept in memory, so requests skip the signature check
+    token_cache_size: int = 1024
 
     # File paths
     config_path: str = "config/services.yaml"
     example_config_path: str = "config/example.yaml"
     upload_dir: str = "uploads"
 
+    # Worker threads for blocking YAML parse/serialize and file I/O
+    io_pool_size: int = 4
+
+    # Largest config/bookmarks file accepted by the import endpoints (bytes)
+    import_max_size: int = 10 * 1024 * 1024
+
+    # Backups of services.yaml and bookmarks.yaml: stored once per distinct
+    # content, gzipped. Kept per file: the newest KEEP_LAST, plus the newest
+    # of each of the last KEEP_DAILY days and KEEP_WEEKLY weeks.
+    backup_dir: str = "config/backups"
+    backup_keep_last: int = 10
+    backup_keep_daily: int = 7
+    backup_keep_weekly: int = 4
+
+    # Journal of the changes made through the API (audit trail, undo/redo).
+    # A file is snapshotted every SNAPSHOT_EVERY changes; past MAX_ENTRIES
+    # records the log is compacted.
+    journal_dir: str = "config/journal"
+    journal_snapshot_every: int = 50
+    journal_max_entries: int = 1000
+
+    # Parser for reading services.yaml: auto (libyaml if PyYAML has it, else
+    # pyyaml), libyaml, pyyaml or ruamel. Writes always go through ruamel,
+    # which keeps comments.
+    yaml_parser: str = "auto"
+
+    # /api/events change feed: heartbeat interval, per-client queue size
+    # (a client that falls further behind is told to resync), client limit
+    # and how long a ticket for opening the stream is valid
+    events_heartbeat_seconds: int = 15
+    events_queue_size: int = 100
+    events_max_clients: int = 100
+    events_ticket_seconds: int = 60
+
+    # Watch the config files for outside edits (inotify, or stat() polling
+    # where unavailable). Changes are picked up within the debounce delay,
+    # or the poll interval at worst. Without it every read stat()s the file.
+    watch_files: bool = True
+    watch_interval_seconds: float = 2.0
+    watch_debounce_ms: int = 200
+
+    # gzip for API responses at least this large (bytes); compressed bytes
+    # of versioned responses are cached (entries)
+    compression_minimum_size: int = 1024
+    compression_level: int = 6
+    compression_cache_entries: int = 32
+
+    # Prometheus metrics on /metrics (unauthenticated, like /health)
+    metrics_enabled: bool = True
+
+    # Server-Timing header with a phase breakdown (parse, comments, build,
+    # dump, fsync, render) on every response; authenticated clients can ask
+    # for it per request with "X-Server-Timing: 1" instead. "X-Profile: 1"
+    # (or PROFILE_SAMPLE_RATE, a fraction of requests) captures a cProfile
+    # of the request; the last PROFILE_KEEP are kept for /api/profiles.
+    server_timing: bool = False
+    profile_sample_rate: float = 0.0
+    profile_keep: int = 20
+
     # API configuration
     api_prefix: str = "/api"
 
     # Frontend configuration
     frontend_path: str = "frontend"
+    # Rescan the frontend files for changes at most this often (seconds) when
+    # pages are requested; 0 loads them once at startup
+    frontend_reload_seconds: float = 0
 
     # CORS settings
     cors_origins: list = ["*"]
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+
+class FileSignature(NamedTuple):
+    """Identity of a file's contents: (inode, size, mtime_ns, content hash)"""
+    inode: int
+    size: int
+    mtime_ns: int
+    digest: str
+
+    @property
+    def stat_key(self) -> Tuple[int, int, int]:
+        return (self.inode, self.size, self.mtime_ns)
+
+
+class CachedSnapshot:
+    """Parsed contents of a config file, shared read-only between requests"""
+
+    def __init__(self, signature: Optional[FileSignature], data: Any, text: str = ""):
+        self.signature = signature
+        self.data = data
+        self.text = text
+
+    @property
+    def version(self) -> str:
+        """Content hash of the file this snapshot was parsed from"""
+        return self.signature.digest if self.signature else "empty"
+
+
+class ConfigCache:
+    """Process-wide cache of a parsed config file
+
+    A snapshot is reused as long as the file's inode, size and mtime_ns are
+    unchanged. When they do change the file is re-read and hashed; the parser
+    only runs again if the content hash differs too.
+
+    While ``watched`` is set a FileWatcher calls refresh() on changes, so reads
+    return the snapshot without a stat(); get(verify=True) still checks.
+    """
+
+    def __init__(self, path: Path, loader: Callable[[str], Any], empty: Callable[[], Any]):
+        self.path = Path(path)
+        self._loader = loader
+        self._empty = empty
+        self._lock = threading.Lock()
+        self._snapshot: Optional[CachedSnapshot] = None
+        # Bumped by invalidate(), so a refresh() racing a save is discarded
+        self._generation = 0
+        self.watched = False
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.refreshes = 0
+
+    def _stat(self) -> Optional[os.stat_result]:
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+    def _read(self) -> Tuple[FileSignature, bytes]:
+        """Read the file with the signature of exactly the bytes read"""
+        with open(self.path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        return FileSignature(st.st_ino, st.st_size, st.st_mtime_ns, digest), raw
+
+    def get(self, verify: bool = False) -> CachedSnapshot:
+        """Return the current snapshot, re-parsing only if the file changed
+
+        A watched file is only stat()ed when verify is set (e.g. before a write).
+        """
+        if self.watched and not verify:
+            with self._lock:
+                if self._snapshot is not None:
+                    self.hits += 1
+                    return self._snapshot
+
+        st = self._stat()
+
+        with self._lock:
+            snapshot = self._snapshot
+
+            if st is None:
+                if snapshot is None or snapshot.signature is not None:
+                    self.misses += 1
+                    self._snapshot = CachedSnapshot(None, self._empty())
+                else:
+                    self.hits += 1
+                return self._snapshot
+
+            stat_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+            if snapshot is not None and snapshot.signature is not None \
+                    and snapshot.signature.stat_key == stat_key:
+                self.hits += 1
+                return snapshot
+
+            signature, raw = self._read()
+            digest = signature.digest
+
+            # Touched or rewritten with identical content: keep the parsed data
+            if snapshot is not None and snapshot.signature is not None \
+                    and snapshot.signature.digest == digest:
+                self.revalidations += 1
+                self._snapshot = CachedSnapshot(signature, snapshot.data, snapshot.text)
+                return self._snapshot
+
+            self.misses += 1
+            text = raw.decode('utf-8')
+            self._snapshot = CachedSnapshot(signature, self._loader(text), text)
+            return self._snapshot
+
+    def version(self) -> str:
+        """Content hash of the file on disk, without parsing it
+
+        Only a stat() while the file matches the cached snapshot; otherwise the
+        file is hashed but the snapshot is left for the next get().
+        """
+        with self._lock:
+            snapshot = self._snapshot
+        if self.watched and snapshot is not None:
+            return snapshot.version
+
+        st = self._stat()
+        if st is None:
+            return "empty"
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.signature is not None \
+                    and snapshot.signature.stat_key == (st.st_ino, st.st_size, st.st_mtime_ns):
+                return snapshot.signature.digest
+
+        with open(self.path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def refresh(self) -> bool:
+        """Re-read the file if it changed and swap in the new snapshot
+
+        Parsing happens outside the lock, so readers keep getting the previous
+        snapshot until the new one is ready. Returns True if it was replaced.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            generation = self._generation
+
+        st = self._stat()
+        if st is None:
+            if snapshot is not None and snapshot.signature is None:
+                return False
+            signature, data, text = None, self._empty(), ""
+        else:
+            if snapshot is not None and snapshot.signature is not None \
+                    and snapshot.signature.stat_key == (st.st_ino, st.st_size, st.st_mtime_ns):
+                return False
+            signature, raw = self._read()
+            if snapshot is not None and snapshot.signature is not None \
+                    and snapshot.signature.digest == signature.digest:
+                data, text = snapshot.data, snapshot.text
+            else:
+                text = raw.decode('utf-8')
+                data = self._loader(text)
+
+        with self._lock:
+            if self._generation != generation or self._snapshot is not snapshot:
+                # Saved or re-read meanwhile; that result is at least as new
+                return False
+            self._snapshot = CachedSnapshot(signature, data, text)
+            if snapshot is not None and data is snapshot.data:
+                self.revalidations += 1
+                return False
+            self.refreshes += 1
+            return True
+
+    def invalidate(self):
+        """Drop the cached snapshot so the next read re-parses the file"""
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters for monitoring"""
+        lookups = self.hits + self.misses + self.revalidations
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+            "refreshes": self.refreshes,
+            "watched": self.watched,
+            "hit_ratio": round((self.hits + self.revalidations) / lookups, 4) if lookups else 0.0,
+            "version": self._snapshot.version if self._snapshot else None,
+        }
@@ -0,0 +1,283 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ruamel.yaml.comments import CommentedMap, CommentedSeq
+
+
+def as_nodes(data: Any) -> Any:
+    """data with plain dicts and lists turned into ruamel nodes, which can carry comments"""
+    if isinstance(data, (CommentedMap, CommentedSeq)):
+        return data
+    if isinstance(data, dict):
+        return CommentedMap((key, as_nodes(value)) for key, value in data.items())
+    if isinstance(data, list):
+        return CommentedSeq(as_nodes(value) for value in data)
+    return data
+
+
+def rename_key(mapping: Dict, old: Any, new: Any):
+    """Rename a key in place, keeping its position and the comments attached to it"""
+    if not isinstance(mapping, CommentedMap):
+        items = [(new if key == old else key, value) for key, value in mapping.items()]
+        mapping.clear()
+        mapping.update(items)
+        return
+    position = list(mapping).index(old)
+    comment = mapping.ca.items.pop(old, None)
+    mapping.insert(position, new, mapping[old])
+    del mapping[old]
+    if comment is not None:
+        mapping.ca.items[new] = comment
+
+
+def update_mapping(target: Dict, source: Dict):
+    """Make target equal to source, touching only the keys that differ
+
+    Unchanged keys keep their position, quoting and comments; nested mappings
+    are updated the same way. New keys are appended.
+    """
+    for key in [key for key in target if key not in source]:
+        del target[key]
+    for key, value in source.items():
+        set_value(target, key, value)
+
+
+def set_value(mapping: Dict, key: Any, value: Any):
+    """Set one key, leaving the existing node alone if it already holds value"""
+    if key in mapping:
+        current = mapping[key]
+        if isinstance(current, dict) and isinstance(value, dict):
+            update_mapping(current, value)
+            return
+        if current == value:
+            return
+    mapping[key] = as_nodes(value)
+
+
+def _replace_items(seq: List, items: List):
+    """Replace the contents of a sequence node unless the order is unchanged"""
+    if len(seq) == len(items) and all(a is b for a, b in zip(seq, items)):
+        return
+    del seq[:]
+    seq.extend(items)
+
+
+class ConfigTree:
+    """Edit primitives working directly on the ruamel tree of services.yaml
+
+    Only the nodes being edited change, so comments and formatting of the
+    rest of the file are dumped as they were loaded. Both the list format
+    ([{category: [...]}]) and the direct format ({category: [...]}) keep
+    their shape. Services are found through an index, not by scanning:
+    by name, and then by their position in the category's sequence.
+    """
+
+    def __init__(self, config: Any):
+        self.root = config
+        # {category: mapping that holds the category key}
+        self._containers: Dict[str, Dict] = {}
+        # {(category, service name): (service item mapping, key in it)}
+        self._services: Dict[Tuple[str, str], Tuple[Dict, Any]] = {}
+        # {category: {id(service item mapping): position in services(category)}}
+        self._positions: Dict[str, Dict[int, int]] = {}
+        for container in self._category_containers():
+            for category, services in container.items():
+                self._containers.setdefault(category, container)
+                if isinstance(services, list):
+                    for item in services:
+                        self._index_item(category, item)
+        for category in self._containers:
+            if category in self:
+                self._index_positions(category)
+
+    def _category_containers(self) -> Iterator[Dict]:
+        if isinstance(self.root, dict):
+            yield self.root
+        elif isinstance(self.root, list):
+            for item in self.root:
+                if isinstance(item, dict):
+                    yield item
+
+    def _index_item(self, category: str, item: Any):
+        if isinstance(item, dict):
+            for key in item:
+                # First occurrence wins, as in parse_services()
+                self._services.setdefault((category, str(key)), (item, key))
+
+    def _index_positions(self, category: str):
+        self._positions[category] = {
+            id(item): i for i, item in enumerate(self.services(category)) if isinstance(item, dict)
+        }
+
+    def _renumber(self, category: str, start: int):
+        """Update the positions from start on, after an insert or a removal there"""
+        positions = self._positions[category]
+        services = self.services(category)
+        for i in range(start, len(services)):
+            if isinstance(services[i], dict):
+                positions[id(services[i])] = i
+
+    def _unindex_item(self, category: str, item: Any):
+        for key in item:
+            if self._services.get((category, str(key)), (None,))[0] is item:
+                del self._services[(category, str(key))]
+
+    # Lookups
+
+    def __contains__(self, category: str) -> bool:
+        return isinstance(self._containers.get(category, {}).get(category), list)
+
+    def services(self, category: str) -> List:
+        """The sequence node holding a category's service items"""
+        return self._containers[category][category]
+
+    def has_service(self, category: str, name: str) -> bool:
+        return (category, name) in self._services
+
+    def get(self, category: str, name: str) -> Any:
+        """A service's config node, or None if there is no such service"""
+        found = self._services.get((category, name))
+        if found is None:
+            return None
+        item, key = found
+        return item[key]
+
+    def _config(self, category: str, name: str) -> Dict:
+        """A service's config node for editing; an empty config becomes a mapping"""
+        item, key = self._services[(category, name)]
+        if not isinstance(item[key], dict):
+            item[key] = CommentedMap()
+        return item[key]
+
+    def _position(self, category: str, item: Dict) -> int:
+        position = self._positions[category].get(id(item))
+        if position is None:
+            raise ValueError(f"Service item not found in {category}")
+        return position
+
+    # Categories
+
+    def add_category(self, category: str):
+        container = self._containers.get(category)
+        if container is not None:
+            # Present without a list of services (e.g. '- Name:' with no value)
+            container[category] = CommentedSeq()
+            self._positions[category] = {}
+            return
+        if isinstance(self.root, dict):
+            container = self.root
+            container[category] = CommentedSeq()
+        else:
+            container = CommentedMap([(category, CommentedSeq())])
+            self.root.append(container)
+        self._containers[category] = container
+        self._positions[category] = {}
+
+    def remove_category(self, category: str) -> List:
+        container = self._containers.pop(category)
+        self._positions.pop(category, None)
+        services = container[category]
+        if isinstance(services, list):
+            for item in services:
+                if isinstance(item, dict):
+                    self._unindex_item(category, item)
+        if container is not self.root and len(container) == 1:
+            position = next(i for i, item in enumerate(self.root) if item is container)
+            del self.root[position]
+        else:
+            del container[category]
+        return services
+
+    def rename_category(self, category: str, new_name: str):
+        """Rename a category in place"""
+        container = self._containers.pop(category)
+        rename_key(container, category, new_name)
+        self._containers[new_name] = container
+        if category in self._positions:
+            self._positions[new_name] = self._positions.pop(category)
+        services = container[new_name]
+        if isinstance(services, list):
+            for item in services:
+                if isinstance(item, dict):
+                    self._unindex_item(category, item)
+                    self._index_item(new_name, item)
+
+    def reorder_categories(self, order: List[str]):
+        """Reorder categories; those missing from the order keep their relative order at the end"""
+        rank = {name: i for i, name in enumerate(order)}
+        if isinstance(self.root, dict):
+            for name in sorted(self.root, key=lambda name: rank.get(name, len(rank))):
+                self.root.move_to_end(name)
+            return
+
+        def container_rank(item: Any) -> int:
+            if isinstance(item, dict):
+                for name in item:
+                    return rank.get(name, len(rank))
+            return len(rank)
+
+        _replace_items(self.root, sorted(self.root, key=container_rank))
+
+    # Services
+
+    def insert_item(self, category: str, item: Dict, index: Optional[int] = None):
+        """Insert a service item node, creating the category if needed"""
+        if category not in self:
+            self.add_category(category)
+        services = self.services(category)
+        if index is None or index >= len(services):
+            index = len(services)
+            services.append(item)
+        else:
+            index = max(0, index)
+            services.insert(index, item)
+        self._renumber(category, index)
+        self._index_item(category, item)
+
+    def insert_service(self, category: str, name: str, config: Dict, index: Optional[int] = None):
+        self.insert_item(category, CommentedMap([(name, as_nodes(config))]), index)
+
+    def remove_service(self, category: str, name: str) -> Optional[Dict]:
+        """Remove a service and return its item node; empty categories are kept"""
+        found = self._services.get((category, name))
+        if found is None:
+            return None
+        item = found[0]
+        position = self._position(category, item)
+        del self.services(category)[position]
+        del self._positions[category][id(item)]
+        self._renumber(category, position)
+        self._unindex_item(category, item)
+        return item
+
+    def move_service(self, category: str, name: str, to_category: str, index: Optional[int] = None):
+        """Move a service node, with its comments, to a position in another (or the same) category"""
+        item = self.remove_service(category, name)
+        self.insert_item(to_category, item, index)
+
+    def rename_service(self, category: str, name: str, new_name: str):
+        """Rename a service in place"""
+        item, key = self._services.pop((category, name))
+        rename_key(item, key, new_name)
+        self._services[(category, new_name)] = (item, new_name)
+
+    def reorder_services(self, category: str, order: List[str]):
+        """Reorder services; services missing from the order keep their relative order at the end"""
+        services = self.services(category)
+        listed = {}
+        for name in order:
+            found = self._services.get((category, name))
+            if found is not None:
+                listed.setdefault(id(found[0]), found[0])
+        rest = [item for item in services if id(item) not in listed]
+        _replace_items(services, list(listed.values()) + rest)
+        self._index_positions(category)
+
+    def set_config(self, category: str, name: str, config: Dict):
+        """Replace a service's config, editing only the fields that changed"""
+        update_mapping(self._config(category, name), config)
+
+    def set_field(self, category: str, name: str, field: str, value: Any):
+        set_value(self._config(category, name), field, value)
+
+    def remove_field(self, category: str, name: str, field: str):
+        self._config(category, name).pop(field, None)
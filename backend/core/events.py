@@ -0,0 +1,208 @@
+import asyncio
+import functools
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+from core.config import settings
+
+# Events kept for clients that reconnect with Last-Event-ID
+HISTORY_SIZE = 256
+
+# Sent instead of the missed events when a client fell too far behind
+RESYNC = {"source": "*", "op": "resync"}
+
+# Argument names of handler mutations, mapped to compact event fields
+_FIELDS = (
+    ('category', 'category'), ('from_category', 'category'), ('group', 'category'),
+    ('service_name', 'name'), ('bookmark_name', 'name'), ('name', 'name'),
+    ('to_category', 'to_category'), ('new_category', 'to_category'),
+    ('new_name', 'new_name'),
+)
+
+# Argument names holding a category or bookmark group name, whose new
+# contents a change event carries
+_GROUP_ARGUMENTS = ('category', 'from_category', 'to_category', 'new_category', 'group', 'new_name')
+
+# Mutations that only reorder the categories / groups. Other mutations that
+# name none (restore, import, undo...) may change any part of the file: their
+# events carry no contents and clients reload.
+REORDERS = ('reorder_categories', 'reorder_groups')
+
+
+def _compact(arguments: Dict[str, Any]) -> Dict[str, Any]:
+    event = {}
+    for argument, field in _FIELDS:
+        value = arguments.get(argument)
+        if isinstance(value, str) and field not in event:
+            event[field] = value
+    return event
+
+
+def describe_change(source: str, op: str, arguments: Dict[str, Any], version: str) -> Dict[str, Any]:
+    """Compact change event for a committed mutation: what changed, not the new content"""
+    event = {"source": source, "op": op, "version": version}
+    event.update(_compact(arguments))
+    if op == 'apply_operations':
+        event["operations"] = [
+            dict(op=operation.get('op'), **_compact(operation))
+            for operation in arguments.get('operations') or []
+            if isinstance(operation, dict)
+        ]
+    return event
+
+
+def touched_groups(arguments: Dict[str, Any]) -> List[str]:
+    """Categories/groups a mutation named, including in its batch operations"""
+    names = []
+    for entry in [arguments] + [op for op in arguments.get('operations') or [] if isinstance(op, dict)]:
+        for argument in _GROUP_ARGUMENTS:
+            value = entry.get(argument)
+            if isinstance(value, str) and value not in names:
+                names.append(value)
+    return names
+
+
+class Subscription:
+    """One client's bounded event queue
+
+    A client that stops reading does not hold events without limit: when its
+    queue is full, the queued events are replaced by a single resync event.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, maxsize))
+        self.last_id = 0
+
+    def put(self, event: Dict[str, Any]):
+        event_id = event.get("id", 0)
+        if event_id and event_id <= self.last_id:
+            return  # Already delivered by replay
+        self.last_id = max(self.last_id, event_id)
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = RESYNC
+        self.queue.put_nowait(event)
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """The next event, or None if there was none within timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """Fan-out of config change events to /api/events subscribers
+
+    Handlers publish from worker threads; events are numbered, kept in a
+    short history for reconnects and handed to the subscribers' queues on
+    the event loop. Edits made outside this process are reported through
+    check_source() by the file watcher.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscription] = set()
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+        self._last_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sources: Dict[str, Any] = {}
+        # {source: last version published or seen}
+        self._versions: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def add_source(self, source: str, handler: Any, groups: Optional[Callable[[Any], Dict[str, List]]] = None):
+        """Publish the committed mutations of a handler
+
+        groups returns the categories (or bookmark groups) of a snapshot's
+        data; with it, events carry the new contents of those a mutation
+        touched and the order of all of them, so clients can apply the
+        change without downloading the whole list.
+        """
+        self._sources[source] = handler
+        handler.writes.commit_hooks.append(functools.partial(self._committed, source, handler, groups))
+
+    def _committed(self, source: str, handler: Any, groups: Optional[Callable[[Any], Dict[str, List]]],
+                   op: str, arguments: Dict[str, Any]):
+        names = touched_groups(arguments)
+        if groups is None or not self._subscribers or not names and op not in REORDERS:
+            self.publish(describe_change(source, op, arguments, handler.version()))
+            return
+        # Parses the new version, which the clients would request anyway
+        snapshot = handler.snapshot()
+        current = groups(snapshot.data)
+        event = describe_change(source, op, arguments, snapshot.version)
+        event["groups"] = {name: current.get(name) for name in names}
+        event["order"] = list(current)
+        self.publish(event)
+
+    def publish(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Number an event and deliver it to all subscribers (thread-safe)"""
+        with self._lock:
+            self._last_id += 1
+            event = dict(event, id=self._last_id)
+            self._history.append(event)
+            if "version" in event:
+                self._versions[event["source"]] = event["version"]
+            loop = self._loop
+
+        if loop is None or loop.is_closed():
+            return event
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(event)
+        else:
+            try:
+                loop.call_soon_threadsafe(self._dispatch, event)
+            except RuntimeError:
+                pass  # Loop closed during shutdown
+        return event
+
+    def _dispatch(self, event: Dict[str, Any]):
+        for subscription in list(self._subscribers):
+            subscription.put(event)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Subscription:
+        """Register a subscriber; events after last_event_id are replayed first"""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            backlog = self._replay(last_event_id)
+            self._subscribers.add(subscription)
+        for event in backlog:
+            subscription.put(event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def _replay(self, last_event_id: Optional[int]) -> List[Dict[str, Any]]:
+        if last_event_id is None or last_event_id == self._last_id:
+            return []
+        if last_event_id > self._last_id or not self._history or self._history[0]["id"] > last_event_id + 1:
+            # From before a restart, or older than the history
+            return [RESYNC]
+        return [event for event in self._history if event["id"] > last_event_id]
+
+    def check_source(self, source: str):
+        """Publish an "external" event if a source's file no longer has the version last seen"""
+        handler = self._sources[source]
+        # Holding the handler's write lock keeps a commit in progress from
+        # being mistaken for an outside edit
+        with handler.writes.local_lock():
+            version = handler.version()
+            with self._lock:
+                known = self._versions.setdefault(source, version)
+            if known != version:
+                self.publish({"source": source, "op": "external", "version": version})
+
+
+event_bus = EventBus(settings.events_queue_size)
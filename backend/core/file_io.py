@@ -0,0 +1,70 @@
+import errno
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import Union
+
+from .profiling import phase
+
+
+def _fsync_directory(directory: Path):
+    """Persist a rename in the directory entry (not supported on every platform)"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _write_in_place(path: Path, data: bytes):
+    with open(path, 'r+b' if path.exists() else 'wb') as f:
+        f.write(data)
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+
+
+@phase("fsync")
+def atomic_write(path: Path, content: Union[str, bytes]):
+    """Write text (as UTF-8) or bytes to a file so readers only ever see the old or the new contents
+
+    The data goes to a temp file in the same directory, is fsynced and then
+    swapped in with os.replace(). A file that is itself a bind mount (as in the
+    docker-compose setup) cannot be replaced; it is rewritten in place instead.
+    """
+    path = Path(path)
+    data = content.encode('utf-8') if isinstance(content, str) else content
+
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # Keep the permissions of the file being replaced (mkstemp creates 0600)
+        try:
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(tmp_path, 0o644)
+
+        try:
+            os.replace(tmp_path, path)
+        except OSError as e:
+            if e.errno not in (errno.EBUSY, errno.EXDEV, errno.EPERM):
+                raise
+            _write_in_place(path, data)
+            os.unlink(tmp_path)
+            return
+
+        _fsync_directory(path.parent)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
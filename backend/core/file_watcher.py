@@ -0,0 +1,225 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from core.config import settings
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# The file itself catches in-place writes, also through a bind mount of the
+# single file; its directory catches files renamed over it (atomic saves)
+FILE_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_DELETE_SELF | IN_MOVE_SELF
+DIR_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT = struct.Struct('iIII')
+
+StatKey = Optional[Tuple[int, int, int]]
+
+
+def _stat_key(path: Path) -> StatKey:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class Inotify:
+    """Minimal ctypes binding of Linux inotify; raises OSError where unavailable"""
+
+    def __init__(self):
+        name = ctypes.util.find_library('c')
+        if name is None:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """(wd, mask, name) events, waiting at most timeout seconds for the first"""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileWatcher:
+    """Calls back, from a background thread, when watched files change on disk
+
+    Uses inotify where available and stat() polling otherwise. With inotify
+    the files are still polled every ``interval`` seconds, which bounds the
+    delay for changes inotify cannot see (e.g. on network filesystems).
+    A burst of changes is debounced: callbacks run once the file has been
+    quiet for ``debounce`` seconds (at most ten times that after the first).
+    """
+
+    def __init__(self, interval: float = 2.0, debounce: float = 0.2):
+        self.interval = interval
+        self.debounce = debounce
+        self._callbacks: Dict[Path, List[Callable[[], None]]] = {}
+        self._stat_keys: Dict[Path, StatKey] = {}
+        self._inotify: Optional[Inotify] = None
+        # {wd: (path, None)} for file watches, {wd: (directory, names)} for directories
+        self._watches: Dict[int, Tuple[Path, Optional[Set[str]]]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def mode(self) -> str:
+        if self._thread is None:
+            return "stopped"
+        return "inotify" if self._inotify is not None else "polling"
+
+    def watch(self, path: Path, callback: Callable[[], None]):
+        """Register a callback for a file; call before start()"""
+        self._callbacks.setdefault(Path(path).absolute(), []).append(callback)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        for path in self._callbacks:
+            self._stat_keys[path] = _stat_key(path)
+        try:
+            self._inotify = Inotify()
+            for path in self._callbacks:
+                self._watch_file(path)
+                self._watch_directory(path)
+        except OSError as e:
+            print(f"inotify unavailable ({e}), polling config files every {self.interval}s")
+            if self._inotify is not None:
+                self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        self._thread = None
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        self._watches.clear()
+
+    def _watch_file(self, path: Path):
+        # Re-adding after the file was replaced watches the new inode; for
+        # the same inode inotify returns the existing watch
+        try:
+            wd = self._inotify.add_watch(path, FILE_MASK)
+        except OSError:
+            return  # Missing for now; the directory watch sees it appear
+        self._watches[wd] = (path, None)
+
+    def _watch_directory(self, path: Path):
+        for wd, (watched, names) in self._watches.items():
+            if names is not None and watched == path.parent:
+                names.add(path.name)
+                return
+        wd = self._inotify.add_watch(path.parent, DIR_MASK)
+        self._watches[wd] = (path.parent, {path.name})
+
+    def _wait(self, timeout: float) -> Set[Path]:
+        """Files with inotify events within timeout; sleeps when polling"""
+        if self._inotify is None:
+            self._stop.wait(timeout)
+            return set()
+        changed = set()
+        for wd, mask, name in self._inotify.read(timeout):
+            if mask & IN_Q_OVERFLOW:
+                changed.update(self._callbacks)
+                continue
+            path, names = self._watches.get(wd, (None, None))
+            if path is None:
+                continue
+            if mask & IN_IGNORED:
+                if names is None:
+                    del self._watches[wd]
+                continue
+            if names is None:
+                changed.add(path)
+            elif name in names:
+                changed.add(path / name)
+        return changed
+
+    def _poll(self) -> Set[Path]:
+        changed = set()
+        for path in self._callbacks:
+            key = _stat_key(path)
+            if key != self._stat_keys.get(path):
+                self._stat_keys[path] = key
+                changed.add(path)
+        return changed
+
+    def _run(self):
+        while not self._stop.is_set():
+            pending = self._wait(self.interval) | self._poll()
+            if not pending:
+                continue
+
+            # Debounce: wait until a quiet period, so editors and partial
+            # writes produce one re-parse of the final content
+            deadline = time.monotonic() + self.debounce * 10
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                more = self._wait(self.debounce) | self._poll()
+                if not more:
+                    break
+                pending |= more
+
+            for path in pending:
+                if self._inotify is not None:
+                    self._watch_file(path)
+                for callback in self._callbacks.get(path, []):
+                    try:
+                        callback()
+                    except Exception as e:
+                        print(f"Error handling change of {path}: {e}")
+
+
+file_watcher = FileWatcher(settings.watch_interval_seconds, settings.watch_debounce_ms / 1000)
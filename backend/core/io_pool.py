@@ -0,0 +1,71 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from core.config import settings
+from core.profiling import request_profiler, run_profiled
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Bounded pool for blocking YAML parse/serialize and file I/O"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.io_pool_size),
+            thread_name_prefix="yaml-io"
+        )
+    return _executor
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking call on the I/O pool without stalling the event loop
+
+    The call sees the caller's context variables; a request being profiled
+    is profiled in the pool thread too.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    profile = request_profiler.get()
+    if profile is None:
+        call = functools.partial(context.run, func, *args, **kwargs)
+    else:
+        call = functools.partial(context.run, run_profiled, profile, func, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+def shutdown_executor():
+    """Stop the pool, waiting for in-flight writes to finish"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+class AsyncHandler:
+    """Awaitable view of a handler: every method call runs on the I/O pool
+
+    Usage: ``await yaml_handler.aio.load_config()``
+    """
+
+    def __init__(self, handler: Any):
+        self._handler = handler
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._handler, name)
+        if not callable(attr):
+            return attr
+
+        if getattr(attr, 'is_mutation', False):
+            # Writes queue on the handler's write coordinator, reads do not
+            async def call(*args, **kwargs):
+                return await self._handler.writes.run(attr, *args, **kwargs)
+        else:
+            async def call(*args, **kwargs):
+                return await run_blocking(attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
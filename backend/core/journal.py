@@ -0,0 +1,324 @@
+import difflib
+import functools
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .events import describe_change
+from .file_io import atomic_write
+from .write_coordinator import WriteCoordinator
+
+# [line in old text, line in new text, old lines, new lines]
+Hunk = List[Any]
+
+# Records that change a file and carry hunks
+CHANGES = ("edit", "undo", "redo")
+
+
+def _digest(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def diff_lines(before: str, after: str) -> List[Hunk]:
+    """Line hunks turning before into after; applied in reverse they turn after into before"""
+    a = before.splitlines(keepends=True)
+    b = after.splitlines(keepends=True)
+    # A typical edit touches a few lines of a long file: only diff the part between
+    # the common head and tail
+    start = 0
+    shortest = min(len(a), len(b))
+    while start < shortest and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < shortest - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+
+    matcher = difflib.SequenceMatcher(None, a[start:len(a) - end], b[start:len(b) - end])
+    return [
+        [start + i1, start + j1, "".join(a[start + i1:start + i2]), "".join(b[start + j1:start + j2])]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_hunks(text: str, hunks: List[Hunk], reverse: bool = False) -> str:
+    """Apply diff_lines() hunks to text; ValueError if it is not the text they were made for"""
+    lines = text.splitlines(keepends=True)
+    for old_line, new_line, old, new in reversed(hunks):
+        at, remove, insert = (new_line, new, old) if reverse else (old_line, old, new)
+        count = len(remove.splitlines(keepends=True))
+        if "".join(lines[at:at + count]) != remove:
+            raise ValueError("Hunk does not match the file")
+        lines[at:at + count] = insert.splitlines(keepends=True)
+    return "".join(lines)
+
+
+class Journal:
+    """Append-only log of the committed writes to the config files
+
+    Every mutation that changes a file appends an "edit" record with the
+    line hunks between the file before and after it, which also undo it.
+    Undo and redo apply those hunks to the file and are logged too, so the
+    journal is an audit trail of every change made through the API.
+
+    A "checkpoint" record stores a gzipped copy of a file: when the file is
+    first journaled, when it was changed outside the API since its last
+    record, and after every ``snapshot_every`` changes. The file as of any
+    record is rebuilt from the checkpoint before it, so at most that many
+    records are replayed. Once the log holds more than ``max_entries``
+    records it is compacted: records before a checkpoint of each file are
+    dropped, along with the snapshots no longer referenced.
+    """
+
+    def __init__(self, directory: Path, snapshot_every: int = 50, max_entries: int = 1000):
+        self.directory = Path(directory)
+        self.path = self.directory / "journal.jsonl"
+        self.snapshots_dir = self.directory / "snapshots"
+        self.snapshot_every = max(1, snapshot_every)
+        self.max_entries = max(2 * self.snapshot_every, max_entries)
+        # Serializes appends across threads and workers
+        self.writes = WriteCoordinator(self.path)
+        self._sources: Dict[str, Tuple[Any, Path]] = {}
+        # File contents when the current mutation of each source began
+        self._pending: Dict[str, Tuple[str, bytes]] = {}
+        self._reset()
+
+    def _reset(self):
+        self._records: List[Dict[str, Any]] = []
+        self._by_seq: Dict[int, Dict[str, Any]] = {}
+        self._last_seq = 0
+        # {source: digest of the file after its last record}
+        self._heads: Dict[str, str] = {}
+        # {source: changes since its last checkpoint}
+        self._since_checkpoint: Dict[str, int] = {}
+        # {source: seqs of the edits that can be undone / redone, newest last}
+        self._done: Dict[str, List[int]] = {}
+        self._undone: Dict[str, List[int]] = {}
+        self._offset = 0
+        self._inode: Optional[int] = None
+
+    def add_source(self, source: str, handler: Any, path: Path):
+        """Journal the committed mutations of a handler"""
+        self._sources[source] = (handler, Path(path))
+        handler.writes.begin_hooks.append(functools.partial(self._began, source))
+        handler.writes.commit_hooks.append(functools.partial(self._committed, source))
+
+    # Log file
+
+    def _track(self, record: Dict[str, Any]):
+        """Update the in-memory state with a record read or appended"""
+        self._records.append(record)
+        self._by_seq[record["seq"]] = record
+        self._last_seq = max(self._last_seq, record["seq"])
+        source = record["source"]
+        done = self._done.setdefault(source, [])
+        undone = self._undone.setdefault(source, [])
+        if record["type"] == "checkpoint":
+            self._heads[source] = record["digest"]
+            self._since_checkpoint[source] = 0
+            return
+
+        self._heads[source] = record["after"]
+        self._since_checkpoint[source] = self._since_checkpoint.get(source, 0) + 1
+        if record["type"] == "edit":
+            done.append(record["seq"])
+            undone.clear()
+        elif record["type"] == "undo":
+            if done and done[-1] == record["target"]:
+                undone.append(done.pop())
+        elif record["type"] == "redo":
+            if undone and undone[-1] == record["target"]:
+                done.append(undone.pop())
+
+    def _sync(self):
+        """Read records appended by other workers (or everything, after a compaction)"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._records:
+                self._reset()
+            return
+        if st.st_ino != self._inode or st.st_size < self._offset:
+            self._reset()
+            self._inode = st.st_ino
+        if st.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        # Only whole lines; a partial one is read again next time
+        complete = data[:data.rfind(b'\n') + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                self._track(json.loads(line))
+        self._offset += len(complete)
+
+    def _append(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Number a record and add it to the log; call with the journal lock held"""
+        record = dict(seq=self._last_seq + 1, time=datetime.now().isoformat(timespec='seconds'), **record)
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self._inode = os.fstat(f.fileno()).st_ino
+        self._offset += len(line)
+        self._track(record)
+        return record
+
+    def _snapshot_path(self, digest: str) -> Path:
+        return self.snapshots_dir / f"{digest}.yaml.gz"
+
+    def _checkpoint(self, source: str, content: bytes):
+        digest = _digest(content)
+        path = self._snapshot_path(digest)
+        if not path.exists():
+            self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+            atomic_write(path, gzip.compress(content, mtime=0))
+        self._append({"type": "checkpoint", "source": source, "digest": digest})
+
+    def _compact(self):
+        """Drop the records before a checkpoint of each file, keeping about half the log"""
+        keep_from = self._records[len(self._records) - self.max_entries // 2]["seq"]
+        start = keep_from
+        for source in {record["source"] for record in self._records}:
+            checkpoints = [r["seq"] for r in self._records if r["source"] == source and r["type"] == "checkpoint"]
+            before = [seq for seq in checkpoints if seq <= keep_from]
+            start = min(start, before[-1] if before else checkpoints[0])
+
+        kept = [record for record in self._records if record["seq"] >= start]
+        atomic_write(self.path, "".join(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n" for record in kept))
+        referenced = {f"{r['digest']}.yaml.gz" for r in kept if r["type"] == "checkpoint"}
+        for name in os.listdir(self.snapshots_dir):
+            if name not in referenced:
+                os.unlink(self.snapshots_dir / name)
+        self._reset()
+        self._sync()
+
+    # Hooks, called under the handler's write lock
+
+    def _read(self, source: str) -> bytes:
+        try:
+            return self._sources[source][1].read_bytes()
+        except FileNotFoundError:
+            return b""
+
+    def _began(self, source: str):
+        content = self._read(source)
+        self._pending[source] = (_digest(content), content)
+
+    def _committed(self, source: str, op: str, arguments: Dict[str, Any]):
+        pending = self._pending.pop(source, None)
+        if pending is None:
+            return
+        before_digest, before = pending
+        after = self._read(source)
+        after_digest = _digest(after)
+        if after_digest == before_digest:
+            return
+
+        if op in ("undo", "redo"):
+            record = {"type": op, "source": source, "target": arguments["seq"]}
+        else:
+            record = describe_change(source, op, arguments, after_digest)
+            del record["version"]
+            record["type"] = "edit"
+        record.update(before=before_digest, after=after_digest,
+                      hunks=diff_lines(before.decode('utf-8'), after.decode('utf-8')))
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.writes.locked():
+            self._sync()
+            if self._heads.get(source) != before_digest:
+                # First record of this file, or it was edited outside the API
+                self._checkpoint(source, before)
+            self._append(record)
+            if self._since_checkpoint[source] >= self.snapshot_every:
+                self._checkpoint(source, after)
+            if len(self._records) > self.max_entries:
+                self._compact()
+
+    # Undo / redo
+
+    def undo(self, source: str) -> Optional[Dict[str, Any]]:
+        """Revert the last edit of a file not yet undone; returns that edit, None if there is none
+
+        ValueError if the file was changed outside the API since.
+        """
+        return self._step(source, "undo")
+
+    def redo(self, source: str) -> Optional[Dict[str, Any]]:
+        """Apply the last undone edit of a file again; returns that edit, None if there is none"""
+        return self._step(source, "redo")
+
+    def _step(self, source: str, op: str) -> Optional[Dict[str, Any]]:
+        handler, _ = self._sources[source]
+        with handler.writes.locked():
+            with self.writes.locked():
+                self._sync()
+                stack = (self._done if op == "undo" else self._undone).get(source)
+                if not stack:
+                    return None
+                target = self._by_seq[stack[-1]]
+
+            handler.writes.began()
+            expected, content = self._pending[source]
+            if expected != (target["after"] if op == "undo" else target["before"]):
+                self._pending.pop(source, None)
+                raise ValueError(f"{source} was changed since that edit; it can no longer be {'undone' if op == 'undo' else 'redone'}")
+            text = apply_hunks(content.decode('utf-8'), target["hunks"], reverse=(op == "undo"))
+            if not handler.restore(text.encode('utf-8')):
+                self._pending.pop(source, None)
+                raise RuntimeError(f"Failed to write {source}")
+            handler.writes.committed(op, {"seq": target["seq"]})
+            return target
+
+    # Audit trail
+
+    def history(self, source: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Changes, newest first, without their hunks"""
+        with self.writes.local_lock():
+            self._sync()
+            records = list(self._records)
+        changes = []
+        for record in reversed(records):
+            if record["type"] not in CHANGES or source is not None and record["source"] != source:
+                continue
+            entry = {key: value for key, value in record.items() if key != "hunks"}
+            entry["removed"] = sum(len(old.splitlines()) for _, _, old, _ in record["hunks"])
+            entry["added"] = sum(len(new.splitlines()) for _, _, _, new in record["hunks"])
+            changes.append(entry)
+            if len(changes) >= limit:
+                break
+        return changes
+
+    def content_at(self, seq: int) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """A change and the file as it was right after it, rebuilt from the checkpoint before it"""
+        with self.writes.local_lock():
+            self._sync()
+            records = list(self._records)
+        position = next((i for i, r in enumerate(records) if r["seq"] == seq and r["type"] in CHANGES), None)
+        if position is None:
+            return None
+        record = records[position]
+        source = record["source"]
+        start = next((i for i in range(position, -1, -1)
+                      if records[i]["source"] == source and records[i]["type"] == "checkpoint"), None)
+        if start is None:
+            return None
+
+        digest = records[start]["digest"]
+        text = gzip.decompress(self._snapshot_path(digest).read_bytes()).decode('utf-8')
+        for replayed in records[start + 1:position + 1]:
+            if replayed["source"] != source:
+                continue
+            if replayed["before"] != digest:
+                raise ValueError(f"Journal of {source} has a gap before change {replayed['seq']}")
+            text = apply_hunks(text, replayed["hunks"])
+            digest = replayed["after"]
+        return record, text.encode('utf-8')
@@ -0,0 +1,128 @@
+import cProfile
+import io
+import itertools
+import marshal
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from core.config import settings
+
+# {phase: seconds} of the current request while Server-Timing is on; None (the
+# usual case) makes phase() a no-op
+request_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_phases", default=None)
+
+
+class RequestProfile:
+    """cProfile stats of one request, merged from its profiled calls
+
+    Each call on the I/O pool gets a profiler of its own: a cProfile
+    profiler must not be enabled in two threads at once, which would
+    happen with one per request as soon as it runs calls concurrently.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = pstats.Stats()
+
+    def add(self, profiler: cProfile.Profile):
+        try:
+            stats = pstats.Stats(profiler)
+        except TypeError:
+            return  # Nothing was recorded
+        with self._lock:
+            self._stats.add(stats)
+
+    @property
+    def stats(self) -> Dict:
+        """Merged stats, in the format of cProfile.Profile.stats"""
+        with self._lock:
+            return dict(self._stats.stats)
+
+
+# Profile of the current request while it is being profiled
+request_profiler: ContextVar[Optional[RequestProfile]] = ContextVar("request_profiler", default=None)
+
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to a phase of the request's Server-Timing
+
+    Also usable as a decorator. Costs a context variable lookup when the
+    request is not being timed.
+    """
+    phases = request_phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def run_profiled(profile: RequestProfile, func: Callable, *args, **kwargs) -> Any:
+    """Call func under a profiler of its own and add its stats to the request's profile"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is active (Python 3.12+ allows one per process)
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        profile.add(profiler)
+
+
+class ProfileStore:
+    """The last few request profiles, in memory, for download"""
+
+    def __init__(self, keep: int = 20):
+        self._lock = threading.Lock()
+        self._profiles: Deque[Dict[str, Any]] = deque(maxlen=max(1, keep))
+        self._ids = itertools.count(1)
+
+    def reserve(self) -> int:
+        """Id for a profile that is being captured"""
+        with self._lock:
+            return next(self._ids)
+
+    def add(self, profile_id: int, profile: RequestProfile, info: Dict[str, Any]):
+        stats = profile.stats
+        with self._lock:
+            self._profiles.append(dict(info, id=profile_id, stats=stats))
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Profiles kept, newest first, without their stats"""
+        with self._lock:
+            profiles = list(self._profiles)
+        return [{key: value for key, value in profile.items() if key != "stats"} for profile in reversed(profiles)]
+
+    def get(self, profile_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile["id"] == profile_id), None)
+
+    @staticmethod
+    def dump(profile: Dict[str, Any]) -> bytes:
+        """The profile in the format of cProfile's dump_stats() (pstats, snakeviz...)"""
+        return marshal.dumps(profile["stats"])
+
+    @staticmethod
+    def report(profile: Dict[str, Any], sort: str = "cumulative", limit: int = 50) -> str:
+        """pstats text report of the top functions"""
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = profile["stats"]
+        stats.get_top_level_stats()
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+profile_store = ProfileStore(settings.profile_keep)
@@ -0,0 +1,24 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class ServiceIndex:
+    """Constant-time lookups over a parse_services() result
+
+    Wraps the {category: [{'name', 'config'}]} dict, which stays the source of
+    truth for order, with a {(category, service name): service} index.
+    Read-only: edits go through ConfigTree and produce a new snapshot.
+    """
+
+    def __init__(self, categories: Dict[str, List[Dict]]):
+        self.categories = categories
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        for category, services in categories.items():
+            for service in services:
+                # First occurrence wins for (invalid) duplicate names
+                self._entries.setdefault((category, service['name']), service)
+
+    def __contains__(self, category: str) -> bool:
+        return category in self.categories
+
+    def get(self, category: str, name: str) -> Optional[Dict]:
+        return self._entries.get((category, name))
@@ -0,0 +1,86 @@
+import os
+
+from core.config import settings
+from core.yaml_handler import YAMLHandler
+from core.bookmarks_handler import BookmarksHandler
+from core.backup_store import BackupStore
+from core.events import event_bus
+from core.journal import Journal
+from core.metrics import CallbackGauge, registry
+from core.file_watcher import file_watcher
+
+# Process-wide handler instances shared by all routers, so every request
+# reads from the same parsed-config cache
+yaml_handler = YAMLHandler(settings.config_path, settings.yaml_parser)
+bookmarks_handler = BookmarksHandler()
+
+backup_store = BackupStore(settings.backup_dir, settings.backup_keep_last,
+                           settings.backup_keep_daily, settings.backup_keep_weekly)
+
+journal = Journal(settings.journal_dir, settings.journal_snapshot_every, settings.journal_max_entries)
+
+# source name in change events -> (handler, file it edits)
+SOURCES = {
+    "services": (yaml_handler, yaml_handler.config_path),
+    "bookmarks": (bookmarks_handler, bookmarks_handler.bookmarks_path),
+}
+
+
+def _file_changed(source: str):
+    """Re-parse a file changed on disk and report it if we did not write it"""
+    handler, _ = SOURCES[source]
+    handler.refresh()
+    event_bus.check_source(source)
+
+
+# Categories / bookmark groups of each source's parsed data, for change events
+GROUPS = {
+    "services": lambda data: data.categories,
+    "bookmarks": lambda data: data.groups,
+}
+
+
+for source, (handler, path) in SOURCES.items():
+    # Committed writes and outside edits of both files go to /api/events
+    event_bus.add_source(source, handler, GROUPS[source])
+    # ...and are journaled for undo/redo
+    journal.add_source(source, handler, path)
+    file_watcher.watch(path, lambda source=source: _file_changed(source))
+
+
+def _file_sizes():
+    sizes = {}
+    for source, (_, path) in SOURCES.items():
+        try:
+            sizes[source] = os.stat(path).st_size
+        except FileNotFoundError:
+            sizes[source] = 0
+    return sizes
+
+
+registry.register(CallbackGauge(
+    "homepage_config_file_size_bytes", "Size of each config file", _file_sizes, ("source",)))
+registry.register(CallbackGauge(
+    "homepage_config_services", "Services in services.yaml (as of the last parse)",
+    lambda: sum(len(services) for services in yaml_handler.get_services().values())))
+registry.register(CallbackGauge(
+    "homepage_config_cache_hit_ratio", "Share of reads served from the parsed-config cache",
+    lambda: {source: handler.cache_stats()["hit_ratio"] for source, (handler, _) in SOURCES.items()},
+    ("source",)))
+
+
+def start_watching():
+    """Start the file watcher; reads then trust the cache between its notifications"""
+    if not settings.watch_files:
+        return
+    file_watcher.start()
+    for source, (handler, _) in SOURCES.items():
+        handler.set_watched(True)
+        # Parse now and record the versions outside edits are compared to
+        _file_changed(source)
+
+
+def stop_watching():
+    for handler, _ in SOURCES.values():
+        handler.set_watched(False)
+    file_watcher.stop()
@@ -0,0 +1,222 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import yaml
+from pydantic import TypeAdapter, ValidationError
+from ruamel.yaml import YAMLError
+
+from models import ServiceConfig, Widget
+from .yaml_backend import NormalizedText, get_parser
+
+# (line, column), both 1-based
+Position = Tuple[int, int]
+
+
+def _position(node: yaml.Node) -> Position:
+    return (node.start_mark.line + 1, node.start_mark.column + 1)
+
+
+def _position_loader(base: type) -> type:
+    """Loader that also records where each mapping key and list item is
+
+    positions maps id() of every loaded dict to {key: position} and of
+    every list to [position of each item]; the ids stay valid as long as
+    the loaded tree is kept.
+    """
+
+    class PositionLoader(base):
+        def __init__(self, stream):
+            super().__init__(stream)
+            self.positions: Dict[int, Union[Dict[Any, Position], List[Position]]] = {}
+
+        def construct_yaml_map(self, node):
+            data = {}
+            yield data
+            data.update(self.construct_mapping(node))
+            self.positions[id(data)] = {self.construct_object(key): _position(key) for key, _ in node.value}
+
+        def construct_yaml_seq(self, node):
+            data = []
+            yield data
+            data.extend(self.construct_sequence(node))
+            self.positions[id(data)] = [_position(item) for item in node.value]
+
+    PositionLoader.add_constructor('tag:yaml.org,2002:map', PositionLoader.construct_yaml_map)
+    PositionLoader.add_constructor('tag:yaml.org,2002:seq', PositionLoader.construct_yaml_seq)
+    return PositionLoader
+
+
+class ConfigValidator:
+    """Checks a whole services.yaml against the service and widget models
+
+    ServiceConfig is compiled into a TypeAdapter once, so checking a
+    parsed config is one adapter call per service, cheap enough to run on
+    every save. Fields that Widget.WIDGET_SCHEMAS lists for a widget type
+    are only advised: Homepage starts without them, so a missing one is a
+    warning. Errors and warnings carry the line and column they refer to
+    when the config comes with its text.
+    """
+
+    def __init__(self):
+        # Same YAML rules as reads, through libyaml when available
+        self._loader = _position_loader(get_parser("auto").loader)
+        self._service = TypeAdapter(ServiceConfig)
+
+    def load(self, text: Any) -> Tuple[Any, Dict[int, Any]]:
+        """Parse YAML text (or a binary file) with the positions of its nodes"""
+        loader = self._loader(NormalizedText(text))
+        try:
+            return loader.get_single_data(), loader.positions
+        finally:
+            loader.dispose()
+
+    def validate_text(self, text: Any) -> Dict[str, Any]:
+        """Parse and validate YAML text in one pass; parse errors are reported, not raised"""
+        try:
+            config, positions = self.load(text)
+        except (yaml.YAMLError, YAMLError) as e:
+            mark = getattr(e, 'problem_mark', None)
+            error = {"message": f"YAML parsing error: {e}", "path": ""}
+            if mark is not None:
+                error.update(line=mark.line + 1, column=mark.column + 1)
+            return {"valid": False, "errors": [error], "warnings": []}
+        except UnicodeDecodeError:
+            error = {"message": "File encoding error. Please ensure the file is UTF-8 encoded.", "path": ""}
+            return {"valid": False, "errors": [error], "warnings": []}
+        return self.validate(config, positions)
+
+    def validate_many(self, texts: Iterable[Any]) -> List[Dict[str, Any]]:
+        """validate_text() for several files, results in the same order"""
+        return [self.validate_text(text) for text in texts]
+
+    def validate(self, config: Any, positions: Optional[Dict[int, Any]] = None,
+                 schema_warnings: bool = False) -> Dict[str, Any]:
+        """Validate a loaded config; positions (from load()) add line numbers
+
+        With schema_warnings, fields that do not fit the service and widget
+        models are reported as warnings; only the YAML structure can then
+        make the config invalid.
+        """
+        check = _Check(self, positions or {}, schema_warnings)
+        if isinstance(config, list):
+            seen = {}
+            for i, item in enumerate(config):
+                if not isinstance(item, dict):
+                    check.error(config, i, (), "Each item must be a dictionary")
+                    continue
+                for category, services in item.items():
+                    if category in seen:
+                        check.error(item, category, (category,),
+                                    f"Duplicate category '{category}'{check.first_at(*seen[category])}")
+                    else:
+                        seen[category] = (item, category)
+                    check.group(item, category, (category,))
+        elif isinstance(config, dict):
+            for category in config:
+                check.group(config, category, (category,))
+        else:
+            check.error(None, None, (), "Configuration must be a list of categories")
+
+        return {"valid": not check.errors, "errors": check.errors, "warnings": check.warnings}
+
+
+class _Check:
+    """Diagnostics of one validate() call"""
+
+    def __init__(self, validator: ConfigValidator, positions: Dict[int, Any], schema_warnings: bool = False):
+        self.validator = validator
+        self.positions = positions
+        self.schema_warnings = schema_warnings
+        self.errors: List[Dict[str, Any]] = []
+        self.warnings: List[Dict[str, Any]] = []
+
+    def position(self, container: Any, key: Any) -> Optional[Position]:
+        known = self.positions.get(id(container))
+        if known is None:
+            return None
+        if isinstance(known, list):
+            return known[key] if isinstance(key, int) and key < len(known) else None
+        return known.get(key)
+
+    def first_at(self, container: Any, key: Any) -> str:
+        position = self.position(container, key)
+        return f" (first defined at line {position[0]})" if position else ""
+
+    def _add(self, target: list, container: Any, key: Any, path: tuple, message: str):
+        diagnostic = {"message": message, "path": " > ".join(str(part) for part in path)}
+        position = self.position(container, key)
+        if position:
+            diagnostic["line"], diagnostic["column"] = position
+        target.append(diagnostic)
+
+    def error(self, container: Any, key: Any, path: tuple, message: str):
+        self._add(self.errors, container, key, path, message)
+
+    def warning(self, container: Any, key: Any, path: tuple, message: str):
+        self._add(self.warnings, container, key, path, message)
+
+    def group(self, parent: Dict, name: Any, path: tuple):
+        """A category (or nested group) and its list of services"""
+        services = parent[name]
+        if services is None:
+            self.warning(parent, name, path, f"Category '{name}' is empty")
+            return
+        if not isinstance(services, list):
+            self.error(parent, name, path, f"Services in category '{name}' must be a list")
+            return
+
+        seen = {}
+        for i, item in enumerate(services):
+            if not isinstance(item, dict):
+                self.error(services, i, path, f"Service in category '{name}' must be a dictionary")
+                continue
+            for service_name, service_config in item.items():
+                service_path = path + (service_name,)
+                if service_name in seen:
+                    self.error(item, service_name, service_path,
+                               f"Duplicate service '{service_name}' in category '{name}'"
+                               f"{self.first_at(*seen[service_name])}")
+                else:
+                    seen[service_name] = (item, service_name)
+
+                if isinstance(service_config, list):
+                    # Nested group
+                    self.group(item, service_name, service_path)
+                elif not service_config:
+                    self.warning(item, service_name, service_path, f"Empty service in category '{name}'")
+                else:
+                    self.service(item, service_name, service_path)
+
+    def service(self, parent: Dict, name: Any, path: tuple):
+        service_config = parent[name]
+        try:
+            self.validator._service.validate_python(service_config)
+        except ValidationError as e:
+            report = self.warning if self.schema_warnings else self.error
+            for error in e.errors():
+                container, key = self._locate(parent, name, error['loc'])
+                location = ".".join(str(part) for part in error['loc'])
+                message = f"{location}: {error['msg']}" if location else error['msg']
+                report(container, key, path + tuple(error['loc']), message)
+
+        widget = service_config.get('widget') if isinstance(service_config, dict) else None
+        if isinstance(widget, dict):
+            schema = Widget.WIDGET_SCHEMAS.get(widget.get('type'), {})
+            for field in schema.get("required", []):
+                if widget.get(field) in (None, ""):
+                    self.warning(service_config, 'widget', path + ('widget', field),
+                                 f"widget.{field}: recommended for {widget['type']} widgets")
+
+    def _locate(self, parent: Any, key: Any, loc: tuple) -> Tuple[Any, Any]:
+        """Deepest existing node on an error's path, as (container, key)"""
+        for part in loc:
+            value = parent[key]
+            if isinstance(value, dict) and part in value or \
+                    isinstance(value, list) and isinstance(part, int) and part < len(value):
+                parent, key = value, part
+            else:
+                break
+        return parent, key
+
+
+# Compiled once, shared by all requests
+validator = ConfigValidator()
@@ -0,0 +1,113 @@
+import asyncio
+import functools
+import inspect
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .io_pool import run_blocking
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process serialization is available
+    fcntl = None
+
+
+class WriteCoordinator:
+    """Serializes load → modify → save cycles on one config file
+
+    Within the process an asyncio.Lock queues writers in arrival order, and
+    a re-entrant thread lock guards direct calls from worker threads. Across
+    uvicorn workers an fcntl advisory lock on a sidecar lock file does the
+    same. Readers take neither lock: saves replace the file atomically.
+
+    Each of ``begin_hooks`` is called once the lock is taken for an
+    outermost mutation, and each of ``commit_hooks`` as ``hook(op,
+    arguments)``, still under the lock, after one that succeeded.
+    """
+
+    def __init__(self, path: Path, on_commit: Optional[Callable[[str, Dict[str, Any]], None]] = None):
+        path = Path(path)
+        self.lock_path = path.with_name(f".{path.name}.lock")
+        self.begin_hooks: List[Callable[[], None]] = []
+        self.commit_hooks: List[Callable[[str, Dict[str, Any]], None]] = [on_commit] if on_commit else []
+        self._async_lock = asyncio.Lock()
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._lock_fd = None
+
+    @contextmanager
+    def locked(self):
+        """Hold the write lock in the current thread (re-entrant)"""
+        with self._thread_lock:
+            if self._depth == 0 and fcntl is not None:
+                self._lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._lock_fd is not None:
+                    fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+                    os.close(self._lock_fd)
+                    self._lock_fd = None
+
+    @contextmanager
+    def local_lock(self):
+        """Wait out in-process writers without taking the file lock"""
+        with self._thread_lock:
+            yield
+
+    def began(self):
+        """Report the start of a mutation; nested mutations are part of the outermost one"""
+        if self._depth != 1:
+            return
+        for hook in self.begin_hooks:
+            try:
+                hook()
+            except Exception as e:
+                print(f"Error in begin hook: {e}")
+
+    def committed(self, op: str, arguments: Dict[str, Any]):
+        """Report a successful mutation; nested mutations are reported by the outermost one"""
+        if self._depth != 1:
+            return
+        for hook in self.commit_hooks:
+            try:
+                hook(op, arguments)
+            except Exception as e:
+                print(f"Error in commit hook for {op}: {e}")
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Queue a mutation behind earlier ones and run it on the I/O pool"""
+        async with self._async_lock:
+            return await run_blocking(func, *args, **kwargs)
+
+
+def mutation(method: Callable) -> Callable:
+    """Mark a handler method as a write that must hold the handler's write lock
+
+    The handler must provide a ``writes`` WriteCoordinator. Through
+    ``handler.aio`` such methods are queued on the coordinator. A call that
+    returns True is reported to the coordinator's commit hooks.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.writes.locked():
+            self.writes.began()
+            result = method(self, *args, **kwargs)
+            if result is True:
+                bound = signature.bind(self, *args, **kwargs)
+                bound.apply_defaults()
+                arguments = dict(bound.arguments)
+                arguments.pop('self', None)
+                self.writes.committed(method.__name__, arguments)
+            return result
+
+    wrapper.is_mutation = True
+    return wrapper
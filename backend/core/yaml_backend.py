@@ -0,0 +1,238 @@
+import codecs
+import re
+import threading
+from typing import IO, Any, Dict, Union
+
+import yaml
+from ruamel.yaml import YAML
+from ruamel.yaml.emitter import RoundTripEmitter
+
+try:
+    from yaml import CSafeLoader, CSafeDumper
+    HAS_LIBYAML = True
+except ImportError:  # PyYAML built without libyaml
+    CSafeLoader, CSafeDumper = yaml.SafeLoader, yaml.SafeDumper
+    HAS_LIBYAML = False
+
+# Fastest safe loader/dumper available, for plain (comment-free) data
+SafeLoader = CSafeLoader
+SafeDumper = CSafeDumper
+
+BOOL_TAG = 'tag:yaml.org,2002:bool'
+INT_TAG = 'tag:yaml.org,2002:int'
+FLOAT_TAG = 'tag:yaml.org,2002:float'
+MERGE_TAG = 'tag:yaml.org,2002:merge'
+VALUE_TAG = 'tag:yaml.org,2002:value'
+
+
+def safe_load(source: Union[str, IO]) -> Any:
+    """yaml.safe_load() through libyaml when available"""
+    return yaml.load(source, Loader=SafeLoader)
+
+
+def safe_dump(data: Any, **kwargs) -> str:
+    """yaml.safe_dump() through libyaml when available"""
+    kwargs.setdefault('Dumper', SafeDumper)
+    return yaml.dump(data, **kwargs)
+
+
+class NormalizedText:
+    """Readable text of an upload, decoded and cleaned up a chunk at a time
+
+    Tabs are replaced with spaces and trailing whitespace is stripped from
+    every line. Parsers read() from it directly, so an upload is never held
+    as a whole string, let alone as a list of its lines.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, source: Union[IO, str], tab: str = '    '):
+        self._source = source
+        self._tab = tab
+        # utf-8-sig also drops a byte order mark
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._partial = ''
+        self._buffer = ''
+        self._eof = False
+
+    def read(self, size: int = -1) -> str:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size < 0 or size >= len(self._buffer):
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def _fill(self):
+        if isinstance(self._source, str):
+            text, self._source = self._source, ''
+            self._eof = True
+        else:
+            chunk = self._source.read(self.CHUNK_SIZE)
+            self._eof = not chunk
+            text = chunk if isinstance(chunk, str) else self._decoder.decode(chunk, final=self._eof)
+
+        lines = (self._partial + text).split('\n')
+        # The last line may continue in the next chunk
+        self._partial = '' if self._eof else lines.pop()
+        if lines:
+            text = '\n'.join(line.replace('\t', self._tab).rstrip() for line in lines)
+            self._buffer += text if self._eof else text + '\n'
+
+
+class HomepageEmitter(RoundTripEmitter):
+    """ruamel emitter that keeps a top-level sequence at column 0
+
+    Homepage files start every group with '- Group:' at column 0 whatever
+    the indentation of the lists below it; ruamel would shift the top
+    level by the sequence dash offset too.
+    """
+
+    def expect_block_sequence_item(self, first: bool = False) -> None:
+        if len(self.indents.values) != 1:
+            return super().expect_block_sequence_item(first)
+        offset, indent = self.sequence_dash_offset, self.best_sequence_indent
+        self.sequence_dash_offset, self.best_sequence_indent = 0, 2
+        try:
+            super().expect_block_sequence_item(first)
+        finally:
+            self.sequence_dash_offset, self.best_sequence_indent = offset, indent
+
+
+def round_trip_yaml() -> YAML:
+    """ruamel.yaml instance that keeps comments and formatting, set up for Homepage files"""
+    ryaml = YAML()
+    ryaml.Emitter = HomepageEmitter
+    ryaml.preserve_quotes = True
+    ryaml.default_flow_style = False
+    ryaml.indent(mapping=2, sequence=2, offset=0)
+    ryaml.width = 4096  # Prevent line wrapping
+    return ryaml
+
+
+def _core_schema_loader(base: type) -> type:
+    """Subclass of a PyYAML loader that reads services.yaml the way ruamel does
+
+    ruamel implements YAML 1.2, PyYAML 1.1: yes/no/on/off stay strings,
+    017 is decimal and 1:30 is not a number. Duplicate keys are errors
+    and explicit keys come before merged ones, also as in ruamel.
+    """
+
+    class Loader(base):
+        def construct_yaml_int(self, node):
+            value = self.construct_scalar(node).replace('_', '')
+            sign = 1
+            if value[0] in '+-':
+                sign = -1 if value[0] == '-' else 1
+                value = value[1:]
+            for prefix, radix in (('0b', 2), ('0x', 16), ('0o', 8)):
+                if value.startswith(prefix):
+                    return sign * int(value[2:], radix)
+            return sign * int(value)
+
+        def construct_mapping(self, node, deep=False):
+            explicit = 0
+            merged = False
+            if isinstance(node, yaml.MappingNode):
+                seen = set()
+                for key_node, _ in node.value:
+                    if key_node.tag == MERGE_TAG:
+                        merged = True
+                        continue
+                    explicit += 1
+                    if isinstance(key_node, yaml.ScalarNode):
+                        if key_node.value in seen:
+                            raise yaml.constructor.ConstructorError(
+                                "while constructing a mapping", node.start_mark,
+                                f"found duplicate key \"{key_node.value}\"", key_node.start_mark)
+                        seen.add(key_node.value)
+            mapping = super().construct_mapping(node, deep=deep)
+            if merged and explicit:
+                # flatten_mapping() put the merged pairs first
+                own = [self.construct_object(key_node) for key_node, _ in node.value[-explicit:]]
+                ordered = {key: mapping[key] for key in own}
+                ordered.update((key, value) for key, value in mapping.items() if key not in ordered)
+                mapping = ordered
+            return mapping
+
+    Loader.__name__ = f"Core{base.__name__}"
+    Loader.yaml_implicit_resolvers = {
+        first: [(tag, regexp) for tag, regexp in resolvers if tag not in (BOOL_TAG, INT_TAG, FLOAT_TAG, VALUE_TAG)]
+        for first, resolvers in base.yaml_implicit_resolvers.items()
+    }
+    Loader.add_implicit_resolver(
+        BOOL_TAG, re.compile(r'^(?:true|True|TRUE|false|False|FALSE)$'), list('tTfF'))
+    Loader.add_implicit_resolver(
+        INT_TAG, re.compile(r'''^(?:[-+]?0b[0-1_]+
+            |[-+]?0o?[0-7_]+
+            |[-+]?[0-9_]+
+            |[-+]?0x[0-9a-fA-F_]+)$''', re.X), list('-+0123456789'))
+    Loader.add_implicit_resolver(
+        FLOAT_TAG, re.compile(r'''^(?:[-+]?(?:[0-9][0-9_]*)\.[0-9_]*(?:[eE][-+]?[0-9]+)?
+            |[-+]?(?:[0-9][0-9_]*)(?:[eE][-+]?[0-9]+)
+            |[-+]?\.[0-9_]+(?:[eE][-+][0-9]+)?
+            |[-+]?\.(?:inf|Inf|INF)
+            |\.(?:nan|NaN|NAN))$''', re.X), list('-+0123456789.'))
+    Loader.add_constructor(INT_TAG, Loader.construct_yaml_int)
+    return Loader
+
+
+class SafeParser:
+    """Plain dicts and lists, through PyYAML (libyaml's C parser if available)
+
+    Much faster than ruamel's round trip, but comments are dropped, so
+    the result cannot be written back as the file was.
+    """
+
+    round_trip = False
+
+    def __init__(self, loader: type, name: str):
+        self.loader = _core_schema_loader(loader)
+        self.name = name
+
+    def load(self, source: Union[str, IO]) -> Any:
+        return yaml.load(source, Loader=self.loader)
+
+
+class RoundTripParser:
+    """ruamel.yaml round trip: CommentedMap/CommentedSeq trees that keep comments"""
+
+    round_trip = True
+    name = "ruamel"
+
+    def __init__(self):
+        self.yaml = round_trip_yaml()
+        # A ruamel YAML instance is not safe to use from several threads
+        self._lock = threading.Lock()
+
+    def load(self, source: Union[str, IO]) -> Any:
+        with self._lock:
+            return self.yaml.load(source)
+
+
+_parsers: Dict[str, Any] = {}
+
+
+def get_parser(name: str = "auto"):
+    """Parser for reading config files: auto, libyaml, pyyaml or ruamel
+
+    auto is libyaml where PyYAML was built with it and pyyaml otherwise;
+    libyaml also falls back to pyyaml when unavailable.
+    """
+    if name == "auto":
+        name = "libyaml" if HAS_LIBYAML else "pyyaml"
+    elif name == "libyaml" and not HAS_LIBYAML:
+        print("libyaml is not available, reading YAML with the pure Python parser")
+        name = "pyyaml"
+
+    if name not in _parsers:
+        if name == "libyaml":
+            _parsers[name] = SafeParser(CSafeLoader, name)
+        elif name == "pyyaml":
+            _parsers[name] = SafeParser(yaml.SafeLoader, name)
+        elif name == "ruamel":
+            _parsers[name] = RoundTripParser()
+        else:
+            raise ValueError(f"Unknown YAML parser '{name}' (expected auto, libyaml, pyyaml or ruamel)")
+    return _parsers[name]
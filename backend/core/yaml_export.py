@@ -0,0 +1,126 @@
+import hashlib
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ruamel.yaml.scalarbool import ScalarBoolean
+
+from .profiling import phase
+from .yaml_backend import safe_dump
+
+
+def plain(node: Any) -> Any:
+    """Copy of a loaded tree with ruamel's comment-carrying types turned into builtins
+
+    PyYAML's dumpers only know the exact builtin types; ruamel's
+    CommentedMap/CommentedSeq and scalar subclasses would otherwise be
+    written as python/object tags.
+    """
+    if isinstance(node, dict):
+        return {plain(key): plain(value) for key, value in node.items()}
+    if isinstance(node, (list, tuple)):
+        return [plain(item) for item in node]
+    if isinstance(node, (bool, ScalarBoolean)):
+        return bool(node)
+    if isinstance(node, int):
+        return int(node)
+    if isinstance(node, float):
+        return float(node)
+    if isinstance(node, str):
+        return str(node)
+    return node
+
+
+@phase("dump")
+def dump_yaml(data: Any) -> str:
+    """Serialize plain data the way exports are written (2-space indent, block style)"""
+    return safe_dump(data,
+                     default_flow_style=False,
+                     allow_unicode=True,
+                     sort_keys=False,
+                     indent=2)  # Use 2-space indent for Homepage compatibility
+
+
+def top_level_entries(config: Any) -> List[Tuple[Optional[str], Any]]:
+    """(name, value) of each category or group, in file order, for either file format"""
+    if isinstance(config, dict):
+        return list(config.items())
+    entries = []
+    for item in config or []:
+        if isinstance(item, dict):
+            entries.extend(item.items())
+        else:
+            entries.append((None, item))
+    return entries
+
+
+def parse_names(value: Optional[str]) -> Optional[List[str]]:
+    """"Media,Tools" query parameter as a list of names; None when not given"""
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def export_resource(resource: str, names: Optional[Sequence[str]]) -> str:
+    """ETag resource name of an export, distinct for each filter"""
+    if names is None:
+        return resource
+    key = "\n".join(sorted(set(names))).encode("utf-8")
+    return f"{resource}-{hashlib.sha256(key).hexdigest()[:12]}"
+
+
+class ExportCache:
+    """YAML export of a config file, serialized once per version
+
+    The export is a list with one single-key mapping per category (or
+    bookmark group). Each entry is serialized separately, so a filtered
+    export only serializes what it includes, and the entries can be sent
+    as they are produced.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        # {(position, name): YAML of that entry as a one-item list}
+        self._fragments: Dict[Tuple[int, Optional[str]], str] = {}
+        # {names filter or None: whole export}
+        self._exports: Dict[Optional[Tuple[str, ...]], str] = {}
+
+    def _for_version(self, version: str) -> Tuple[Dict, Dict]:
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._fragments = {}
+                self._exports = {}
+            return self._fragments, self._exports
+
+    def iter_export(self, version: str, config: Any, names: Optional[Sequence[str]] = None) -> Iterator[str]:
+        """The export in parts, one per entry; names limits it to those entries"""
+        fragments, _ = self._for_version(version)
+        entries = list(enumerate(top_level_entries(config)))
+        if names is not None:
+            wanted = set(names)
+            entries = [(i, (name, value)) for i, (name, value) in entries if name in wanted]
+
+        def generate() -> Iterator[str]:
+            if not entries:
+                yield dump_yaml([])
+                return
+            for position, (name, value) in entries:
+                fragment = fragments.get((position, name))
+                if fragment is None:
+                    item = plain(value) if name is None else {plain(name): plain(value)}
+                    fragment = dump_yaml([item])
+                    fragments[(position, name)] = fragment
+                yield fragment
+
+        return generate()
+
+    def export(self, version: str, config: Any, names: Optional[Sequence[str]] = None) -> str:
+        """The whole export as one string, reused until the version changes"""
+        _, exports = self._for_version(version)
+        key = tuple(sorted(set(names))) if names is not None else None
+        text = exports.get(key)
+        if text is None:
+            text = "".join(self.iter_export(version, config, names))
+            exports[key] = text
+        return text
@@ -1,382 +1,222 @@
 import yaml
-from ruamel.yaml import YAML
+from ruamel.yaml import YAMLError
 from ruamel.yaml.comments import CommentedMap, CommentedSeq
-from typing import Dict, List, Any, Optional, Union
+from typing import IO, Callable, Dict, Iterator, List, Any, NamedTuple, Optional, Union
 from pathlib import Path
-import copy
+import hashlib
+import io
 import re
+from .config_cache import ConfigCache, CachedSnapshot
+from .file_io import atomic_write
+from .io_pool import AsyncHandler
+from .metrics import timed
+from .profiling import phase
+from .write_coordinator import WriteCoordinator, mutation
+from .service_index import ServiceIndex
+from .config_tree import ConfigTree, as_nodes
+from .yaml_export import ExportCache
+from .yaml_backend import NormalizedText, get_parser, round_trip_yaml
+from .comment_scanner import (
+    scan_config, hidden_block_snippet, strip_comment_copies, comment_out, move_blank_lines,
+    ConfigIndex, HiddenBlock, Indentation, DEFAULT_INDENTATION
+)
+
+class ParsedConfig(NamedTuple):
+    """Cached parse of services.yaml: loaded tree, parse_services() result and its index"""
+    config: Union[List[Dict[str, Any]], Dict[str, Any]]
+    categories: Dict[str, List[Dict]]
+    index: ServiceIndex
+
+    @classmethod
+    def empty(cls) -> 'ParsedConfig':
+        return cls([], {}, ServiceIndex({}))
+
 
 class YAMLHandler:
     """Handle YAML parsing and generation for Homepage configuration"""
 
-    def __init__(self, config_path: str = "config/services.yaml"):
+    def __init__(self, config_path: str = "config/services.yaml", parser: str = "auto"):
         self.config_path = Path(config_path)
         self.config_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Initialize ruamel.yaml instance
-        self.yaml = YAML()
-        self.yaml.preserve_quotes = True
-        self.yaml.default_flow_style = False
-        self.yaml.indent(mapping=2, sequence=2, offset=0)
-        self.yaml.width = 4096  # Prevent line wrapping
+        # ruamel.yaml instance for writing; it keeps comments and formatting
+        self.yaml = round_trip_yaml()
 
-    def load_config(self) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
-        """Load configuration from YAML file
-        Returns either a list (standard format) or dict (direct format)
-        Preserves comments and formatting using ruamel.yaml
-        """
-        if not self.config_path.exists():
-            return []
+        # Reads use the fast parser; writes need ruamel's comment-carrying
+        # tree, loaded on the first write after the file changed and then
+        # edited in place by the writes: (version, tree, indentation)
+        self.parser = get_parser(parser)
+        self.round_trip = get_parser("ruamel")
+        self._round_trip_tree = ("", None, DEFAULT_INDENTATION)
 
-        try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                content = self.yaml.load(f)
+        # Parsed tree and parse_services() result, shared until the file changes
+        self._cache = ConfigCache(self.config_path, self._parse_snapshot, ParsedConfig.empty)
+
+        # Serializes mutations of this file across requests and workers
+        self.writes = WriteCoordinator(self.config_path)
+
+        # Serialized exports of the current version
+        self._exports = ExportCache()
+
+        # Same methods, awaitable and run on the I/O pool
+        self.aio = AsyncHandler(self)
+
+    def _load_tree(self, parser, text: str, index: Optional[ConfigIndex] = None) -> Optional[Union[List, Dict]]:
+        """Load file contents with a parser, hidden services and health check fields restored"""
+        with phase("parse"):
+            content = parser.load(text)
+        if content is None:
+            return None
+
+        # Detect and flag commented health check fields
+        return self._load_commented_fields(content, text, parser, index)
 
-                # Return empty list if no content
-                if content is None:
-                    return []
+    def _parse_snapshot(self, text: str) -> ParsedConfig:
+        """Parse file contents into a ParsedConfig for the cache"""
+        try:
+            content = self._load_tree(self.parser, text)
 
-                # Detect and flag commented health check fields
-                content = self._load_commented_fields(content)
+            # Return empty list if no content
+            if content is None:
+                return ParsedConfig.empty()
 
-                return content
+            categories = self.parse_services(content)
+            return ParsedConfig(content, categories, ServiceIndex(categories))
         except Exception as e:
             print(f"Error loading config: {e}")
-            return []
+            return ParsedConfig.empty()
+
+    def snapshot(self) -> CachedSnapshot:
+        """Current cached snapshot; its data is a ParsedConfig
+
+        The returned objects are shared between requests and must not be modified.
+        """
+        return self._cache.get()
+
+    def get_services(self) -> Dict[str, List[Dict]]:
+        """Cached parse_services() result for read-only use"""
+        return self._cache.get().data.categories
+
+    def version(self) -> str:
+        """Content hash of services.yaml, without parsing it"""
+        return self._cache.version()
 
+    def refresh(self) -> bool:
+        """Re-parse services.yaml if it changed on disk; called by the file watcher"""
+        return self._cache.refresh()
+
+    def set_watched(self, watched: bool):
+        """Serve the cached snapshot without stat() calls while a file watcher runs"""
+        self._cache.watched = watched
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters of the parsed config cache"""
+        return self._cache.stats()
+
+    @timed()
+    def load_config(self) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
+        """Load configuration from YAML file
+        Returns either a list (standard format) or dict (direct format)
+        Preserves comments and formatting using ruamel.yaml
+        Call with the write lock held: the result is the cached tree itself,
+        which writes edit in place, so the file is only parsed again when it
+        changed on disk (it is always checked, since writers start from it).
+        """
+        snapshot = self._cache.get(verify=True)
+        version, tree, _ = self._round_trip_tree
+        if version != snapshot.version:
+            index = scan_config(snapshot.text)
+            try:
+                tree = self._load_tree(self.round_trip, snapshot.text, index)
+            except Exception as e:
+                print(f"Error loading config: {e}")
+                tree = None
+            if tree is None:
+                tree = CommentedSeq()
+            self._round_trip_tree = (snapshot.version, tree, index.indentation())
+        return tree
+
+    def _drop_tree(self):
+        """Forget the cached tree, e.g. after edits that were not saved"""
+        self._round_trip_tree = ("", None, DEFAULT_INDENTATION)
+
+    def _dump(self, data: Any) -> str:
+        stream = io.StringIO()
+        self.yaml.dump(data, stream)
+        return stream.getvalue()
+
+    @mutation
+    @timed()
     def save_config(self, config: List[Dict[str, Any]]) -> bool:
         """Save configuration to YAML file
         Preserves comments and formatting using ruamel.yaml
+        The tree from load_config() is written with the file's indentation
+        and stays cached for the next write; any other config (an import)
+        gets the default layout.
         """
+        _, tree, indentation = self._round_trip_tree
+        if config is not tree:
+            indentation = DEFAULT_INDENTATION
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                self.yaml.dump(config, f)
-
-            print("[DEBUG] Config dumped, now processing comments...")
-
-            # Post-process to handle commented fields and hidden services
-            self._process_comments()
+            self.yaml.indent(mapping=indentation.mapping, sequence=indentation.sequence,
+                             offset=indentation.offset)
+            # Hidden services and disabled health checks are written as comments
+            restore = self._comment_out(config, indentation)
+            try:
+                with phase("dump"):
+                    content = self._dump(config)
+            finally:
+                restore()
+
+            atomic_write(self.config_path, content)
+            if config is tree:
+                version = hashlib.sha256(content.encode('utf-8')).hexdigest()
+                self._round_trip_tree = (version, tree, indentation)
+            else:
+                self._drop_tree()
             return True
         except Exception as e:
             print(f"Error saving config: {e}")
+            self._drop_tree()
             return False
+        finally:
+            self._cache.invalidate()
 
-    def _process_comments(self):
-        """Process comments for healthCheckDisabled fields and hidden services"""
+    @mutation
+    def restore(self, content: bytes) -> bool:
+        """Replace the file with earlier contents (a backup), byte for byte"""
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # First pass: identify services with healthCheckDisabled or hidden
-            services_to_comment_fields = set()  # Services with healthCheckDisabled
-            services_to_hide = set()  # Services with hidden: true
-            current_service_start = None
-            current_service_name = None
-            service_names = {}  # {line_num: service_name}
-
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-
-                # Detect service start (indent level 2: '  - ServiceName:')
-                if stripped.startswith('- ') and ':' in stripped:
-                    indent_level = len(line) - len(line.lstrip())
-                    if indent_level == 2:  # Service level
-                        current_service_start = i
-                        current_service_name = stripped.split(':')[0][2:].strip()
-                        service_names[i] = current_service_name
-
-                # Check for healthCheckDisabled
-                if 'healthCheckDisabled: true' in line and current_service_start is not None:
-                    print(f"[DEBUG] Found healthCheckDisabled for {current_service_name}")
-                    services_to_comment_fields.add(current_service_start)
-
-                # Check for hidden
-                if 'hidden: true' in line and current_service_start is not None:
-                    services_to_hide.add(current_service_start)
-
-            if services_to_comment_fields:
-                print(f"[DEBUG] Services to comment health check fields: {[service_names.get(line) for line in services_to_comment_fields]}")
-
-            # Second pass: comment out fields/services as needed, OR uncomment if should be visible
-            new_lines = []
-            current_service_start = None
-            service_to_comment_fields = False
-            service_to_hide = False
-            in_hidden_service = False
-            in_commented_service = False  # Track if we're in a commented service block
-            in_normal_service = False  # Track if we're in a normal service (for uncommenting health check fields)
-            hidden_service_indent = 0
-
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-                indent_level = len(line) - len(line.lstrip())
-
-                # Check if we've exited the hidden/commented/normal service
-                # Only exit when we hit another service definition line
-                if (in_hidden_service or in_commented_service or in_normal_service):
-                    if indent_level <= 2 and (stripped.startswith('- ') or stripped.startswith('# - ')) and ':' in stripped:
-                        # Exit service state when we reach a new service at the same level
-                        in_hidden_service = False
-                        in_commented_service = False
-                        in_normal_service = False
-
-                # Detect service start (indent level 2)
-                if indent_level == 2:
-                    # Detect commented service
-                    if stripped.startswith('# - ') and ':' in stripped:
-                        service_name = stripped[4:].split(':')[0].strip()
-                        current_service_start = i
-                        service_to_hide = i in services_to_hide
-
-                        if not service_to_hide:
-                            # This service is commented but should NOT be hidden
-                            # We need to uncomment it (skip the commented lines)
-                            in_commented_service = True
-                            hidden_service_indent = indent_level
-                        else:
-                            # Keep it commented
-                            in_commented_service = False
-                    # Detect normal service
-                    elif stripped.startswith('- ') and ':' in stripped:
-                        current_service_start = i
-                        service_to_comment_fields = i in services_to_comment_fields
-                        service_to_hide = i in services_to_hide
-
-                        if service_to_hide:
-                            in_hidden_service = True
-                            hidden_service_indent = indent_level
-                        elif not service_to_comment_fields:
-                            # Normal service without healthCheckDisabled
-                            # May need to uncomment health check fields
-                            in_normal_service = True
-
-                # Skip healthCheckDisabled and hidden lines (internal flags)
-                if 'healthCheckDisabled:' in line or 'hidden:' in line:
-                    continue
-
-                # Skip commented service if it should be visible
-                # (It's already in the file as a normal service because we added it to config)
-                if in_commented_service:
-                    # Skip these lines - they're duplicates
-                    # The service was already added by _load_commented_fields and written by dump()
-                    continue
-
-                # Comment out entire service if marked as hidden
-                elif in_hidden_service:
-                    if not stripped.startswith('#'):
-                        # Get the base indent (should be 2 for service level, 4+ for fields)
-                        original_indent = len(line) - len(line.lstrip())
-                        # For service name line (indent 2), keep it at 2
-                        # For config lines (indent 4+), convert to 2 + relative indent
-                        if stripped.startswith('- ') and indent_level == 2:
-                            # Service line: keep at indent 2
-                            line = f"  # {line.lstrip()}"
-                        else:
-                            # Config line: add comment at base level (2 spaces) + relative indent
-                            relative_indent = original_indent - 2  # Relative to service level
-                            if relative_indent < 0:
-                                relative_indent = 0
-                            line = f"  # {' ' * relative_indent}{line.lstrip()}"
-
-                # Uncomment health check fields if in a normal service (health check enabled)
-                elif in_normal_service:
-                    if stripped.startswith('#'):
-                        # Check if it's a commented health check field
-                        uncommented = stripped[1:].strip()
-                        if any(f'{field}:' in uncommented for field in ['ping', 'server', 'container']):
-                            # Remove the comment
-                            indent = line[:len(line) - len(line.lstrip())]
-                            line = f"{indent}{uncommented}\n"
-
-                # Comment out health check fields if this service is marked
-                elif service_to_comment_fields and any(f'{field}:' in stripped for field in ['ping', 'server', 'container']):
-                    if not stripped.startswith('#'):
-                        # Preserve indentation and add comment
-                        indent = line[:len(line) - len(line.lstrip())]
-                        line = f"{indent}# {line.lstrip()}"
-
-                new_lines.append(line)
-
-            # Write back
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                f.writelines(new_lines)
-
+            atomic_write(self.config_path, content)
+            return True
         except Exception as e:
-            print(f"Error processing comments: {e}")
+            print(f"Error restoring config: {e}")
+            return False
+        finally:
+            self._cache.invalidate()
+
+    @timed()
+    @phase("comments")
+    def _comment_out(self, config: Union[List, Dict], indentation: Indentation) -> Callable[[], None]:
+        """Turn flagged services and fields into comments on the nodes, for a dump
+        Returns the function that puts the tree back; see comment_out()
+        """
+        return comment_out(config, indentation, self._dump)
 
-    def _load_commented_fields(self, config: Union[List, Dict]) -> Union[List, Dict]:
+    @timed()
+    @phase("comments")
+    def _load_commented_fields(self, config: Union[List, Dict], text: str, parser,
+                               index: Optional[ConfigIndex] = None) -> Union[List, Dict]:
         """Load and detect commented health check fields and hidden services
         Also extracts commented services and adds them back to config with hidden flag
+        Works on the text the parser already loaded, scanned once by scan_config()
         """
         try:
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-            # Track services with commented health check fields and hidden services
-            current_category = None
-            current_service = None
-            has_commented_fields = {}
-            hidden_services = {}
-
-            # Store parsed hidden services to add to config with line numbers for ordering
-            hidden_services_data = {}  # {category: [{name: config, line_number: int}]}
-
-            i = 0
-            while i < len(lines):
-                line = lines[i]
-                stripped = line.strip()
-                indent_level = len(line) - len(line.lstrip())
-
-                # Detect category (indent level 0: '- CategoryName:')
-                if stripped.startswith('- ') and ':' in stripped and indent_level == 0:
-                    current_category = stripped.split(':')[0][2:].strip()
-                    current_service = None
-
-                # Detect service within category (indent level 2)
-                elif indent_level == 2 and current_category:
-                    # Check if it's a commented service line
-                    if stripped.startswith('# - ') and ':' in stripped:
-                        start_line = i
-                        current_service = stripped[4:].split(':')[0].strip()  # Remove '# - '
-                        key = f"{current_category}:{current_service}"
-                        hidden_services[key] = True
-
-                        # Collect all commented lines for this service
-                        service_lines = []
-                        i += 1
-
-                        # Read all commented lines that belong to this service
-                        while i < len(lines):
-                            next_line = lines[i]
-                            next_stripped = next_line.strip()
-                            next_indent = len(next_line) - len(next_line.lstrip())
-
-                            # Stop if we hit another service (at indent 2) or category (at indent 0)
-                            if next_stripped.startswith('# - ') and ':' in next_stripped and next_indent == 2:
-                                # Hit another commented service
-                                i -= 1
-                                break
-                            elif next_stripped.startswith('- ') and ':' in next_stripped and next_indent <= 2:
-                                # Hit an uncommented service or category
-                                i -= 1
-                                break
-                            elif not next_stripped.startswith('#') and next_stripped and next_indent <= 2:
-                                # Hit non-commented content at service level or above
-                                i -= 1
-                                break
-
-                            # Collect commented lines
-                            if next_stripped.startswith('#'):
-                                service_lines.append(next_line)
-                            elif not next_stripped:
-                                # Empty line - could be end of service
-                                pass
-                            else:
-                                # Non-commented line - end of this service block
-                                i -= 1
-                                break
-
-                            i += 1
-
-                        # Parse the service by uncommenting and using YAML parser
-                        service_config = {}
-                        if service_lines:
-                            # Uncomment lines while preserving relative indentation
-                            # Step 1: Remove comments and measure indents
-                            processed_lines = []
-                            for line in service_lines:
-                                stripped = line.strip()
-                                if stripped.startswith('#'):
-                                    # Get the content after removing '#' and one optional space
-                                    content = stripped[1:]
-                                    if content and content[0] == ' ':
-                                        content = content[1:]
-
-                                    # Get original indent (before the #)
-                                    original_indent = len(line) - len(line.lstrip())
-
-                                    processed_lines.append((original_indent, content))
-
-                            # Step 2: Find base indent (minimum)
-                            if processed_lines:
-                                base_indent = min(indent for indent, _ in processed_lines)
-
-                                # Step 3: Rebuild with normalized indentation
-                                uncommented_lines = []
-                                for original_indent, content in processed_lines:
-                                    # Calculate relative indent
-                                    relative_indent = original_indent - base_indent
-                                    # Service fields start at 4 spaces
-                                    final_indent = 4 + relative_indent
-                                    uncommented_lines.append(f"{' ' * final_indent}{content}\n")
-
-                                # Build YAML snippet
-                                yaml_snippet = f"  - {current_service}:\n" + ''.join(uncommented_lines)
-                            else:
-                                yaml_snippet = f"  - {current_service}:\n"
-
-                            try:
-                                # Parse with YAML
-                                parsed = yaml.safe_load(yaml_snippet)
-                                if parsed and isinstance(parsed, list) and len(parsed) > 0:
-                                    service_dict = parsed[0]
-                                    if current_service in service_dict:
-                                        service_config = service_dict[current_service] or {}
-                            except Exception as e:
-                                print(f"Warning: Failed to parse commented service {current_service}: {e}")
-                                # Fall back to empty config
-                                service_config = {}
-
-                        # Store the hidden service data with line number for ordering
-                        if current_category not in hidden_services_data:
-                            hidden_services_data[current_category] = []
-                        hidden_services_data[current_category].append({
-                            'name': current_service,
-                            'config': service_config,
-                            'line_number': start_line
-                        })
-
-                    elif stripped.startswith('- ') and ':' in stripped:
-                        current_service = stripped.split(':')[0][2:].strip()
-
-                # Detect commented health check fields (for non-hidden services)
-                if current_service and stripped.startswith('#') and current_service:
-                    uncommented = stripped[1:].strip()
-                    # Check if it's a health check field
-                    for field in ['ping:', 'server:', 'container:']:
-                        if field in uncommented and ':' in uncommented:
-                            key = f"{current_category}:{current_service}"
-                            if key not in has_commented_fields:
-                                has_commented_fields[key] = {}
-
-                            # Parse the field value
-                            field_name = field[:-1]  # Remove the ':'
-                            field_value = uncommented.split(':', 1)[1].strip()
-
-                            # Store the field and its value
-                            has_commented_fields[key][field_name] = field_value
-
-                i += 1
-
-            # Build a complete service list with line numbers for proper ordering
-            # First, scan the file again to get line numbers for all services
-            service_line_numbers = {}  # {category:service_name: line_number}
-            current_category = None
-            for i, line in enumerate(lines):
-                stripped = line.strip()
-                indent_level = len(line) - len(line.lstrip())
-
-                # Detect category
-                if stripped.startswith('- ') and ':' in stripped and indent_level == 0:
-                    current_category = stripped.split(':')[0][2:].strip()
-                # Detect service (commented or not)
-                elif indent_level == 2 and current_category:
-                    if stripped.startswith('# - ') and ':' in stripped:
-                        service_name = stripped[4:].split(':')[0].strip()
-                        service_line_numbers[f"{current_category}:{service_name}"] = i
-                    elif stripped.startswith('- ') and ':' in stripped:
-                        service_name = stripped.split(':')[0][2:].strip()
-                        service_line_numbers[f"{current_category}:{service_name}"] = i
+            if index is None:
+                index = scan_config(text)
+            hidden_keys = index.hidden_keys()
+            hidden_services_data = self._parse_hidden_blocks(index.hidden_blocks, parser)
+            # Comment lines turned back into nodes, removed from the tree at the end
+            restored_lines = set()
 
             # Add healthCheckDisabled and hidden flags to existing services
             # Also add hidden services to config in the correct order
@@ -384,50 +224,55 @@ class YAMLHandler:
                 for category_item in config:
                     if isinstance(category_item, dict):
                         for category_name, services in category_item.items():
+                            if services is None and category_name in hidden_services_data:
+                                # Every service of the category is hidden
+                                services = category_item[category_name] = CommentedSeq() if parser.round_trip else []
                             if isinstance(services, list):
+                                existing_names = set()
                                 # Mark existing services
                                 for service_item in services:
                                     if isinstance(service_item, dict):
                                         for service_name, service_config in service_item.items():
+                                            existing_names.add(service_name)
                                             key = f"{category_name}:{service_name}"
                                             if isinstance(service_config, dict):
                                                 # Mark services with commented health check fields
                                                 # and restore the field values from comments
-                                                if key in has_commented_fields:
+                                                if key in index.commented_fields:
                                                     service_config['healthCheckDisabled'] = True
                                                     # Add back the commented field values
-                                                    for field_name, field_value in has_commented_fields[key].items():
-                                                        service_config[field_name] = field_value
+                                                    self._restore_commented_fields(
+                                                        service_config, index.commented_fields[key], index.field_anchors[key],
+                                                        index.field_lines[key]
+                                                    )
+                                                    restored_lines |= index.field_lines[key]
                                                 # Mark hidden services
-                                                if key in hidden_services:
+                                                if key in hidden_keys:
                                                     service_config['hidden'] = True
 
-                                # Add hidden services and re-sort by line number
+                                # Add hidden services and restore file order
                                 if category_name in hidden_services_data:
-                                    for hidden_service in hidden_services_data[category_name]:
-                                        # Check if service already exists (shouldn't happen but be safe)
-                                        service_exists = False
-                                        for service_item in services:
-                                            if isinstance(service_item, dict):
-                                                if hidden_service['name'] in service_item:
-                                                    service_exists = True
-                                                    break
-
-                                        if not service_exists:
-                                            # Add the hidden service with hidden flag
-                                            hidden_config = hidden_service['config'].copy()
+                                    for hidden_name, hidden_config in hidden_services_data[category_name]:
+                                        # Skip if service already exists (shouldn't happen but be safe)
+                                        if hidden_name not in existing_names:
+                                            existing_names.add(hidden_name)
                                             hidden_config['hidden'] = True
-                                            services.append({hidden_service['name']: hidden_config})
+                                            services.append({hidden_name: hidden_config})
+
+                                    # Hidden services were appended, so the list is two sorted runs
+                                    ranks = index.service_ranks(category_name)
 
-                                    # Now sort services by their line numbers in the original file
-                                    def get_service_line_number(service_item):
+                                    def get_service_rank(service_item):
                                         if isinstance(service_item, dict):
                                             for service_name in service_item.keys():
-                                                key = f"{category_name}:{service_name}"
-                                                return service_line_numbers.get(key, 999999)
-                                        return 999999
+                                                return ranks.get(str(service_name), len(ranks))
+                                        return len(ranks)
 
-                                    services.sort(key=get_service_line_number)
+                                    services.sort(key=get_service_rank)
+
+            # Only ruamel keeps the comments these came from
+            if parser.round_trip and (index.hidden_blocks or restored_lines):
+                strip_comment_copies(config, restored_lines, index.service_indent)
 
             return config
 
@@ -437,6 +282,73 @@ class YAMLHandler:
             traceback.print_exc()
             return config
 
+    def _restore_commented_fields(self, service_config: Dict, fields: Dict[str, str],
+                                  anchors: Dict[str, Optional[str]], lines: set = frozenset()):
+        """Turn commented health check fields back into keys where the comments were
+
+        lines are the field comments as scanned; blank lines after the last
+        of them move along with the restored fields.
+        """
+        last_inserted = {}
+        for field_name, field_value in fields.items():
+            anchor = anchors.get(field_name)
+            if field_name in service_config or (anchor is not None and anchor not in service_config):
+                service_config[field_name] = field_value
+                continue
+            # Several fields after the same key keep their order
+            previous = last_inserted.get(anchor, anchor)
+            position = 0 if previous is None else list(service_config).index(previous) + 1
+            if isinstance(service_config, CommentedMap):
+                service_config.insert(position, field_name, field_value)
+            else:
+                items = list(service_config.items())
+                items.insert(position, (field_name, field_value))
+                service_config.clear()
+                service_config.update(items)
+            last_inserted[anchor] = field_name
+
+        if isinstance(service_config, CommentedMap):
+            for anchor, field_name in last_inserted.items():
+                if anchor is not None:
+                    move_blank_lines(service_config, anchor, field_name, lines)
+
+    def _parse_hidden_blocks(self, blocks: List[HiddenBlock], parser) -> Dict[str, List]:
+        """Parse the bodies of all hidden services with a single YAML load
+        Returns {category: [(service_name, config)]} in file order
+        """
+        snippets = {}
+        for i, block in enumerate(blocks):
+            if block.has_body():
+                snippets[f"__hidden_{i}__"] = hidden_block_snippet(f"__hidden_{i}__", block)
+
+        parsed = {}
+        if snippets:
+            try:
+                for item in parser.load(''.join(snippets.values())) or []:
+                    if isinstance(item, dict):
+                        parsed.update(item)
+            except Exception:
+                # One malformed block must not hide the others: parse them one by one
+                for key, snippet in snippets.items():
+                    try:
+                        item = (parser.load(snippet) or [None])[0]
+                        if isinstance(item, dict):
+                            parsed.update(item)
+                    except Exception as e:
+                        print(f"Warning: Failed to parse commented service {key}: {e}")
+
+        hidden_services_data = {}
+        for i, block in enumerate(blocks):
+            service_config = parsed.get(f"__hidden_{i}__") or {}
+            if not isinstance(service_config, dict):
+                service_config = {}
+            hidden_services_data.setdefault(block.entry.category, []).append(
+                (block.entry.name, service_config)
+            )
+        return hidden_services_data
+
+    @timed()
+    @phase("build")
     def parse_services(self, config: Union[List[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, List[Dict]]:
         """Parse services from configuration into categories
         Supports both formats:
@@ -480,183 +392,268 @@ class YAMLHandler:
 
         return result
 
-    def build_config(self, categories: Dict[str, List[Dict]]) -> List[Dict[str, Any]]:
-        """Build configuration from categories and services"""
-        config = []
-
-        for category_name, services in categories.items():
-            category_services = []
-            for service in services:
-                service_dict = {service['name']: service.get('config', {})}
-                category_services.append(service_dict)
-
-            config.append({category_name: category_services})
+    # Operations understood by apply_operations(); each one edits the
+    # ConfigTree in place and returns False if it does not apply
+    def _op_add(self, tree: ConfigTree, category: str, name: str, config: Optional[Dict] = None,
+                index: Optional[int] = None) -> bool:
+        if tree.has_service(category, name):
+            return False
+        tree.insert_service(category, name, config or {}, index)
+        return True
 
-        return config
+    def _op_update(self, tree: ConfigTree, category: str, name: str, config: Optional[Dict] = None) -> bool:
+        if not tree.has_service(category, name):
+            return False
+        tree.set_config(category, name, config or {})
+        return True
 
-    def add_service(self, category: str, service_name: str, service_config: Dict) -> bool:
-        """Add a service to a category"""
-        config = self.load_config()
-        categories = self.parse_services(config)
+    def _op_delete(self, tree: ConfigTree, category: str, name: str) -> bool:
+        if tree.remove_service(category, name) is None:
+            return False
+        # Remove empty categories
+        if not tree.services(category):
+            tree.remove_category(category)
+        return True
 
-        if category not in categories:
-            categories[category] = []
+    def _op_move(self, tree: ConfigTree, category: str, name: str, to_category: str,
+                 index: Optional[int] = None) -> bool:
+        if not tree.has_service(category, name):
+            return False
+        if to_category != category and tree.has_service(to_category, name):
+            return False
+        tree.move_service(category, name, to_category, index)
+        # Remove empty categories
+        if not tree.services(category):
+            tree.remove_category(category)
+        return True
+
+    def _op_rename(self, tree: ConfigTree, category: str, name: str, new_name: str,
+                   config: Optional[Dict] = None) -> bool:
+        """Rename a service in place; config is merged into its current one"""
+        if not tree.has_service(category, name) or tree.has_service(category, new_name):
+            return False
+        tree.rename_service(category, name, new_name)
+        for field, value in (config or {}).items():
+            tree.set_field(category, new_name, field, value)
+        return True
 
-        # Check if service already exists
-        for service in categories[category]:
-            if service['name'] == service_name:
-                return False
+    def _op_reorder(self, tree: ConfigTree, category: str, order: List[str]) -> bool:
+        if category not in tree:
+            return False
+        tree.reorder_services(category, order)
+        return True
 
-        categories[category].append({
-            'name': service_name,
-            'config': service_config
-        })
+    def _op_hide(self, tree: ConfigTree, category: str, name: str, value: bool = True) -> bool:
+        if not tree.has_service(category, name):
+            return False
+        if value:
+            tree.set_field(category, name, 'hidden', True)
+        else:
+            tree.remove_field(category, name, 'hidden')
+        return True
+
+    def _op_health_check(self, tree: ConfigTree, category: str, name: str, value: bool = True) -> bool:
+        """Enable (value=True) or disable the health check fields of a service"""
+        if not tree.has_service(category, name):
+            return False
+        if value:
+            tree.remove_field(category, name, 'healthCheckDisabled')
+        else:
+            tree.set_field(category, name, 'healthCheckDisabled', True)
+        return True
+
+    def _op_add_category(self, tree: ConfigTree, category: str) -> bool:
+        if category in tree:
+            return False
+        tree.add_category(category)
+        return True
 
-        new_config = self.build_config(categories)
-        return self.save_config(new_config)
+    def _op_rename_category(self, tree: ConfigTree, category: str, new_name: str) -> bool:
+        if category not in tree or new_name in tree:
+            return False
+        tree.rename_category(category, new_name)
+        return True
 
-    def update_service(self, category: str, service_name: str, service_config: Dict) -> bool:
-        """Update a service configuration"""
-        config = self.load_config()
-        categories = self.parse_services(config)
+    def _op_delete_category(self, tree: ConfigTree, category: str, force: bool = False) -> bool:
+        if category not in tree:
+            return False
+        if tree.services(category) and not force:
+            return False
+        tree.remove_category(category)
+        return True
+
+    def _op_reorder_categories(self, tree: ConfigTree, order: List[str]) -> bool:
+        tree.reorder_categories(order)
+        return True
+
+    OPERATIONS = {
+        'add': _op_add,
+        'update': _op_update,
+        'delete': _op_delete,
+        'move': _op_move,
+        'rename': _op_rename,
+        'reorder': _op_reorder,
+        'hide': _op_hide,
+        'health_check': _op_health_check,
+        'add_category': _op_add_category,
+        'rename_category': _op_rename_category,
+        'delete_category': _op_delete_category,
+        'reorder_categories': _op_reorder_categories,
+    }
+
+    @mutation
+    def apply_operations(self, operations: List[Dict[str, Any]]) -> bool:
+        """Apply a list of operations to one in-memory config and save once
+        The loaded tree is edited in place, so untouched comments and
+        formatting are written back as they were.
+        Each operation is a dict with an 'op' key (see OPERATIONS) and that
+        operation's arguments. Raises ValueError, without saving anything, if
+        an operation is unknown or does not apply.
+        """
+        tree = ConfigTree(self.load_config())
 
-        if category not in categories:
+        try:
+            for i, operation in enumerate(operations):
+                arguments = dict(operation)
+                op = arguments.pop('op', None)
+                if op not in self.OPERATIONS:
+                    raise ValueError(f"Operation {i}: unknown operation '{op}'")
+                try:
+                    applied = self.OPERATIONS[op](self, tree, **arguments)
+                except TypeError as e:
+                    raise ValueError(f"Operation {i} ({op}): {e}")
+                if not applied:
+                    raise ValueError(f"Operation {i} ({op}) could not be applied")
+        except Exception:
+            # The operations before this one edited the cached tree
+            self._drop_tree()
+            raise
+
+        return self.save_config(tree.root)
+
+    def _apply(self, *operations: Dict[str, Any]) -> bool:
+        try:
+            return self.apply_operations(list(operations))
+        except ValueError:
             return False
 
-        for i, service in enumerate(categories[category]):
-            if service['name'] == service_name:
-                categories[category][i]['config'] = service_config
-                new_config = self.build_config(categories)
-                return self.save_config(new_config)
+    @mutation
+    def add_service(self, category: str, service_name: str, service_config: Dict) -> bool:
+        """Add a service to a category"""
+        return self._apply({'op': 'add', 'category': category, 'name': service_name, 'config': service_config})
 
-        return False
+    @mutation
+    def update_service(self, category: str, service_name: str, service_config: Dict) -> bool:
+        """Update a service configuration"""
+        return self._apply({'op': 'update', 'category': category, 'name': service_name, 'config': service_config})
 
+    @mutation
     def delete_service(self, category: str, service_name: str) -> bool:
         """Delete a service from a category"""
-        config = self.load_config()
-        categories = self.parse_services(config)
-
-        if category not in categories:
-            return False
-
-        categories[category] = [
-            s for s in categories[category] if s['name'] != service_name
-        ]
-
-        # Remove empty categories
-        if not categories[category]:
-            del categories[category]
-
-        new_config = self.build_config(categories)
-        return self.save_config(new_config)
+        return self._apply({'op': 'delete', 'category': category, 'name': service_name})
 
+    @mutation
     def reorder_services(self, category: str, service_order: List[str]) -> bool:
         """Reorder services within a category"""
-        config = self.load_config()
-        categories = self.parse_services(config)
-
-        if category not in categories:
-            return False
-
-        # Create a mapping of service names to service data
-        service_map = {s['name']: s for s in categories[category]}
-
-        # Reorder based on the provided order
-        reordered = []
-        for service_name in service_order:
-            if service_name in service_map:
-                reordered.append(service_map[service_name])
-
-        categories[category] = reordered
-        new_config = self.build_config(categories)
-        return self.save_config(new_config)
+        return self._apply({'op': 'reorder', 'category': category, 'order': service_order})
 
+    @mutation
     def move_service(self, service_name: str, from_category: str, to_category: str) -> bool:
         """Move a service from one category to another"""
-        config = self.load_config()
-        categories = self.parse_services(config)
-
-        if from_category not in categories:
-            return False
-
-        # Find the service
-        service_data = None
-        for service in categories[from_category]:
-            if service['name'] == service_name:
-                service_data = service
-                break
-
-        if not service_data:
-            return False
-
-        # Remove from old category
-        categories[from_category] = [
-            s for s in categories[from_category] if s['name'] != service_name
-        ]
+        return self._apply({'op': 'move', 'category': from_category, 'name': service_name, 'to_category': to_category})
 
-        # Remove empty categories
-        if not categories[from_category]:
-            del categories[from_category]
-
-        # Add to new category
-        if to_category not in categories:
-            categories[to_category] = []
+    @mutation
+    def edit_service(self, category: str, service_name: str, new_category: Optional[str] = None,
+                     new_name: Optional[str] = None, service_config: Optional[Dict] = None) -> bool:
+        """Move, rename and/or reconfigure a service in one write
+        A rename keeps the existing config and merges service_config into it
+        """
+        new_category = new_category or category
+        operations = []
+
+        if new_category != category:
+            operations.append({'op': 'move', 'category': category, 'name': service_name, 'to_category': new_category})
+
+        if new_name and new_name != service_name:
+            operations.append({'op': 'rename', 'category': new_category, 'name': service_name,
+                               'new_name': new_name, 'config': service_config})
+        elif service_config is not None:
+            operations.append({'op': 'update', 'category': new_category, 'name': service_name,
+                               'config': service_config})
+
+        return self._apply(*operations)
+
+    @mutation
+    def add_category(self, category: str) -> bool:
+        """Add an empty category"""
+        return self._apply({'op': 'add_category', 'category': category})
+
+    @mutation
+    def rename_category(self, category: str, new_name: str) -> bool:
+        """Rename a category"""
+        return self._apply({'op': 'rename_category', 'category': category, 'new_name': new_name})
+
+    @mutation
+    def delete_category(self, category: str, force: bool = False) -> bool:
+        """Delete a category; non-empty categories require force"""
+        return self._apply({'op': 'delete_category', 'category': category, 'force': force})
+
+    @mutation
+    def reorder_categories(self, category_order: List[str]) -> bool:
+        """Reorder categories; categories missing from the order keep their place at the end"""
+        return self._apply({'op': 'reorder_categories', 'order': category_order})
+
+    def parse_import(self, yaml_content: Union[str, IO]) -> List[Any]:
+        """Normalize and parse an uploaded configuration, once
+        yaml_content is a string or a binary file, which is read in chunks.
+        Returns it in list format; raises ValueError if it is not valid YAML
+        or not a list/mapping of categories.
+        """
+        # Tabs become spaces and trailing whitespace goes while the parser reads
+        yaml_content = NormalizedText(yaml_content)
 
-        categories[to_category].append(service_data)
+        try:
+            config = self.parser.load(yaml_content)
+        except (yaml.YAMLError, YAMLError) as e:
+            mark = getattr(e, 'problem_mark', None)
+            if mark is not None:
+                raise ValueError(f"YAML parsing error at line {mark.line + 1}: {e}")
+            raise ValueError(f"Invalid YAML: {e}")
+
+        # Handle None or empty config
+        if not config:
+            raise ValueError("Configuration is empty")
+
+        # If config is not a list, wrap it in a list
+        if not isinstance(config, list):
+            config = [config]
+        if not all(isinstance(item, dict) for item in config):
+            raise ValueError("Configuration must be a list of categories")
+        return config
 
-        new_config = self.build_config(categories)
-        return self.save_config(new_config)
+    @mutation
+    def import_config(self, config: List[Any]) -> bool:
+        """Replace the configuration with one returned by parse_import()"""
+        return self.save_config(as_nodes(config))
 
-    def import_yaml(self, yaml_content: str) -> bool:
-        """Import configuration from YAML string"""
+    @mutation
+    def import_yaml(self, yaml_content: Union[str, IO]) -> bool:
+        """Import configuration from YAML string or binary file"""
         try:
-            # Remove document separator if present
-            if yaml_content.startswith('---'):
-                yaml_content = yaml_content[3:].strip()
-
-            # Clean up the YAML content
-            import re
-            # Remove trailing whitespace and tabs from each line
-            lines = yaml_content.split('\n')
-            cleaned_lines = []
-            for line in lines:
-                # Replace tabs with spaces and strip trailing whitespace
-                cleaned_line = line.replace('\t', '    ').rstrip()
-                cleaned_lines.append(cleaned_line)
-            yaml_content = '\n'.join(cleaned_lines)
-
-            # Parse the YAML
-            config = yaml.safe_load(yaml_content)
-
-            # Handle None or empty config
-            if not config:
-                return False
-
-            # If config is not a list, wrap it in a list
-            if not isinstance(config, list):
-                config = [config]
-
-            return self.save_config(config)
-        except Exception as e:
+            config = self.parse_import(yaml_content)
+        except ValueError as e:
             print(f"Error importing YAML: {e}")
-            import traceback
-            traceback.print_exc()
             return False
+        return self.import_config(config)
 
-    def export_yaml(self) -> str:
-        """Export configuration as YAML string"""
-        config = self.load_config()
+    def export_yaml(self, categories: Optional[List[str]] = None) -> str:
+        """Export configuration as YAML string, in list format
+        Serialized once per version of the file; categories limits it to those
+        """
+        snapshot = self._cache.get()
+        return self._exports.export(snapshot.version, snapshot.data.config, categories)
 
-        # Ensure we always export in list format for consistency
-        if isinstance(config, dict):
-            # Convert dict format to list format
-            list_config = []
-            for category_name, services in config.items():
-                list_config.append({category_name: services})
-            config = list_config
-
-        return yaml.dump(config,
-                        default_flow_style=False,
-                        allow_unicode=True,
-                        sort_keys=False,
-                        indent=2)  # Use 2-space indent for Homepage compatibility
\ No newline at end of file
+    def iter_export_yaml(self, categories: Optional[List[str]] = None) -> Iterator[str]:
+        """export_yaml() in parts, one category at a time"""
+        snapshot = self._cache.get()
+        return self._exports.iter_export(snapshot.version, snapshot.data.config, categories)
\ No newline at end of file
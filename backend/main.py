@@ -1,16 +1,24 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from pathlib import Path
 import sys
 
 # Add backend to path
 sys.path.append(str(Path(__file__).parent))
 
-from api import services, categories, import_export, preview, bookmarks, auth
+from api import services, categories, import_export, preview, bookmarks, auth, events, history, profiles
 from core.config import settings
-from core.auth import get_current_user, verify_token
+from core.auth import get_current_user, get_stream_user, verify_token
+from core.io_pool import shutdown_executor
+from core.metrics import registry
+from core.store import start_watching, stop_watching
+from utils.static_assets import FrontendAssets
+from utils.compression import CompressionMiddleware
+from utils.body_limit import BodySizeLimitMiddleware
+from utils.request_metrics import RequestMetricsMiddleware
+from utils.server_timing import ServerTimingMiddleware
 from fastapi import Depends
 
 app = FastAPI(
@@ -28,9 +36,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-static_path = Path(__file__).parent.parent / "frontend" / "static"
-app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
+# Refuse oversized imports before they are read
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_size=settings.import_max_size,
+    paths=["/api/config/import", "/api/config/validate", "/api/bookmarks/import"],
+)
+
+# gzip JSON/YAML/HTML responses. Middleware added after this one wraps it:
+# metrics and Server-Timing count the compression time and only add headers
+# that do not depend on the body. ETag and Vary are set further in (endpoints,
+# CORS), so compression sees them and suffixes/extends them.
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    level=settings.compression_level,
+    cache_entries=settings.compression_cache_entries,
+)
+
+# Request latency and in-flight counts for /metrics
+if settings.metrics_enabled:
+    app.add_middleware(RequestMetricsMiddleware)
+
+# Opt-in Server-Timing breakdown and request profiling (outermost)
+app.add_middleware(
+    ServerTimingMiddleware,
+    always=settings.server_timing,
+    sample_rate=settings.profile_sample_rate,
+)
+
+# Pages and /static files, held in memory and precompressed
+frontend_assets = FrontendAssets(
+    Path(__file__).parent.parent / "frontend",
+    {"index": "index.html", "login": "login.html"},
+    reload_interval=settings.frontend_reload_seconds,
+)
 
 # Mount images directory for custom icons
 images_path = Path("/app/public/images")
@@ -47,26 +87,53 @@ app.include_router(categories.router, prefix="/api/categories", tags=["categorie
 app.include_router(import_export.router, prefix="/api/config", tags=["config"], dependencies=[Depends(get_current_user)])
 app.include_router(preview.router, prefix="/api/preview", tags=["preview"], dependencies=[Depends(get_current_user)])
 app.include_router(bookmarks.router, prefix="/api/bookmarks", tags=["bookmarks"], dependencies=[Depends(get_current_user)])
+app.include_router(history.router, prefix="/api/history", tags=["history"], dependencies=[Depends(get_current_user)])
+app.include_router(profiles.router, prefix="/api/profiles", tags=["profiles"], dependencies=[Depends(get_current_user)])
+# Change feed: EventSource cannot set headers, so the stream also opens with ?ticket= (POST /api/events/ticket)
+app.include_router(events.router, prefix="/api/events", tags=["events"], dependencies=[Depends(get_stream_user)])
+
+@app.on_event("startup")
+async def startup():
+    """Load the frontend files and pick up edits made to the config files by Homepage or by hand"""
+    frontend_assets.refresh()
+    start_watching()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Let in-flight YAML writes finish before exiting"""
+    stop_watching()
+    shutdown_executor()
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
+async def root(request: Request):
     """Serve the main HTML page (authentication will be checked by frontend)"""
-    html_path = Path(__file__).parent.parent / "frontend" / "index.html"
-    with open(html_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+    return frontend_assets.page(request, "index")
 
 @app.get("/login", response_class=HTMLResponse)
-async def login_page():
+async def login_page(request: Request):
     """Serve the login page (no authentication required)"""
-    html_path = Path(__file__).parent.parent / "frontend" / "login.html"
-    with open(html_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+    return frontend_assets.page(request, "login")
+
+@app.get("/static/{path:path}", include_in_schema=False)
+async def static_file(request: Request, path: str):
+    """Serve CSS/JS; fingerprinted URLs from the pages are cached as immutable"""
+    response = frontend_assets.static(request, path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "service": "Homepage Config Tool"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (no authentication, like /health)"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
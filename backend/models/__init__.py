@@ -1,5 +1,6 @@
 from .service import Service, ServiceCreate, ServiceUpdate, ServiceConfig
 from .widget import Widget, WidgetConfig
+from .batch import ServiceOperation, ServiceBatch
 from .bookmark import Bookmark, BookmarkGroup, BookmarkCreate, BookmarkUpdate, BookmarkGroupCreate, BookmarkReorder, BookmarkGroupReorder
 
 __all__ = [
@@ -9,6 +10,8 @@ __all__ = [
     'ServiceConfig',
     'Widget',
     'WidgetConfig',
+    'ServiceOperation',
+    'ServiceBatch',
     'Bookmark',
     'BookmarkGroup',
     'BookmarkCreate',
@@ -0,0 +1,33 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Literal
+from .service import ServiceConfig
+
+class ServiceOperation(BaseModel):
+    """A single operation in a batch of service/category changes"""
+    op: Literal[
+        "add", "update", "delete", "move", "rename", "reorder", "hide", "health_check",
+        "add_category", "rename_category", "delete_category", "reorder_categories"
+    ] = Field(..., description="Operation to apply")
+    category: Optional[str] = Field(None, description="Category the operation applies to")
+    name: Optional[str] = Field(None, description="Service name")
+    config: Optional[ServiceConfig] = Field(None, description="Service configuration (add, update, rename)")
+    to_category: Optional[str] = Field(None, description="Destination category (move)")
+    index: Optional[int] = Field(None, description="Target position (add, move); appends when omitted")
+    new_name: Optional[str] = Field(None, description="New service or category name (rename, rename_category)")
+    order: Optional[List[str]] = Field(None, description="Ordered names (reorder, reorder_categories)")
+    value: Optional[bool] = Field(None, description="Hidden state (hide) or health check enabled (health_check)")
+    force: Optional[bool] = Field(None, description="Delete a non-empty category (delete_category)")
+
+class ServiceBatch(BaseModel):
+    """Ordered list of operations applied and saved together"""
+    operations: List[ServiceOperation] = Field(..., description="Operations, applied in order")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "operations": [
+                    {"op": "move", "category": "Media", "name": "Emby", "to_category": "Tools"},
+                    {"op": "reorder", "category": "Tools", "order": ["Emby", "FileBrowser"]}
+                ]
+            }
+        }
@@ -1,17 +1,22 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List, ClassVar
+from typing import Optional, Dict, Any, List, ClassVar, Union
+
+# YAML scalar as written in services.yaml: `key: 1234567` loads as an int
+# and Homepage takes it as it is, so settings are not limited to strings
+Scalar = Union[str, int, float, bool]
 
 class WidgetConfig(BaseModel):
     """Widget configuration model"""
     type: str = Field(..., description="Widget type")
-    url: Optional[str] = Field(None, description="Widget API URL")
-    key: Optional[str] = Field(None, description="API key")
-    username: Optional[str] = Field(None, description="Username for authentication")
-    password: Optional[str] = Field(None, description="Password for authentication")
+    url: Optional[Scalar] = Field(None, description="Widget API URL")
+    key: Optional[Scalar] = Field(None, description="API key")
+    username: Optional[Scalar] = Field(None, description="Username for authentication")
+    password: Optional[Scalar] = Field(None, description="Password for authentication")
 
     # Generic fields for various widget types
     method: Optional[str] = Field(None, description="HTTP method for custom API")
-    mappings: Optional[List[Dict[str, str]]] = Field(None, description="Field mappings for custom API")
+    # e.g. {field: ..., label: ..., format: number, scale: 1000}
+    mappings: Optional[List[Dict[str, Any]]] = Field(None, description="Field mappings for custom API")
     fields: Optional[List[str]] = Field(None, description="Fields to display")
 
     # Emby specific
@@ -19,16 +24,16 @@ class WidgetConfig(BaseModel):
     enableNowPlaying: Optional[bool] = Field(None, description="Enable now playing display")
 
     # Qbittorrent specific
-    rpcUrl: Optional[str] = Field(None, description="RPC URL")
+    rpcUrl: Optional[Scalar] = Field(None, description="RPC URL")
 
     # Tailscale specific
-    deviceid: Optional[str] = Field(None, description="Device ID")
+    deviceid: Optional[Scalar] = Field(None, description="Device ID")
 
     # Openwrt specific
-    interfaceName: Optional[str] = Field(None, description="Interface name")
+    interfaceName: Optional[Scalar] = Field(None, description="Interface name")
 
     # DiskStation specific
-    volume: Optional[str] = Field(None, description="Volume name")
+    volume: Optional[Scalar] = Field(None, description="Volume name")
 
     # Other widget-specific fields can be added here
 
@@ -65,6 +70,38 @@ class Widget(BaseModel):
         "xteve"
     ]
 
+    # Fields each widget type needs, and the optional ones it understands
+    WIDGET_SCHEMAS: ClassVar[Dict[str, Dict[str, List[str]]]] = {
+        "emby": {
+            "required": ["url", "key"],
+            "optional": ["enableBlocks", "enableNowPlaying"]
+        },
+        "qbittorrent": {
+            "required": ["url", "username", "password"],
+            "optional": ["rpcUrl"]
+        },
+        "customapi": {
+            "required": ["url", "method"],
+            "optional": ["mappings"]
+        },
+        "homeassistant": {
+            "required": ["url", "key"],
+            "optional": ["fields"]
+        },
+        "diskstation": {
+            "required": ["url", "username", "password"],
+            "optional": ["volume"]
+        },
+        "tailscale": {
+            "required": ["deviceid", "key"],
+            "optional": []
+        },
+        "openwrt": {
+            "required": ["url", "username", "password"],
+            "optional": ["interfaceName"]
+        }
+    }
+
     type: str = Field(..., description="Widget type")
     config: WidgetConfig = Field(..., description="Widget configuration")
 
@@ -76,34 +113,4 @@ class Widget(BaseModel):
     @classmethod
     def get_widget_schema(cls, widget_type: str) -> Dict[str, Any]:
         """Get schema for a specific widget type"""
-        schemas = {
-            "emby": {
-                "required": ["url", "key"],
-                "optional": ["enableBlocks", "enableNowPlaying"]
-            },
-            "qbittorrent": {
-                "required": ["url", "username", "password"],
-                "optional": ["rpcUrl"]
-            },
-            "customapi": {
-                "required": ["url", "method"],
-                "optional": ["mappings"]
-            },
-            "homeassistant": {
-                "required": ["url", "key"],
-                "optional": ["fields"]
-            },
-            "diskstation": {
-                "required": ["url", "username", "password"],
-                "optional": ["volume"]
-            },
-            "tailscale": {
-                "required": ["deviceid", "key"],
-                "optional": []
-            },
-            "openwrt": {
-                "required": ["url", "username", "password"],
-                "optional": ["interfaceName"]
-            }
-        }
-        return schemas.get(widget_type, {"required": [], "optional": []})
\ No newline at end of file
+        return cls.WIDGET_SCHEMAS.get(widget_type, {"required": [], "optional": []})
\ No newline at end of file
@@ -0,0 +1,60 @@
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Room for the multipart boundaries and part headers around an uploaded file
+FORM_OVERHEAD = 64 * 1024
+
+
+def too_large(max_size: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {max_size} byte limit")
+
+
+def check_upload_size(file: UploadFile, max_size: int):
+    """Reject an uploaded file over max_size bytes with 413"""
+    if file.size is not None and file.size > max_size:
+        raise too_large(max_size)
+
+
+class BodySizeLimitMiddleware:
+    """413 for uploads over max_size bytes on the given paths
+
+    A declared Content-Length is checked before anything is read; a body
+    sent without one is counted as it streams in, so an oversized upload
+    is cut off before it is spooled in full. The form around the file may
+    add FORM_OVERHEAD bytes; check_upload_size() applies the exact limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_size: int, paths: Iterable[str]):
+        self.app = app
+        self.max_size = max_size
+        self.max_body = max_size + FORM_OVERHEAD
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        length: Optional[str] = Headers(scope=scope).get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_body:
+            response = JSONResponse({"detail": too_large(self.max_size).detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # Raised inside the form parser; the app turns it into the 413 response
+                    raise too_large(self.max_size)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,204 @@
+import gzip
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.io_pool import run_blocking
+
+# Content types worth compressing; event streams, images and archives are not
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-yaml",
+    "application/yaml",
+    "text/yaml",
+    "text/html",
+    "text/plain",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "application/xml",
+    "text/xml",
+    "image/svg+xml",
+)
+
+# Added to the ETag of gzipped bodies: a different byte sequence needs a
+# different entity tag, or caches could hand gzip to clients that lack it
+ETAG_SUFFIX = ".gz"
+
+# Bodies this large are compressed on the I/O pool instead of the event loop
+OFFLOAD_SIZE = 64 * 1024
+
+
+def _accepts_gzip(headers: Headers) -> bool:
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*") and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return True
+    return False
+
+
+def _with_suffix(etag: str) -> str:
+    return etag[:-1] + ETAG_SUFFIX + '"' if etag.endswith('"') else etag
+
+
+def _strip_suffixes(header: str) -> Tuple[str, bool]:
+    """If-None-Match with our suffix removed, and whether there was one"""
+    tags = []
+    stripped = False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.endswith(ETAG_SUFFIX + '"'):
+            tag = tag[:-len(ETAG_SUFFIX) - 1] + '"'
+            stripped = True
+        tags.append(tag)
+    return ", ".join(tags), stripped
+
+
+class CompressionMiddleware:
+    """gzip responses of the JSON/YAML/HTML endpoints
+
+    Plain ASGI, so streamed responses are compressed chunk by chunk (each
+    chunk flushed, so the client can render it) rather than buffered.
+    Responses are left alone if they are small, not in the type allowlist
+    (event streams are not) or already carry a Content-Encoding (the
+    precompressed static files). Compressed bytes of responses with a
+    strong ETag, i.e. versioned config data, are kept in a small LRU.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, level: int = 6,
+                 cache_entries: int = 32, media_types: Iterable[str] = COMPRESSIBLE_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+        self.cache_entries = cache_entries
+        self.media_types = frozenset(media_types)
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not _accepts_gzip(headers):
+            await self.app(scope, receive, send)
+            return
+
+        # Endpoints compare If-None-Match against their plain ETags
+        had_suffix = False
+        if "if-none-match" in headers:
+            scope = dict(scope)
+            raw = []
+            for name, value in scope["headers"]:
+                if name == b"if-none-match":
+                    stripped, had_suffix = _strip_suffixes(value.decode("latin-1"))
+                    value = stripped.encode("latin-1")
+                raw.append((name, value))
+            scope["headers"] = raw
+
+        responder = _GzipResponder(self, send, had_suffix)
+        await self.app(scope, receive, responder.send)
+
+    def compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        media_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return media_type in self.media_types
+
+    async def compress(self, body: bytes, etag: Optional[str]) -> bytes:
+        cacheable = self.cache_entries > 0 and etag is not None and not etag.startswith("W/")
+        if cacheable and etag in self._cache:
+            self._cache.move_to_end(etag)
+            return self._cache[etag]
+
+        if len(body) >= OFFLOAD_SIZE:
+            data = await run_blocking(gzip.compress, body, self.level, mtime=0)
+        else:
+            data = gzip.compress(body, self.level, mtime=0)
+
+        if cacheable:
+            self._cache[etag] = data
+            if len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return data
+
+
+class _GzipResponder:
+    """Wraps send() for one response and decides on its first body message"""
+
+    def __init__(self, middleware: CompressionMiddleware, send: Send, had_suffix: bool):
+        self.middleware = middleware
+        self._send = send
+        self.had_suffix = had_suffix
+        self.start: Optional[Message] = None
+        self.mode = "undecided"
+        self.compressor = None
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        if self.mode == "undecided":
+            await self._first_body(message)
+        elif self.mode == "stream":
+            await self._send_chunk(message)
+        else:
+            await self._send(message)
+
+    async def _first_body(self, message: Message):
+        headers = MutableHeaders(scope=self.start)
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        status = self.start["status"]
+
+        if status == 304:
+            # Confirm the tag the client holds, which was the gzip one
+            if self.had_suffix and "etag" in headers:
+                headers["ETag"] = _with_suffix(headers["etag"])
+            return await self._pass(message)
+
+        if status < 200 or status in (204, 206) or not self.middleware.compressible(headers):
+            return await self._pass(message)
+        headers.add_vary_header("Accept-Encoding")
+
+        if not more_body:
+            if len(body) < self.middleware.minimum_size:
+                return await self._pass(message)
+            data = await self.middleware.compress(body, headers.get("etag"))
+            if len(data) >= len(body):
+                return await self._pass(message)
+            self._mark_encoded(headers)
+            headers["Content-Length"] = str(len(data))
+            await self._send(self.start)
+            await self._send({"type": "http.response.body", "body": data})
+            self.mode = "done"
+            return
+
+        self._mark_encoded(headers)
+        if "content-length" in headers:
+            del headers["content-length"]
+        self.compressor = zlib.compressobj(self.middleware.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.mode = "stream"
+        await self._send(self.start)
+        await self._send_chunk(message)
+
+    def _mark_encoded(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = "gzip"
+        if "etag" in headers:
+            headers["ETag"] = _with_suffix(headers["etag"])
+
+    async def _pass(self, message: Message):
+        self.mode = "pass"
+        await self._send(self.start)
+        await self._send(message)
+
+    async def _send_chunk(self, message: Message):
+        more_body = message.get("more_body", False)
+        data = self.compressor.compress(message.get("body", b""))
+        data += self.compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
@@ -0,0 +1,34 @@
+from typing import Dict
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def make_etag(resource: str, version: str) -> str:
+    """Strong ETag for one representation of a config file version"""
+    return f'"{resource}-{version}"'
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    """Headers that let browsers keep a copy but revalidate it on every use"""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check If-None-Match against an ETag (weak comparison, as for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
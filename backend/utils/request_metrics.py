@@ -0,0 +1,68 @@
+import time
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.metrics import Counter, Gauge, Histogram, registry
+
+# Label of requests that match no route, so scans cannot add label values
+UNMATCHED = "<unmatched>"
+
+request_duration = registry.register(Histogram(
+    "homepage_config_http_request_duration_seconds",
+    "Time from receiving a request to sending the end of its response",
+    ("method", "route"),
+))
+requests_total = registry.register(Counter(
+    "homepage_config_http_requests",
+    "Responses sent, by status code",
+    ("method", "route", "status"),
+))
+requests_in_progress = registry.register(Gauge(
+    "homepage_config_http_requests_in_progress",
+    "Requests being handled (including open event streams)",
+    ("method", "route"),
+))
+
+
+def route_label(scope: Scope) -> str:
+    """Path template of the route a request goes to (e.g. /api/services/{category}/{service_name})"""
+    partial = None
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or UNMATCHED
+
+
+class RequestMetricsMiddleware:
+    """Per-route latency histograms, response counts and in-flight gauges"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_label(scope)
+        status = "500"
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        start = time.perf_counter()
+        requests_in_progress.inc(method, route)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            requests_in_progress.dec(method, route)
+            request_duration.observe(time.perf_counter() - start, method, route)
+            requests_total.inc(method, route, status)
@@ -0,0 +1,100 @@
+import random
+import time
+from typing import Dict
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.auth import user_from_token
+from core.profiling import RequestProfile, profile_store, request_phases, request_profiler
+
+TIMING_HEADER = b"x-server-timing"
+PROFILE_HEADER = b"x-profile"
+
+
+def format_server_timing(phases: Dict[str, float], total: float) -> str:
+    """Server-Timing header value, durations in milliseconds"""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _authenticated(scope: Scope) -> bool:
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user_from_token(token)
+        return True
+    except HTTPException:
+        return False
+
+
+class ServerTimingMiddleware:
+    """Opt-in phase breakdown (Server-Timing header) and cProfile capture
+
+    Timing is on for every response with SERVER_TIMING, otherwise for
+    authenticated requests sent with "X-Server-Timing: 1". "X-Profile: 1"
+    (or PROFILE_SAMPLE_RATE) also profiles the request's work on the I/O
+    pool, where parsing, serialization and file I/O run; the profile's id
+    is returned in X-Profile-Id. Requests that ask for neither pass through
+    after a scan of their header names.
+    """
+
+    def __init__(self, app: ASGIApp, always: bool = False, sample_rate: float = 0.0):
+        self.app = app
+        self.always = always
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        asked = {name for name, value in scope["headers"]
+                 if name in (TIMING_HEADER, PROFILE_HEADER) and value.strip() not in (b"", b"0")}
+        if asked and not _authenticated(scope):
+            asked = set()
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not asked and not sampled and not self.always:
+            await self.app(scope, receive, send)
+            return
+
+        timing = self.always or TIMING_HEADER in asked
+        profiler = RequestProfile() if sampled or PROFILE_HEADER in asked else None
+        phases: Dict[str, float] = {}
+        phases_token = request_phases.set(phases)
+        profiler_token = request_profiler.set(profiler)
+        start = time.perf_counter()
+        status = 500
+        profile_id = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                if timing:
+                    headers.append("Server-Timing", format_server_timing(phases, time.perf_counter() - start))
+                if profiler is not None:
+                    headers.append("X-Profile-Id", str(profile_id))
+            await send(message)
+
+        if profiler is not None:
+            # Reserved up front so the id can be sent with the headers
+            profile_id = profile_store.reserve()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_phases.reset(phases_token)
+            request_profiler.reset(profiler_token)
+            if profiler is not None:
+                profile_store.add(profile_id, profiler, {
+                    "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in phases.items()},
+                })
@@ -0,0 +1,184 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from utils.http_cache import etag_matches
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Smaller files are not worth a Content-Encoding
+MIN_COMPRESS_SIZE = 512
+
+# "/static/js/main.js" in src/href attributes of the pages
+_STATIC_URL = re.compile(r'(["\'])/static/([^"\'?#]+)')
+
+
+class Asset(NamedTuple):
+    """A file's bytes, precompressed variants and content hash"""
+    body: bytes
+    encoded: Dict[str, bytes]
+    digest: str
+    media_type: str
+    mtime_ns: int
+
+
+def build_asset(body: bytes, media_type: str, mtime_ns: int = 0) -> Asset:
+    encoded = {}
+    if len(body) >= MIN_COMPRESS_SIZE:
+        variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(body, quality=11)
+        encoded = {name: data for name, data in variants.items() if len(data) < len(body)}
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    return Asset(body, encoded, digest, media_type, mtime_ns)
+
+
+def accepted_encoding(request: Request, available) -> Optional[str]:
+    """Best of br/gzip that the client accepts and we have, or None for identity"""
+    header = request.headers.get("accept-encoding", "")
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    for name in ("br", "gzip"):
+        if name in available and (name in accepted or "*" in accepted):
+            return name
+    return None
+
+
+def asset_response(request: Request, asset: Asset, cache_control: str) -> Response:
+    """Serve an asset in the best accepted encoding, or 304 if the client has it
+
+    Each encoding has its own ETag, since the bytes differ.
+    """
+    encoding = accepted_encoding(request, asset.encoded)
+    etag = f'"{asset.digest}-{encoding}"' if encoding else f'"{asset.digest}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(content=asset.encoded[encoding], media_type=asset.media_type, headers=headers)
+    return Response(content=asset.body, media_type=asset.media_type, headers=headers)
+
+
+def _fingerprinted(path: str, digest: str) -> str:
+    stem, dot, suffix = path.rpartition(".")
+    if not dot or "/" in suffix:
+        return f"{path}.{digest[:10]}"
+    return f"{stem}.{digest[:10]}.{suffix}"
+
+
+class FrontendAssets:
+    """index.html, login.html and /static files, held in memory
+
+    Files are read and compressed once, by refresh() at startup. With a
+    reload interval (for frontend development) a page request rescans the
+    files at most that often, reloading what changed; otherwise requests
+    never touch the disk. Pages reference
+    assets by content-fingerprinted URLs (style.<hash>.css), which are
+    served as immutable; the pages themselves are revalidated by ETag.
+    """
+
+    def __init__(self, frontend_dir: Path, pages: Dict[str, str], reload_interval: float = 0):
+        self.frontend_dir = Path(frontend_dir)
+        self.static_dir = self.frontend_dir / "static"
+        # {page name: file name}
+        self.page_files = pages
+        self._lock = threading.Lock()
+        # {path under /static: Asset}
+        self._assets: Dict[str, Asset] = {}
+        # {fingerprinted path: path}
+        self._fingerprints: Dict[str, str] = {}
+        self._sources: Dict[str, Asset] = {}
+        self._pages: Dict[str, Asset] = {}
+        self.reload_interval = reload_interval
+        self._next_reload = 0.0
+
+    def refresh(self):
+        """Reload files whose mtime changed; re-render pages if anything did"""
+        with self._lock:
+            changed = self._refresh_assets()
+            for name, file_name in self.page_files.items():
+                path = self.frontend_dir / file_name
+                mtime_ns = path.stat().st_mtime_ns
+                source = self._sources.get(name)
+                if source is None or source.mtime_ns != mtime_ns:
+                    self._sources[name] = Asset(path.read_bytes(), {}, "", "text/html", mtime_ns)
+                    changed = True
+            if changed or not self._pages:
+                self._pages = {name: self._render_page(source) for name, source in self._sources.items()}
+
+    def _refresh_assets(self) -> bool:
+        changed = False
+        seen = set()
+        for root, _, files in os.walk(self.static_dir):
+            for file_name in files:
+                path = Path(root) / file_name
+                relative = path.relative_to(self.static_dir).as_posix()
+                seen.add(relative)
+                mtime_ns = path.stat().st_mtime_ns
+                asset = self._assets.get(relative)
+                if asset is not None and asset.mtime_ns == mtime_ns:
+                    continue
+                media_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+                self._assets[relative] = build_asset(path.read_bytes(), media_type, mtime_ns)
+                changed = True
+        for relative in set(self._assets) - seen:
+            del self._assets[relative]
+            changed = True
+        if changed:
+            self._fingerprints = {
+                _fingerprinted(relative, asset.digest): relative
+                for relative, asset in self._assets.items()
+            }
+        return changed
+
+    def _render_page(self, source: Asset) -> Asset:
+        def fingerprint(match: re.Match) -> str:
+            quote, relative = match.groups()
+            asset = self._assets.get(relative)
+            if asset is None:
+                return match.group(0)
+            return f"{quote}/static/{_fingerprinted(relative, asset.digest)}"
+
+        html = _STATIC_URL.sub(fingerprint, source.body.decode("utf-8"))
+        return build_asset(html.encode("utf-8"), "text/html", source.mtime_ns)
+
+    def page(self, request: Request, name: str) -> Response:
+        if not self._pages:
+            self.refresh()
+        elif self.reload_interval > 0 and time.monotonic() >= self._next_reload:
+            self._next_reload = time.monotonic() + self.reload_interval
+            self.refresh()
+        return asset_response(request, self._pages[name], REVALIDATE)
+
+    def static(self, request: Request, path: str) -> Optional[Response]:
+        """A /static file: immutable by fingerprinted path, revalidated by plain path"""
+        if not self._assets:
+            self.refresh()
+        relative = self._fingerprints.get(path)
+        if relative is not None:
+            return asset_response(request, self._assets[relative], IMMUTABLE)
+        asset = self._assets.get(path)
+        if asset is not None:
+            return asset_response(request, asset, REVALIDATE)
+        return None
@@ -1,27 +1,34 @@
 // Bookmarks management functionality
 
+// Groups as last loaded ([{name, bookmarks}]), null until the tab is first shown
+let currentBookmarks = null;
+
 // Load and display bookmarks
 async function loadBookmarks() {
     try {
         const response = await axios.get('/api/bookmarks/');
-        const groups = response.data;
-
-        const container = document.getElementById('bookmarksContainer');
-        container.innerHTML = '';
-
-        groups.forEach(group => {
-            const groupCard = createBookmarkGroupCard(group);
-            container.appendChild(groupCard);
-        });
-
-        // Setup drag and drop for bookmarks
-        setupBookmarksDragDrop();
+        currentBookmarks = response.data;
+        renderBookmarks();
     } catch (error) {
         console.error('Error loading bookmarks:', error);
         showToast('Failed to load bookmarks', 'error');
     }
 }
 
+// Display currentBookmarks
+function renderBookmarks() {
+    const container = document.getElementById('bookmarksContainer');
+    container.innerHTML = '';
+
+    currentBookmarks.forEach(group => {
+        const groupCard = createBookmarkGroupCard(group);
+        container.appendChild(groupCard);
+    });
+
+    // Setup drag and drop for bookmarks
+    setupBookmarksDragDrop();
+}
+
 // Create bookmark group card
 function createBookmarkGroupCard(group) {
     const card = document.createElement('div');
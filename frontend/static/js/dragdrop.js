@@ -96,11 +96,27 @@ async function handleServiceMove(evt) {
     // Skip if same category
     if (fromCategory === toCategory) return;
 
+    // New order of the destination category, including the dropped service
+    const serviceOrder = Array.from(evt.to.children)
+        .filter(el => el.classList.contains('service-item'))
+        .map(el => el.dataset.service);
+
     try {
-        await axios.post('/api/services/move', {
-            service_name: serviceName,
-            from_category: fromCategory,
-            to_category: toCategory
+        // Move and reorder in a single request (one save on the server)
+        await axios.post('/api/services/batch', {
+            operations: [
+                {
+                    op: 'move',
+                    category: fromCategory,
+                    name: serviceName,
+                    to_category: toCategory
+                },
+                {
+                    op: 'reorder',
+                    category: toCategory,
+                    order: serviceOrder
+                }
+            ]
         });
 
         // Update the data attributes
@@ -108,16 +124,6 @@ async function handleServiceMove(evt) {
 
         showToast(`Moved "${serviceName}" to "${toCategory}"`, 'success');
         refreshPreview();
-
-        // Trigger reorder for the destination category
-        const serviceOrder = Array.from(evt.to.children)
-            .filter(el => el.classList.contains('service-item'))
-            .map(el => el.dataset.service);
-
-        await axios.post('/api/services/reorder', {
-            category: toCategory,
-            service_order: serviceOrder
-        });
     } catch (error) {
         console.error('Error moving service:', error);
         showToast('Failed to move service', 'error');
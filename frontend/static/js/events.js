@@ -0,0 +1,123 @@
+// Live updates from the /api/events change feed
+
+let changeFeed = null;
+let lastEventId = null;
+const pendingReloads = new Set();
+let reloadTimer = null;
+
+// How long to wait before opening a new stream after one was refused or closed (ms)
+const RECONNECT_DELAY = 5000;
+
+// Open the change feed. EventSource cannot send headers, so it is opened with
+// a short-lived ticket rather than the access token.
+async function connectChangeFeed() {
+    if (!getToken() || typeof EventSource === 'undefined' || changeFeed) {
+        return;
+    }
+
+    let ticket;
+    try {
+        const response = await axios.post('/api/events/ticket');
+        ticket = response.data.ticket;
+    } catch (error) {
+        console.error('Failed to open the change feed:', error);
+        return;
+    }
+
+    const params = new URLSearchParams({ ticket });
+    if (lastEventId) {
+        // Replay what was missed while disconnected
+        params.set('last_event_id', lastEventId);
+    }
+    changeFeed = new EventSource(`/api/events?${params}`);
+    changeFeed.addEventListener('change', (event) => {
+        lastEventId = event.lastEventId || lastEventId;
+        applyChange(JSON.parse(event.data));
+    });
+    changeFeed.addEventListener('error', () => {
+        // The browser reconnects by itself with the same URL, until the ticket
+        // has expired; then the stream is closed and needs a new ticket
+        if (changeFeed && changeFeed.readyState === EventSource.CLOSED) {
+            changeFeed = null;
+            setTimeout(connectChangeFeed, RECONNECT_DELAY);
+        }
+    });
+}
+
+// Apply a change event to the lists shown, or reload them if it does not carry their contents
+function applyChange(change) {
+    if (change.source === 'services' && change.groups && change.order) {
+        const categories = applyGroups(currentConfig, change);
+        if (categories) {
+            currentConfig = categories;
+            renderCategories();
+            if (typeof setupDragDrop === 'function') {
+                setupDragDrop();
+            }
+            return;
+        }
+    }
+
+    if (change.source === 'bookmarks' && change.groups && change.order) {
+        if (currentBookmarks === null) {
+            return;  // Loaded when the tab is first shown
+        }
+        const byName = Object.fromEntries(currentBookmarks.map(group => [group.name, group.bookmarks]));
+        const groups = applyGroups(byName, change, bookmarks => bookmarks.map(
+            bookmark => ({ name: bookmark.name, ...(bookmark.config || {}) })));
+        if (groups) {
+            currentBookmarks = Object.entries(groups).map(([name, bookmarks]) => ({ name, bookmarks }));
+            renderBookmarks();
+            return;
+        }
+    }
+
+    if (change.source === 'services' || change.source === '*') {
+        pendingReloads.add('services');
+    }
+    if (change.source === 'bookmarks' || change.source === '*') {
+        pendingReloads.add('bookmarks');
+    }
+    scheduleReload();
+}
+
+// New {name: items} from the current one and an event's changed groups and order;
+// null if the event does not line up with what is shown (then the list is reloaded)
+function applyGroups(current, change, convert = items => items) {
+    const merged = { ...current };
+    for (const [name, items] of Object.entries(change.groups)) {
+        if (items === null) {
+            delete merged[name];
+        } else {
+            merged[name] = convert(items);
+        }
+    }
+
+    if (change.order.length !== Object.keys(merged).length) {
+        return null;
+    }
+    const ordered = {};
+    for (const name of change.order) {
+        if (!(name in merged)) {
+            return null;
+        }
+        ordered[name] = merged[name];
+    }
+    return ordered;
+}
+
+// Reload once per burst of changes; unchanged lists come back as 304 from the browser cache
+function scheduleReload() {
+    clearTimeout(reloadTimer);
+    reloadTimer = setTimeout(() => {
+        if (pendingReloads.has('services') && typeof loadConfiguration === 'function') {
+            loadConfiguration();
+        }
+        if (pendingReloads.has('bookmarks') && typeof loadBookmarks === 'function' && currentBookmarks !== null) {
+            loadBookmarks();
+        }
+        pendingReloads.clear();
+    }, 300);
+}
+
+document.addEventListener('DOMContentLoaded', connectChangeFeed);
@@ -242,7 +242,11 @@ async function performImport() {
         });
 
         const data = response.data;
-        const message = `Configuration imported successfully! ${data.categories} categories, ${data.services} services`;
+        let message = `Configuration imported successfully! ${data.categories} categories, ${data.services} services`;
+        if (data.warnings && data.warnings.length) {
+            message += ` (${data.warnings.length} warnings)`;
+            console.warn('Import warnings:', data.warnings);
+        }
         showToast(message, 'success');
         bootstrap.Modal.getInstance(document.getElementById('importModal')).hide();
         loadConfiguration();
@@ -257,8 +261,25 @@ async function performImport() {
 }
 
 // Export configuration
-function exportConfig() {
-    window.location.href = '/api/config/export';
+async function exportConfig() {
+    // Fetched with axios so the request carries the auth header
+    try {
+        const response = await axios.get('/api/config/export', {
+            responseType: 'blob'
+        });
+        const blob = new Blob([response.data], { type: 'application/x-yaml' });
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = 'services.yaml';
+        document.body.appendChild(a);
+        a.click();
+        window.URL.revokeObjectURL(url);
+        document.body.removeChild(a);
+    } catch (error) {
+        console.error('Error exporting configuration:', error);
+        showToast('Failed to export configuration', 'error');
+    }
 }
 
 // Show toast notification
@@ -0,0 +1,30 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+SERVICES = "".join(
+    f"- Category {i}:\n" + "".join(f"  - Service {i}-{j}:\n      href: http://host-{i}-{j}.lan:8080\n" for j in range(10))
+    for i in range(5)
+)
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("app")
+    (directory / "config").mkdir()
+    (directory / "config" / "services.yaml").write_text(SERVICES)
+    return directory
+
+
+@pytest.fixture(scope="session")
+def client(app_dir):
+    """The app, logged in, with its config files in a temporary directory"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # Config paths are relative to the working directory
+        monkeypatch.chdir(app_dir)
+        main = importlib.import_module("main")
+        client = TestClient(main.app)
+        token = client.post("/api/auth/login", json={"username": "admin", "password": "admin"}).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from core.auth import create_access_token, revoke_token, user_from_token
+from core.config import settings
+
+
+def test_token_without_exp_is_refused():
+    token = jwt.encode({"sub": "admin"}, settings.session_secret, algorithm="HS256")
+    with pytest.raises(HTTPException) as raised:
+        user_from_token(token)
+    assert raised.value.status_code == 401
+    # Nothing to revoke, but logging it out is not an error
+    revoke_token(token)
+
+
+def test_revoked_token_is_refused():
+    # Not the token the client fixture logged in with, which may have been issued this second
+    token = create_access_token({"sub": "admin"}, timedelta(minutes=5))
+    assert user_from_token(token) == {"username": "admin"}
+    revoke_token(token)
+    with pytest.raises(HTTPException):
+        user_from_token(token)
+
+
+def test_logout(client):
+    token = create_access_token({"sub": "admin"}, timedelta(minutes=10))
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/verify", headers=headers).status_code == 200
+    assert client.post("/api/auth/logout", headers=headers).status_code == 200
+    assert client.get("/api/auth/verify", headers=headers).status_code == 401
+
+    no_exp = jwt.encode({"sub": "admin"}, settings.session_secret, algorithm="HS256")
+    assert client.get("/api/auth/verify", headers={"Authorization": f"Bearer {no_exp}"}).status_code == 401
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from core.auth import create_access_token, get_stream_user
+from core.events import EventBus
+from core.yaml_handler import YAMLHandler
+
+
+def stream_user(query: str) -> dict:
+    request = Request({"type": "http", "query_string": query.encode(), "headers": []})
+    return asyncio.run(get_stream_user(request, None))
+
+
+def test_ticket_opens_only_the_stream(client):
+    ticket = client.post("/api/events/ticket").json()["ticket"]
+    assert stream_user(f"ticket={ticket}") == {"username": "admin"}
+
+    # Access tokens no longer go in the URL
+    token = create_access_token({"sub": "admin"})
+    for query in (f"token={token}", f"ticket={token}", ""):
+        with pytest.raises(HTTPException):
+            stream_user(query)
+
+    # A ticket is not an access token, so it cannot get itself renewed either
+    assert client.get("/api/auth/verify", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+    assert client.post("/api/events/ticket", headers={"Authorization": f"Bearer {ticket}"}).status_code == 401
+
+
+def changes(tmp_path, *mutations):
+    """Events published for mutations of a services.yaml, while a client is subscribed"""
+    path = tmp_path / "services.yaml"
+    path.write_text("- Media:\n  - Emby:\n      href: http://emby\n- Tools:\n  - Git:\n      href: http://git\n")
+    handler = YAMLHandler(str(path))
+    bus = EventBus()
+    bus.add_source("services", handler, lambda data: data.categories)
+
+    async def run():
+        subscription = bus.subscribe()
+        events = []
+        for name, *args in mutations:
+            assert getattr(handler, name)(*args)
+            events.append(await subscription.next(timeout=1))
+        return events
+
+    return asyncio.run(run())
+
+
+def test_events_carry_the_changed_categories(tmp_path):
+    moved, renamed, added, reordered, restored = changes(
+        tmp_path,
+        ("move_service", "Emby", "Media", "Tools"),
+        ("rename_category", "Tools", "Apps"),
+        ("add_category", "Media"),
+        ("reorder_categories", ["Media", "Apps"]),
+        ("restore", b"- Other: []\n"),
+    )
+    # Moving its last service out removes Media
+    assert moved["groups"] == {"Media": None, "Tools": [
+        {"name": "Git", "config": {"href": "http://git"}}, {"name": "Emby", "config": {"href": "http://emby"}}]}
+    assert moved["order"] == ["Tools"]
+    assert renamed["groups"]["Tools"] is None and len(renamed["groups"]["Apps"]) == 2
+    assert renamed["order"] == ["Apps"]
+    assert added["groups"] == {"Media": []} and added["order"] == ["Apps", "Media"]
+    assert reordered["groups"] == {} and reordered["order"] == ["Media", "Apps"]
+    # Could have changed anything: clients reload
+    assert "groups" not in restored and "order" not in restored
@@ -0,0 +1,88 @@
+from conftest import SERVICES
+from core.config import settings
+
+
+def upload(client, text):
+    return client.post("/api/config/import", files={"file": ("services.yaml", text.encode(), "application/x-yaml")})
+
+
+def test_import_rejects_what_validate_reports(client, app_dir):
+    text = "- Media:\n  - Emby:\n      href: http://emby\n  - Emby:\n      href: http://other\n"
+    validation = client.post("/api/config/validate", content=text).json()
+    assert not validation["valid"]
+
+    response = upload(client, text)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid configuration: Duplicate service 'Emby' in category 'Media' (Media > Emby)"
+    assert validation["errors"][0]["message"].startswith("Duplicate service 'Emby' in category 'Media'")
+    assert (app_dir / "config" / "services.yaml").read_text() == SERVICES
+
+
+def test_import_with_warnings_only(client, app_dir):
+    text = SERVICES + "- Empty:\n"
+    assert client.post("/api/config/validate", content=text).json()["warnings"]
+
+    response = upload(client, text)
+    assert response.status_code == 200
+    assert response.json()["categories"] == 5
+    assert response.json()["services"] == 50
+
+    assert upload(client, SERVICES).status_code == 200
+
+
+def test_widget_settings_are_not_limited_to_strings(client, app_dir):
+    text = SERVICES + (
+        "- Widgets:\n"
+        "  - Jellyfin:\n"
+        "      widget:\n"
+        "        type: emby\n"
+        "        url: http://jellyfin\n"
+        "        key: 1234567\n"
+        "  - Power:\n"
+        "      widget:\n"
+        "        type: customapi\n"
+        "        url: http://power/api\n"
+        "        mappings:\n"
+        "          - field: watts\n"
+        "            label: Power\n"
+        "            format: number\n"
+        "            scale: 1000\n"
+    )
+    validation = client.post("/api/config/validate", content=text).json()
+    assert validation["valid"], validation["errors"]
+    assert [warning["message"] for warning in validation["warnings"]] == \
+        ["widget.method: recommended for customapi widgets"]
+
+    response = upload(client, text)
+    assert response.status_code == 200
+    assert response.json()["services"] == 52
+    assert [warning["message"] for warning in response.json()["warnings"]] == \
+        ["widget.method: recommended for customapi widgets"]
+
+    assert upload(client, SERVICES).status_code == 200
+
+
+def test_import_reports_model_mismatches_as_warnings(client, app_dir):
+    text = SERVICES + "- Extra:\n  - Odd:\n      hidden: sometimes\n      widget:\n        url: http://odd\n"
+    validation = client.post("/api/config/validate", content=text).json()
+    assert not validation["valid"]
+
+    response = upload(client, text)
+    assert response.status_code == 200
+    assert [warning["message"] for warning in response.json()["warnings"]] == \
+        [error["message"] for error in validation["errors"]]
+    assert {warning["path"] for warning in response.json()["warnings"]} == \
+        {"Extra > Odd > hidden", "Extra > Odd > widget > type"}
+
+    assert upload(client, "- Media: http://emby\n").status_code == 400
+    assert upload(client, SERVICES).status_code == 200
+
+
+def test_validate_reads_the_body_within_the_import_limit(client, app_dir):
+    text = "- Media:\n  - Emby:\n      href: http://emby\n"
+    assert client.post("/api/config/validate", content=text).json()["valid"]
+    assert client.post("/api/config/validate", params={"yaml_content": text}).json()["valid"]
+
+    oversized = text + "#" * (settings.import_max_size - len(text) + 1)
+    response = client.post("/api/config/validate", content=oversized)
+    assert response.status_code == 413
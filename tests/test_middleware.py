@@ -0,0 +1,29 @@
+def test_gzip_response_keeps_validators_and_outer_headers(client):
+    # With a cookie, CORS echoes the origin and varies on it
+    client.cookies.set("session", "1")
+    response = client.get("/api/services", headers={
+        "Accept-Encoding": "gzip", "X-Server-Timing": "1", "Origin": "http://dashboard"})
+    client.cookies.clear()
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    etag = response.headers["etag"]
+    assert etag.endswith('.gz"')
+    # Vary from CORS (inner) and from compression, merged
+    assert {v.strip() for v in response.headers["vary"].split(",")} == {"Origin", "Accept-Encoding"}
+    # Added outside compression, to the compressed response
+    assert "total;dur=" in response.headers["server-timing"]
+
+    revalidated = client.get("/api/services", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == etag
+
+
+def test_identity_response_keeps_plain_etag(client):
+    response = client.get("/api/services", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    plain = response.headers["etag"]
+    assert not plain.endswith('.gz"')
+
+    gzipped = client.get("/api/services", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["etag"] != plain
+    assert client.get("/api/services", headers={"If-None-Match": plain}).status_code == 304
@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+from core.io_pool import run_blocking
+from core.profiling import ProfileStore, RequestProfile, request_profiler
+
+
+def busy(seconds: float) -> int:
+    total = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def test_concurrent_calls_of_a_request_are_merged():
+    profile = RequestProfile()
+
+    async def request():
+        request_profiler.set(profile)
+        await asyncio.gather(*(run_blocking(busy, 0.05) for _ in range(4)))
+
+    asyncio.run(request())
+    calls = {func[2]: stats[1] for func, stats in profile.stats.items()}
+    assert calls["busy"] == 4
+
+    store = ProfileStore()
+    store.add(store.reserve(), profile, {"path": "/"})
+    entry = store.list()[0]
+    assert "busy" in store.report(store.get(entry["id"]))
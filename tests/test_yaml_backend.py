@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from core.yaml_backend import HAS_LIBYAML
+from core.yaml_handler import YAMLHandler
+
+PARSERS = ["ruamel", "pyyaml"] + (["libyaml"] if HAS_LIBYAML else [])
+
+FIXTURES = {
+    "booleans": """\
+- Media:
+  - Emby:
+      href: http://emby
+      enableBlocks: yes
+      enableNowPlaying: on
+      showEpisodes: no
+      quoted: "true"
+      enabled: true
+      disabled: False
+""",
+    "numbers": """\
+- Media:
+  - Emby:
+      port: 017
+      octal: 0o17
+      hex: 0x1F
+      binary: 0b101
+      time: 1:30
+      ratio: 1.5
+      exponent: 1e3
+      version: 1.2.3
+      when: 2024-01-02
+      empty:
+      tilde: ~
+  - 123:
+      href: http://numeric
+""",
+    "merge_keys": """\
+- Media:
+  - Emby:
+      widget: &widget
+        type: emby
+        url: http://emby
+        key: default
+  - Jellyfin:
+      widget:
+        <<: *widget
+        key: own
+        type: jellyfin
+""",
+    "hidden_blocks": """\
+# Services
+- Media:
+  # - First:
+  #     href: http://first
+  #     enableBlocks: yes
+  - Emby:
+      href: http://emby  # inline
+      # ping: http://emby
+  - 2024:
+      href: http://numeric
+  # - Hidden:
+  #     href: http://hidden
+  #     port: 017
+- Tools:
+  # - Git:
+  #     href: http://git
+""",
+    "direct": """\
+Media:
+  - Emby:
+      href: http://emby
+      enableBlocks: yes
+""",
+}
+
+
+def services(tmp_path, text, parser):
+    path = tmp_path / f"{parser}.yaml"
+    path.write_text(text)
+    return YAMLHandler(str(path), parser).get_services()
+
+
+def dump(categories):
+    # Order-sensitive comparison of the whole result, key order included
+    return json.dumps(categories, default=str)
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+@pytest.mark.parametrize("parser", [p for p in PARSERS if p != "ruamel"])
+def test_parsers_read_services_as_ruamel_does(tmp_path, name, parser):
+    assert dump(services(tmp_path, FIXTURES[name], parser)) == dump(services(tmp_path, FIXTURES[name], "ruamel"))
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_yaml_1_2_scalars(tmp_path, parser):
+    emby = services(tmp_path, FIXTURES["booleans"], parser)["Media"][0]["config"]
+    assert [emby[key] for key in ("enableBlocks", "enableNowPlaying", "showEpisodes", "quoted")] == ["yes", "on", "no", "true"]
+    assert emby["enabled"] is True and emby["disabled"] is False
+
+    categories = services(tmp_path, FIXTURES["numbers"], parser)
+    emby = categories["Media"][0]["config"]
+    assert (emby["port"], emby["octal"], emby["hex"], emby["binary"]) == (17, 15, 31, 5)
+    assert emby["time"] == "1:30" and emby["version"] == "1.2.3"
+    assert emby["ratio"] == 1.5 and emby["exponent"] == 1000.0
+    assert emby["empty"] is None and emby["tilde"] is None
+    assert categories["Media"][1]["name"] == "123"
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_merge_keys_come_after_explicit_keys(tmp_path, parser):
+    widget = services(tmp_path, FIXTURES["merge_keys"], parser)["Media"][1]["config"]["widget"]
+    assert list(widget.items()) == [("key", "own"), ("type", "jellyfin"), ("url", "http://emby")]
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_duplicate_keys_are_rejected(tmp_path, parser):
+    text = "- Media:\n  - Emby:\n      href: http://a\n      href: http://b\n"
+    assert services(tmp_path, text, parser) == {}
+
+
+@pytest.mark.parametrize("parser", PARSERS)
+def test_hidden_blocks_in_file_order(tmp_path, parser):
+    categories = services(tmp_path, FIXTURES["hidden_blocks"], parser)
+    assert [(s["name"], s["config"].get("hidden", False)) for s in categories["Media"]] == [
+        ("First", True), ("Emby", False), ("2024", False), ("Hidden", True)]
+    assert categories["Media"][0]["config"]["enableBlocks"] == "yes"
+    assert categories["Media"][1]["config"]["healthCheckDisabled"] is True
+    assert categories["Media"][3]["config"]["port"] == 17
+    assert categories["Tools"] == [{"name": "Git", "config": {"href": "http://git", "hidden": True}}]
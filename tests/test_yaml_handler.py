@@ -0,0 +1,129 @@
+from core.config_tree import ConfigTree
+from core.yaml_handler import YAMLHandler
+
+FOUR_SPACES = """\
+# Services
+- Media:
+    - Plex:
+        href: http://plex
+        # ping: http://plex
+        description: Movies
+    # - Hidden:
+    #     href: http://hidden
+    #     description: secret
+    - Jellyfin:
+        href: http://jf
+- Tools:
+    - Git:
+        href: http://git
+"""
+
+TWO_SPACES = """\
+- Media:
+  # - First:
+  #     href: http://first
+  - Emby:
+      # ping: http://emby
+      href: http://emby
+  - Plex:
+      href: http://plex  # inline
+- Tools:
+  - Git:
+      href: http://git
+      widget:
+        type: gitea
+        fields: ["a", "b"]
+"""
+
+
+def make_handler(tmp_path, text):
+    path = tmp_path / "services.yaml"
+    path.write_text(text)
+    return YAMLHandler(str(path)), path
+
+
+def test_four_space_file_survives_an_edit(tmp_path):
+    handler, path = make_handler(tmp_path, FOUR_SPACES)
+    services = handler.get_services()
+    assert [s['name'] for s in services['Media']] == ['Plex', 'Hidden', 'Jellyfin']
+    assert services['Media'][0]['config']['healthCheckDisabled'] is True
+
+    assert handler.update_service('Tools', 'Git', {'href': 'http://git2'})
+    assert path.read_text() == FOUR_SPACES.replace('http://git\n', 'http://git2\n')
+
+
+def test_hide_and_disable_health_check_keep_the_layout(tmp_path):
+    handler, path = make_handler(tmp_path, FOUR_SPACES)
+    assert handler.apply_operations([
+        {'op': 'hide', 'category': 'Media', 'name': 'Jellyfin'},
+        {'op': 'health_check', 'category': 'Media', 'name': 'Plex', 'value': True},
+    ])
+    assert path.read_text() == FOUR_SPACES.replace(
+        "        # ping: http://plex", "        ping: http://plex"
+    ).replace(
+        "    - Jellyfin:\n        href: http://jf", "    # - Jellyfin:\n    #     href: http://jf"
+    )
+
+    services = YAMLHandler(str(path)).get_services()
+    assert services['Media'][2] == {'name': 'Jellyfin', 'config': {'href': 'http://jf', 'hidden': True}}
+    assert services['Media'][0]['config'] == {'href': 'http://plex', 'ping': 'http://plex', 'description': 'Movies'}
+
+
+def test_comments_before_first_entries_and_flow_values_survive(tmp_path):
+    handler, path = make_handler(tmp_path, TWO_SPACES)
+    assert handler.update_service('Tools', 'Git', {'href': 'http://git2', 'widget': {'type': 'gitea', 'fields': ['a', 'b']}})
+    assert path.read_text() == TWO_SPACES.replace('http://git\n', 'http://git2\n')
+
+
+def test_hiding_every_service_of_a_category(tmp_path):
+    handler, path = make_handler(tmp_path, TWO_SPACES)
+    assert handler.apply_operations([{'op': 'hide', 'category': 'Tools', 'name': 'Git'}])
+    assert path.read_text().endswith("- Tools:\n  # - Git:\n  #     href: http://git\n  #     widget:\n"
+                                     "  #       type: gitea\n  #       fields: [\"a\", \"b\"]\n")
+    assert YAMLHandler(str(path)).get_services()['Tools'][0]['config']['hidden'] is True
+
+
+def test_edits_reuse_the_cached_tree(tmp_path):
+    handler, path = make_handler(tmp_path, TWO_SPACES)
+    assert handler.add_service('Tools', 'A', {'href': 'http://a'})
+    tree = handler.load_config()
+    assert handler.add_service('Tools', 'B', {'href': 'http://b'})
+    assert handler.load_config() is tree
+
+    # A failed batch must not leave its first operations in the tree
+    assert not handler.edit_service('Tools', 'A', new_category='Media', new_name='Emby')
+    assert 'Emby' not in [s['name'] for s in YAMLHandler(str(path)).get_services()['Tools']]
+    assert [s['name'] for s in handler.get_services()['Tools']] == ['Git', 'A', 'B']
+
+    # Changed on disk: parsed again
+    path.write_text(TWO_SPACES)
+    assert handler.load_config() is not tree
+
+
+def test_config_tree_positions_follow_edits():
+    handler = YAMLHandler()
+    tree = ConfigTree(handler.yaml.load(FOUR_SPACES))
+    tree.insert_service("Media", "Emby", {"href": "http://emby"}, 0)
+    tree.move_service("Media", "Plex", "Tools", 0)
+    tree.remove_service("Media", "Emby")
+    tree.insert_service("Tools", "Gitea", {}, 1)
+
+    for category in ("Media", "Tools"):
+        services = tree.services(category)
+        assert [tree._position(category, item) for item in services] == list(range(len(services)))
+    assert [next(iter(item)) for item in tree.services("Tools")] == ["Plex", "Gitea", "Git"]
+
+
+def test_health_check_of_the_last_service_in_a_category(tmp_path):
+    text = FOUR_SPACES.replace("        href: http://jf\n", "        href: http://jf\n        ping: http://jf\n\n")
+    handler, path = make_handler(tmp_path, text)
+    assert handler.apply_operations([{'op': 'health_check', 'category': 'Media', 'name': 'Jellyfin', 'value': False}])
+    disabled = text.replace("        ping: http://jf\n", "        # ping: http://jf\n")
+    assert path.read_text() == disabled
+
+    # A fresh load keeps the blank line after the commented field
+    handler = YAMLHandler(str(path))
+    assert handler.update_service('Tools', 'Git', {'href': 'http://git2'})
+    assert path.read_text() == disabled.replace('http://git\n', 'http://git2\n')
+    assert handler.apply_operations([{'op': 'health_check', 'category': 'Media', 'name': 'Jellyfin', 'value': True}])
+    assert path.read_text() == text.replace('http://git\n', 'http://git2\n')